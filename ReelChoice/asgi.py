@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ReelChoice.settings')
 
 application = get_asgi_application()
+
+if settings.RECOMMENDER_PRELOAD:
+    from reelchoice_app.model_registry import model_registry
+
+    model_registry.preload()
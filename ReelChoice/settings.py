@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the request metrics include the other middleware
+    'reelchoice_app.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,7 +56,7 @@ ROOT_URLCONF = 'ReelChoice.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'reelchoice_app.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
         'APP_DIRS': True,
@@ -123,5 +125,92 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Recommendation model
+# The model directory is loaded lazily on first use and reloaded when the file on disk changes.
+# Set RECOMMENDER_PRELOAD to load it when the WSGI/ASGI application is created (e.g. gunicorn --preload)
+
+RECOMMENDER_MODEL_PATH = BASE_DIR / 'recommender' / 'trained_model'
+
+RECOMMENDER_RELOAD_INTERVAL = 5
+
+RECOMMENDER_PRELOAD = False
+
+# Log rating changes for `manage.py maintain_recommender`, which keeps similarities fresh between retrains
+
+RECOMMENDER_INCREMENTAL_UPDATES = False
+
+# Ranked recommendations cached per user in every worker, invalidated by rating writes and model reloads
+
+RECOMMENDATION_CACHE_MAX_USERS = 10000
+
+RECOMMENDATION_CACHE_TOP_K = 100
+
+# Threads scoring recommendations for the async home and category views, and the seconds a home page section
+# may take before the page shows popular movies in its place
+
+RECOMMENDER_EXECUTOR_WORKERS = 4
+
+HOME_SECTION_TIMEOUT = 0.5
+
+# Unix socket of `manage.py run_recommender_service`, which scores in a pool of worker processes outside the web
+# workers; None scores in RECOMMENDER_EXECUTOR_WORKERS threads of every web worker. Requests without an answer
+# within RECOMMENDER_SERVICE_TIMEOUT seconds show popular movies
+
+RECOMMENDER_SERVICE_SOCKET = None
+
+RECOMMENDER_SERVICE_TIMEOUT = 0.4
+
+# In-memory catalog indexes (home section pools, genre index, typeahead) are rebuilt after an import bumps the
+# catalog version (shared by the web workers), or at the latest after this many seconds.
+# The former name SECTION_POOLS_MAX_AGE still takes precedence where it is set
+
+CATALOG_INDEX_MAX_AGE = 300
+
+# Keyword tags extracted from movie overviews at import (tag -> phrases matched as whole words),
+# re-extract with `manage.py tag_movies` after changing them
+
+MOVIE_KEYWORD_TAGS = {
+    "true_story": ["true story"],
+}
+
+# Home page and category sections listing the movies with a keyword tag, title -> tag
+
+KEYWORD_SECTIONS = {
+    "Based on a true story": "true_story",
+}
+
+# Seconds the shared parts of a movie page stay in the cache; changes render them again right away
+# (see reelchoice_app/fragments.py), the timeout only bounds how long unused fragments are kept
+
+MOVIE_FRAGMENT_TIMEOUT = 24 * 3600
+
+# Comments shown on the movie page and loaded per "Load more comments"
+
+COMMENTS_PER_PAGE = 20
+
+# Rated-movie bitsets (one bit per movie) kept per user for the "Rate More Movies" sections
+
+RATED_SETS_MAX_USERS = 10000
+
 LOGIN_REDIRECT_URL = "reelchoice_app:home"
 LOGOUT_REDIRECT_URL = "reelchoice_app:login"
+
+# Request metrics (reelchoice_app.instrumentation): send them in a Server-Timing header,
+# and the most queries a view may run per request method before a warning is logged; the tests assert the same budgets.
+# The budgets are those of warm requests: the first request after a start or a catalog change also builds
+# the in-process indexes (section pools, genre index, typeahead, rated sets) and runs more queries
+
+SERVER_TIMING_HEADER = True
+
+QUERY_BUDGETS = {
+    "reelchoice_app:home": {"GET": 4},
+    "reelchoice_app:search": {"GET": 5},
+    "reelchoice_app:search_suggestions": {"GET": 0},
+    "reelchoice_app:ratings": {"GET": 3},
+    "reelchoice_app:movie_detail": {"GET": 5},
+    "reelchoice_app:movie_comments": {"GET": 3},
+    "reelchoice_app:category_view": {"GET": 4},
+    # A successful login looks up the user, updates last_login and creates and cycles the session
+    "reelchoice_app:login": {"GET": 2, "POST": 9},
+    "reelchoice_app:authView": {"GET": 2, "POST": 3},
+}
@@ -1,19 +1,21 @@
+import argparse
 import os
+import sys
 import django
-import csv
-from datetime import datetime
 from django.conf import settings
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ReelChoice.settings')
 django.setup()
 
-from reelchoice_app.models import Genre, Company, Country, Movie
+from reelchoice_app.catalog_import import import_movies_csv, CatalogImportError
 
 
-def import_movies():
+def import_movies(delete_missing=False, max_delete_fraction=0.1, summary_path=None):
     """
     Reads movies.csv and imports the data into database,
     normalizing genres, production_companies і production_countries.
+    Only new and changed rows are written. With delete_missing, movies missing from the file are deleted
+    together with their ratings and comments, unless more than max_delete_fraction of the catalog would go.
     """
     project_root = settings.BASE_DIR
     csv_path = os.path.join(project_root, 'data', 'movies.csv')
@@ -22,57 +24,21 @@ def import_movies():
         print(f"File not found")
         return
 
-    with open(csv_path, encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-
-            rd = None
-            date_str = row.get('release_date')
-            if date_str:
-                try:
-                    rd = datetime.strptime(date_str, '%Y-%m-%d').date()
-                except ValueError:
-                    rd = None
-
-            movie_id = int(row['id'])
-            defaults = {
-                'title': row['title'][:255],
-                'poster_path': row.get('poster_path') or None,
-                'overview': row.get('overview') or '',
-                'release_date': rd,
-                'runtime': int(row['runtime']) if row.get('runtime') else None,
-                'vote_average': float(row['vote_average']) if row.get('vote_average') else None,
-                'vote_count': int(row['vote_count']) if row.get('vote_count') else None,
-                'popularity': float(row.get('popularity') or 0),
-            }
-            movie, created = Movie.objects.update_or_create(
-                id=movie_id,
-                defaults=defaults
-            )
-
-            movie.genres.clear()
-            for name in row.get('genres', '').split(','):
-                name = name.strip()
-                if name:
-                    genre, _ = Genre.objects.get_or_create(name=name)
-                    movie.genres.add(genre)
-
-            movie.companies.clear()
-            for name in row.get('production_companies', '').split(','):
-                name = name.strip()
-                if name:
-                    pc, _ = Company.objects.get_or_create(name=name)
-                    movie.companies.add(pc)
-
-            movie.countries.clear()
-            for name in row.get('production_countries', '').split(','):
-                name = name.strip()
-                if name:
-                    country, _ = Country.objects.get_or_create(name=name)
-                    movie.countries.add(country)
-
+    try:
+        import_movies_csv(csv_path, stdout=sys.stdout, delete_missing=delete_missing,
+                          max_delete_fraction=max_delete_fraction, summary_path=summary_path)
+    except CatalogImportError as exc:
+        print(f"Movies missing from the file were not deleted: {exc}")
     print("\n Import of movies is done!")
 
 
 if __name__ == '__main__':
-    import_movies()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Import data/movies.csv into the database")
+    parser.add_argument('--delete-missing', action='store_true',
+                        help='Delete movies that are not in the file, with their ratings and comments')
+    parser.add_argument('--max-delete-fraction', type=float, default=0.1,
+                        help='Refuse --delete-missing when more than this share of the catalog would be deleted')
+    parser.add_argument('--summary', help='Write the ids of inserted, changed and deleted movies to this JSON file')
+    args = parser.parse_args()
+    import_movies(delete_missing=args.delete_missing, max_delete_fraction=args.max_delete_fraction,
+                  summary_path=args.summary)
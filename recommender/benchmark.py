@@ -0,0 +1,128 @@
+"""
+Compares recommendation latency of the dict-based ItemBasedCF engine and the CSR SparseItemScorer,
+or (with --training) wall time and peak RSS of the dense and sparse training modes.
+
+Usage (from the project root):
+    python -m recommender.benchmark
+    python -m recommender.benchmark --training [n_users] [n_items]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from recommender.recommender import ItemBasedCF
+from recommender.sparse import SparseItemScorer
+from recommender.training import peak_rss_mb
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trained_model.pkl')
+RATING_COUNTS = (10, 100, 1000)
+USERS_PER_SIZE = 5
+N_RECOMMENDATIONS = 20
+
+
+def _time_call(func, *args, repeat: int = 3) -> float:
+    """Return the best wall time of `repeat` calls in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run_benchmark(model_path: str = MODEL_PATH, seed: int = 42):
+    model = ItemBasedCF()
+    model.load_model(model_path)
+    scorer = SparseItemScorer.from_model(model)
+    rng = random.Random(seed)
+
+    print(f"{'ratings':>8} {'dict (ms)':>12} {'sparse (ms)':>12} {'speedup':>9}")
+    for n_ratings in RATING_COUNTS:
+        dict_times = []
+        sparse_times = []
+        for _ in range(USERS_PER_SIZE):
+            rated = rng.sample(model.all_items, min(n_ratings, len(model.all_items)))
+            user_ratings = {item_id: float(rng.randint(1, 10)) for item_id in rated}
+
+            expected = model.recommend_items(user_ratings, N_RECOMMENDATIONS)
+            actual = scorer.recommend_items(user_ratings, N_RECOMMENDATIONS)
+            if [item for item, _ in expected] != [item for item, _ in actual]:
+                raise AssertionError(f"Engines disagree for a user with {n_ratings} ratings")
+
+            dict_times.append(_time_call(model.recommend_items, user_ratings, N_RECOMMENDATIONS))
+            sparse_times.append(_time_call(scorer.recommend_items, user_ratings, N_RECOMMENDATIONS))
+
+        dict_ms = sum(dict_times) / len(dict_times)
+        sparse_ms = sum(sparse_times) / len(sparse_times)
+        print(f"{n_ratings:>8} {dict_ms:>12.2f} {sparse_ms:>12.2f} {dict_ms / sparse_ms:>8.1f}x")
+
+
+def synthetic_ratings(n_users: int, n_items: int, seed: int = 42) -> pd.DataFrame:
+    """Random ratings on a 0.5..5 scale, 10 to 100 ratings per user"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for user_id in range(n_users):
+        items = rng.choice(n_items, size=rng.integers(10, min(100, n_items) + 1), replace=False)
+        frames.append(pd.DataFrame({
+            'userId': user_id,
+            'id': items + 1,
+            'rating': rng.integers(1, 11, size=len(items)) / 2,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _fit_in_child(mode: str, n_users: int, n_items: int):
+    ratings_df = synthetic_ratings(n_users, n_items)
+    model = ItemBasedCF()
+    baseline_rss = peak_rss_mb()
+    start = time.perf_counter()
+    model.fit(ratings_df, mode=mode)
+    return model.item_similarities, time.perf_counter() - start, peak_rss_mb() - baseline_rss
+
+
+def _equivalent(expected: dict, actual: dict, tolerance: float = 1e-9) -> bool:
+    expected_values = [value for value in expected.values() if value > tolerance]
+    actual_values = [value for value in actual.values() if value > tolerance]
+    return len(expected_values) == len(actual_values) and np.allclose(expected_values, actual_values,
+                                                                       rtol=0, atol=tolerance)
+
+
+def run_training_benchmark(n_users: int = 3000, n_items: int = 1000):
+    # Every mode runs in a fresh process so the peak RSS figures do not include each other
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for mode in ('dense', 'sparse'):
+        with context.Pool(1) as pool:
+            results[mode] = pool.apply(_fit_in_child, (mode, n_users, n_items))
+
+    dense_similarities = results['dense'][0]
+    sparse_similarities = results['sparse'][0]
+    identical = sum(
+        list(dense_similarities[item_id]) == list(sparse_similarities.get(item_id, {}))
+        for item_id in dense_similarities
+    )
+    # DataFrame.corr leaves ~1e-16 rounding noise, which reorders exact ties and turns some zero
+    # correlations into tiny positive ones, so also compare the similarity values with a tolerance
+    equivalent = sum(
+        _equivalent(dense_similarities[item_id], sparse_similarities.get(item_id, {}))
+        for item_id in dense_similarities
+    )
+
+    print(f"{n_users} users, {n_items} items")
+    print(f"{'mode':>8} {'wall (s)':>10} {'peak RSS growth (MB)':>22}")
+    for mode, (_, wall, rss) in results.items():
+        print(f"{mode:>8} {wall:>10.2f} {rss:>22.1f}")
+    print(f"Identical neighbour lists: {identical}/{len(dense_similarities)}, "
+          f"equal up to rounding: {equivalent}/{len(dense_similarities)}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--training':
+        run_training_benchmark(*(int(arg) for arg in sys.argv[2:4]))
+    else:
+        run_benchmark()
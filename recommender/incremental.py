@@ -0,0 +1,186 @@
+"""
+Incremental maintenance of item-item Pearson similarities.
+
+For every item pair the co-rating sufficient statistics are kept: number of users who rated
+both items, the sums and sums of squares of each item's ratings over those users and the sum
+of cross products. A rating insert, update or delete changes only the pairs between the rated
+item and the user's other items, and only those items' top-N neighbour lists are recomputed.
+The statistics are dense item x item arrays (28 bytes per pair), which is meant for catalogs
+of a few thousand rated movies.
+"""
+import numpy as np
+import pandas as pd
+
+from recommender.recommender import ItemBasedCF
+from recommender.training import build_rating_matrix, pearson_from_statistics, top_neighbours
+
+# Most item slots added when the statistic arrays grow: their size is quadratic in the slots,
+# so doubling a catalog of a few thousand items for one new item would cost gigabytes
+MAX_GROWTH_ITEMS = 256
+
+
+class IncrementalItemSimilarity:
+    def __init__(self, n_similar_items: int = 200, min_periods: int = 10):
+        self.n_similar_items = n_similar_items
+        self.min_periods = min_periods
+
+        self.item_ids: list = []
+        self.positions: dict = {}
+        self.user_ratings: dict[int, dict[int, float]] = {}
+        self.neighbours: dict[int, dict[int, float]] = {}
+        self.changed_items: set = set()
+
+        self.rating_counts = np.zeros(0)
+        self.rating_sums = np.zeros(0)
+        # co_counts[i, j]: users who rated both i and j, co_sums[i, j] / co_squares[i, j]: sum of their
+        # ratings of i and of squared ratings of i, co_products[i, j]: sum of rating(i) * rating(j)
+        self.co_counts = np.zeros((0, 0), dtype=np.int32)
+        self.co_sums = np.zeros((0, 0))
+        self.co_squares = np.zeros((0, 0))
+        self.co_products = np.zeros((0, 0))
+        self._id_order = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_ratings(cls, user_ids, item_ids, ratings, n_similar_items: int = 200,
+                     min_periods: int = 10) -> "IncrementalItemSimilarity":
+        """Build the statistics and all neighbour lists from parallel rating arrays"""
+        state = cls(n_similar_items, min_periods)
+        user_ids = np.asarray(user_ids)
+        if not len(user_ids):
+            return state
+
+        matrix, unique_items, _ = build_rating_matrix(user_ids, item_ids, ratings)
+        state._add_items(unique_items.tolist())
+
+        indicator = matrix.copy()
+        indicator.data = np.ones_like(indicator.data)
+        squared = matrix.copy()
+        squared.data = squared.data ** 2
+
+        n_items = len(unique_items)
+        state.rating_counts[:n_items] = np.diff(matrix.indptr)
+        state.rating_sums[:n_items] = np.asarray(matrix.sum(axis=0)).ravel()
+        state.co_counts[:n_items, :n_items] = (indicator.T @ indicator).toarray()
+        state.co_sums[:n_items, :n_items] = (matrix.T @ indicator).toarray()
+        state.co_squares[:n_items, :n_items] = (squared.T @ indicator).toarray()
+        state.co_products[:n_items, :n_items] = (matrix.T @ matrix).toarray()
+        np.fill_diagonal(state.co_counts, 0)
+
+        for user_id, item_id, rating in zip(user_ids.tolist(), np.asarray(item_ids).tolist(),
+                                            np.asarray(ratings, dtype=np.float64).tolist()):
+            state.user_ratings.setdefault(user_id, {})[item_id] = rating
+
+        state._refresh(np.arange(n_items))
+        return state
+
+    def _add_items(self, item_ids: list):
+        """Register new items, growing the statistic arrays by at most MAX_GROWTH_ITEMS spare slots"""
+        new_ids = [item_id for item_id in item_ids if item_id not in self.positions]
+        if not new_ids:
+            return
+
+        size = len(self.item_ids) + len(new_ids)
+        capacity = len(self.rating_counts)
+        if size > capacity:
+            capacity = max(size, capacity + min(capacity, MAX_GROWTH_ITEMS))
+            self.rating_counts = np.resize(self.rating_counts, capacity)
+            self.rating_sums = np.resize(self.rating_sums, capacity)
+            self.rating_counts[len(self.item_ids):] = 0
+            self.rating_sums[len(self.item_ids):] = 0
+            for name in ('co_counts', 'co_sums', 'co_squares', 'co_products'):
+                old = getattr(self, name)
+                grown = np.zeros((capacity, capacity), dtype=old.dtype)
+                grown[:old.shape[0], :old.shape[1]] = old
+                setattr(self, name, grown)
+
+        for item_id in new_ids:
+            self.positions[item_id] = len(self.item_ids)
+            self.item_ids.append(item_id)
+        self._id_order = np.argsort(np.array(self.item_ids, dtype=np.int64), kind='stable')
+
+    def _apply(self, user_id: int, item_id: int, rating: float, sign: int) -> np.ndarray:
+        """Add (sign=1) or remove (sign=-1) one rating from the statistics, returns the co-rated positions"""
+        position = self.positions[item_id]
+        others = self.user_ratings.get(user_id, {})
+        other_positions = np.array([self.positions[other] for other in others if other != item_id], dtype=np.int64)
+        other_ratings = np.array([value for other, value in others.items() if other != item_id], dtype=np.float64)
+
+        self.rating_counts[position] += sign
+        self.rating_sums[position] += sign * rating
+        if len(other_positions):
+            self.co_counts[position, other_positions] += sign
+            self.co_counts[other_positions, position] += sign
+            self.co_sums[position, other_positions] += sign * rating
+            self.co_sums[other_positions, position] += sign * other_ratings
+            self.co_squares[position, other_positions] += sign * rating ** 2
+            self.co_squares[other_positions, position] += sign * other_ratings ** 2
+            self.co_products[position, other_positions] += sign * rating * other_ratings
+            self.co_products[other_positions, position] += sign * rating * other_ratings
+        return other_positions
+
+    def set_rating(self, user_id: int, item_id: int, rating: float):
+        """Insert or update a user's rating and refresh the affected neighbour lists"""
+        rating = float(rating)
+        previous = self.user_ratings.get(user_id, {}).get(item_id)
+        if previous == rating:
+            return
+
+        self._add_items([item_id])
+        if previous is not None:
+            self._apply(user_id, item_id, previous, -1)
+        other_positions = self._apply(user_id, item_id, rating, 1)
+        self.user_ratings.setdefault(user_id, {})[item_id] = rating
+        self._refresh(np.append(other_positions, self.positions[item_id]))
+
+    def remove_rating(self, user_id: int, item_id: int):
+        """Delete a user's rating and refresh the affected neighbour lists"""
+        previous = self.user_ratings.get(user_id, {}).get(item_id)
+        if previous is None:
+            return
+
+        other_positions = self._apply(user_id, item_id, previous, -1)
+        del self.user_ratings[user_id][item_id]
+        if not self.user_ratings[user_id]:
+            del self.user_ratings[user_id]
+        self._refresh(np.append(other_positions, self.positions[item_id]))
+
+    def _refresh(self, positions: np.ndarray):
+        """Recompute the top-N neighbour lists of the items at the given positions"""
+        size = len(self.item_ids)
+        positions = np.unique(positions)
+        similarities = pearson_from_statistics(
+            self.co_counts[positions, :size],
+            self.co_sums[positions, :size],
+            self.co_sums[:size, positions].T,
+            self.co_squares[positions, :size],
+            self.co_squares[:size, positions].T,
+            self.co_products[positions, :size],
+            self.min_periods,
+        )
+
+        for position, row in zip(positions.tolist(), similarities):
+            item_id = self.item_ids[position]
+            self.changed_items.add(item_id)
+            if self.rating_counts[position] == 0:
+                self.neighbours.pop(item_id, None)
+                continue
+            # Rank in item id order, so ties are broken the same way as in a full fit
+            ordered_positions, values = top_neighbours(row[self._id_order], self.n_similar_items)
+            self.neighbours[item_id] = {
+                self.item_ids[self._id_order[ordered]]: value
+                for ordered, value in zip(ordered_positions.tolist(), values.tolist())
+            }
+
+    def to_model(self) -> ItemBasedCF:
+        """Snapshot the current means and neighbour lists as an ItemBasedCF model"""
+        size = len(self.item_ids)
+        rated = [position for position in range(size) if self.rating_counts[position] > 0]
+        rated.sort(key=lambda position: self.item_ids[position])
+        rated_ids = [self.item_ids[position] for position in rated]
+
+        model = ItemBasedCF(n_similar_items=self.n_similar_items)
+        model.all_items = rated_ids
+        model.item_means = pd.Series(self.rating_sums[rated] / self.rating_counts[rated],
+                                     index=pd.Index(rated_ids, name='id'), dtype=float)
+        model.item_similarities = {item_id: dict(self.neighbours.get(item_id, {})) for item_id in rated_ids}
+        return model
@@ -0,0 +1,169 @@
+"""
+Versioned on-disk format for item-based models made of flat numpy arrays.
+
+A model is a directory with one .npy file per array and a header.json that records
+the format version, array shapes/dtypes and a sha256 checksum of every file.
+Arrays are opened with np.load(mmap_mode='r'), so every worker process that loads
+the same model shares a single page-cache copy instead of unpickling its own.
+
+Convert the pickled model (from the project root):
+    python -m recommender.model_format recommender/trained_model.pkl recommender/trained_model
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+
+from recommender.recommender import ItemBasedCF
+from recommender.sparse import SparseItemScorer
+
+FORMAT_NAME = 'reelchoice-item-cf'
+FORMAT_VERSION = 1
+HEADER_FILE = 'header.json'
+ARRAY_NAMES = ('item_ids', 'item_means', 'indptr', 'indices', 'similarities', 'candidate_mask',
+               'reverse_indptr', 'reverse_indices')
+
+
+class ModelFormatError(Exception):
+    """Raised when a model directory is missing, corrupted or has an unsupported version"""
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_binary_model(scorer: SparseItemScorer, path: str, n_similar_items: int = None):
+    """
+    Write the model arrays and header into `path`.
+    The directory is assembled next to the target and swapped in with a rename,
+    so readers never observe a half-written model.
+    """
+    matrix = scorer.similarity_matrix
+    arrays = {
+        'item_ids': scorer.item_ids,
+        'item_means': scorer.item_means,
+        'indptr': matrix.indptr,
+        'indices': matrix.indices,
+        'similarities': matrix.data,
+        'candidate_mask': scorer.candidate_mask,
+        'reverse_indptr': scorer.reverse_indptr,
+        'reverse_indices': scorer.reverse_indices,
+    }
+
+    path = os.path.abspath(path)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    header_arrays = {}
+    for name in ARRAY_NAMES:
+        array = np.ascontiguousarray(arrays[name])
+        filename = f"{name}.npy"
+        np.save(os.path.join(tmp_path, filename), array, allow_pickle=False)
+        header_arrays[name] = {
+            'file': filename,
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'sha256': _file_sha256(os.path.join(tmp_path, filename)),
+        }
+
+    model_version = hashlib.sha256(
+        ''.join(header_arrays[name]['sha256'] for name in ARRAY_NAMES).encode()
+    ).hexdigest()[:16]
+    header = {
+        'format': FORMAT_NAME,
+        'format_version': FORMAT_VERSION,
+        'model_version': model_version,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'n_items': int(len(scorer.item_ids)),
+        'nnz': int(matrix.nnz),
+        'n_similar_items': n_similar_items,
+        'arrays': header_arrays,
+    }
+    with open(os.path.join(tmp_path, HEADER_FILE), 'w', encoding='utf-8') as f:
+        json.dump(header, f, indent=2)
+
+    if os.path.exists(path):
+        old_path = f"{path}.old-{os.getpid()}"
+        os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    else:
+        os.rename(tmp_path, path)
+    return header
+
+
+def read_header(path: str) -> dict:
+    """Read and validate the header of a binary model directory"""
+    header_path = os.path.join(path, HEADER_FILE)
+    if not os.path.exists(header_path):
+        raise FileNotFoundError(f"Model header {header_path} not found")
+
+    with open(header_path, encoding='utf-8') as f:
+        header = json.load(f)
+
+    if header.get('format') != FORMAT_NAME:
+        raise ModelFormatError(f"{path} is not a {FORMAT_NAME} model")
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ModelFormatError(f"Unsupported model format version {header.get('format_version')}")
+    missing = set(ARRAY_NAMES) - set(header.get('arrays', {}))
+    if missing:
+        raise ModelFormatError(f"Model header is missing arrays: {', '.join(sorted(missing))}")
+    return header
+
+
+def load_binary_model(path: str, mmap: bool = True, verify: bool = True) -> SparseItemScorer:
+    """
+    Open a binary model directory as a SparseItemScorer.
+    With mmap=True the arrays are read-only memory maps shared between processes.
+    """
+    header = read_header(path)
+
+    arrays = {}
+    for name in ARRAY_NAMES:
+        meta = header['arrays'][name]
+        array_path = os.path.join(path, meta['file'])
+        if verify and _file_sha256(array_path) != meta['sha256']:
+            raise ModelFormatError(f"Checksum mismatch for {array_path}")
+
+        array = np.load(array_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        if array.dtype.str != meta['dtype'] or list(array.shape) != meta['shape']:
+            raise ModelFormatError(f"Array {name} does not match the model header")
+        arrays[name] = array
+
+    n_items = header['n_items']
+    similarity_matrix = sparse.csr_matrix(
+        (arrays['similarities'], arrays['indices'], arrays['indptr']),
+        shape=(n_items, n_items),
+        copy=False,
+    )
+    scorer = SparseItemScorer(arrays['item_ids'], arrays['item_means'], similarity_matrix,
+                              arrays['candidate_mask'], arrays['reverse_indptr'], arrays['reverse_indices'])
+    scorer.model_version = header['model_version']
+    return scorer
+
+
+def convert_pickle(pickle_path: str, output_path: str) -> dict:
+    """Convert a model saved with ItemBasedCF.save_model into the binary format"""
+    model = ItemBasedCF()
+    model.load_model(pickle_path)
+    return save_binary_model(SparseItemScorer.from_model(model), output_path, model.n_similar_items)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python -m recommender.model_format <model.pkl> <output_dir>")
+        sys.exit(1)
+
+    converted = convert_pickle(sys.argv[1], sys.argv[2])
+    print(f"Converted {converted['n_items']} items ({converted['nnz']} similarities), "
+          f"model version {converted['model_version']}")
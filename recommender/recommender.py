@@ -1,8 +1,14 @@
+import heapq
 import os
 import pickle
+import time
 
 import pandas as pd
 
+# Boost of a prediction that uses one of the user's three newest ratings, by position from the newest one
+# (a newer rating overrides an older one), as in predict_score
+LAST_RATINGS_BOOSTS = {1: 3, 2: 2.5, 3: 2}
+
 
 class ItemBasedCF:
     def __init__(self, n_similar_items: int = 200):
@@ -11,8 +17,17 @@ class ItemBasedCF:
         self.item_means: pd.Series = pd.Series(dtype=float)
         self.all_items: list = []
 
-    def fit(self, ratings_df: pd.DataFrame):
-        """Train the model on ratings data"""
+    def fit(self, ratings_df: pd.DataFrame, mode: str = 'dense', n_jobs: int = None, min_periods: int = 10):
+        """
+        Train the model on ratings data.
+        mode='sparse' computes the similarities in item blocks across a process pool
+        without building the dense item x item matrix
+        """
+        if mode == 'sparse':
+            return self._fit_sparse(ratings_df, n_jobs, min_periods)
+        if mode != 'dense':
+            raise ValueError(f"Unknown training mode {mode!r}")
+
         print("Building user-item matrix...")
         user_item_matrix = ratings_df.pivot(index='userId', columns='id', values='rating')
 
@@ -22,7 +37,7 @@ class ItemBasedCF:
         self.item_means = user_item_matrix.mean(axis=0, skipna=True)
 
         print("Computing item similarities...")
-        item_similarity_df = user_item_matrix.corr(method='pearson', min_periods=10)
+        item_similarity_df = user_item_matrix.corr(method='pearson', min_periods=min_periods)
         item_similarity_df = item_similarity_df.fillna(0)
 
         similarity_upper_bound = 0.99
@@ -36,6 +51,17 @@ class ItemBasedCF:
 
         print(f"Training complete! Computed similarities for {len(self.item_similarities)} items")
 
+    def _fit_sparse(self, ratings_df: pd.DataFrame, n_jobs: int = None, min_periods: int = 10):
+        from recommender.training import compute_item_similarities, peak_rss_mb
+
+        print("Computing item similarities in sparse blocks...")
+        start = time.perf_counter()
+        self.all_items, self.item_means, self.item_similarities = compute_item_similarities(
+            ratings_df, n_similar_items=self.n_similar_items, min_periods=min_periods, n_jobs=n_jobs
+        )
+        print(f"Training complete! Computed similarities for {len(self.item_similarities)} items "
+              f"in {time.perf_counter() - start:.2f}s, peak RSS {peak_rss_mb():.1f} MB")
+
     def predict_score(self, user_ratings: dict[int, float], target_item: int):
         """
         Predict score for a target item based on user's existing ratings.
@@ -75,18 +101,66 @@ class ItemBasedCF:
         score = target_item_mean + (numerator / denominator * last_ratings_boost)
         return score
 
-    def recommend_items(self, user_ratings: dict[int, float], n_recommendations: int = 10):
-        """Generate recommendations for a user"""
-        candidate_items = set(self.all_items) - set(user_ratings.keys())
+    def neighbour_index(self):
+        """
+        Inverted neighbour index: item -> [(target, similarity), ...] of every candidate target that lists the
+        item as a neighbour, and the item means as a dict.
+        Built on first use and again whenever item_similarities, item_means or all_items is replaced
+        """
+        source = (self.item_similarities, self.item_means, self.all_items)
+        cached = getattr(self, '_neighbour_index', None)
+        if cached is not None and all(current is indexed for current, indexed in zip(source, cached[0])):
+            return cached[1], cached[2]
+
+        item_means = self.item_means.to_dict()
+        reverse_neighbours = {}
+        for target in self.all_items:
+            if target not in item_means or target not in self.item_similarities:
+                continue
+            for neighbour, similarity in self.item_similarities[target].items():
+                reverse_neighbours.setdefault(neighbour, []).append((target, similarity))
+        self._neighbour_index = (source, reverse_neighbours, item_means)
+        return reverse_neighbours, item_means
 
-        predictions = []
-        for item in candidate_items:
-            score = self.predict_score(user_ratings, item)
-            if score is not None:
-                predictions.append((item, score))
+    def recommend_items(self, user_ratings: dict[int, float], n_recommendations: int = 10):
+        """
+        Generate recommendations for a user, the predict_score of every candidate, best first.
+        Only items listing one of the rated items as a neighbour can be scored, so the candidates come from
+        the inverted neighbour index and their sums are accumulated rating by rating, in the order
+        predict_score adds them. The best n are selected with a bounded heap
+        """
+        reverse_neighbours, item_means = self.neighbour_index()
+        ratings_count = len(user_ratings)
 
-        predictions.sort(key=lambda x: x[1], reverse=True)
-        return predictions[:n_recommendations]
+        # target -> [numerator, denominator, boost]
+        sums = {}
+        for i, (item_id, user_rating) in enumerate(user_ratings.items()):
+            if item_id not in item_means or item_id not in reverse_neighbours:
+                continue
+            centered_rating = user_rating - item_means[item_id]
+            boost = LAST_RATINGS_BOOSTS.get(ratings_count - i)
+            for target, similarity in reverse_neighbours[item_id]:
+                target_sums = sums.get(target)
+                if target_sums is None:
+                    target_sums = sums[target] = [0, 0, 1]
+                target_sums[0] += similarity * centered_rating
+                target_sums[1] += similarity
+                if boost is not None:
+                    target_sums[2] = boost
+
+        predictions = (
+            (target, item_means[target] + (numerator / denominator * boost))
+            for target, (numerator, denominator, boost) in sums.items()
+            if denominator != 0 and target not in user_ratings
+        )
+        # Ties are broken by item id so that every scoring engine returns the same ranking
+        return heapq.nsmallest(n_recommendations, predictions, key=lambda x: (-x[1], x[0]))
+
+    def recommend_for_users(self, user_ratings_by_user: dict, n_recommendations: int = 10, n_jobs: int = 1):
+        """Generate recommendations for many users at once, {user: [(item_id, score), ...]}"""
+        from recommender.sparse import SparseItemScorer
+
+        return SparseItemScorer.from_model(self).recommend_for_users(user_ratings_by_user, n_recommendations, n_jobs)
 
     def save_model(self, filepath: str):
         """Save the trained model"""
@@ -0,0 +1,193 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from recommender.recommender import ItemBasedCF
+
+# Boost applied when one of the user's three most recent ratings is a neighbour of the target,
+# ordered from the third newest rating to the newest one (a newer rating overrides an older one)
+RECENCY_BOOSTS = (2.0, 2.5, 3.0)
+
+# Scorer used by the batch worker processes, set by _init_batch_worker
+_batch_scorer = None
+
+
+def _init_batch_worker(scorer):
+    global _batch_scorer
+    _batch_scorer = scorer
+
+
+def _score_shard(users_ratings: list, n_recommendations: int):
+    return _batch_scorer.recommend_shard(users_ratings, n_recommendations)
+
+
+class SparseItemScorer:
+    """
+    Scores every candidate item at once using the top-N neighbour lists of an
+    ItemBasedCF model stored as a CSR matrix over dense item indices.
+    Row t of the similarity matrix holds the neighbours of item t.
+    """
+
+    def __init__(self, item_ids: np.ndarray, item_means: np.ndarray, similarity_matrix: sparse.csr_matrix,
+                 candidate_mask: np.ndarray, reverse_indptr: np.ndarray = None, reverse_indices: np.ndarray = None):
+        self.item_ids = item_ids
+        self.item_means = item_means
+        self.similarity_matrix = similarity_matrix
+        self.candidate_mask = candidate_mask
+        # Set by the binary model loader, None for engines built in memory
+        self.model_version = None
+
+        # Transposed structure answers "which targets list item i as a neighbour" in O(neighbours)
+        if reverse_indptr is None or reverse_indices is None:
+            reverse = similarity_matrix.T.tocsr()
+            reverse_indptr, reverse_indices = reverse.indptr, reverse.indices
+        self.reverse_indptr = reverse_indptr
+        self.reverse_indices = reverse_indices
+
+    @classmethod
+    def from_model(cls, model: ItemBasedCF) -> "SparseItemScorer":
+        """Build the CSR engine from a trained (or loaded) ItemBasedCF model"""
+        item_ids = np.array(sorted(model.item_means.index), dtype=np.int64)
+        item_means = model.item_means.reindex(item_ids).to_numpy(dtype=np.float64)
+        position = {item_id: i for i, item_id in enumerate(item_ids.tolist())}
+
+        indptr = [0]
+        indices = []
+        data = []
+        for item_id in item_ids.tolist():
+            for neighbour_id, similarity in model.item_similarities.get(item_id, {}).items():
+                if neighbour_id in position:
+                    indices.append(position[neighbour_id])
+                    data.append(similarity)
+            indptr.append(len(indices))
+
+        n_items = len(item_ids)
+        index_dtype = np.int32 if len(indices) < np.iinfo(np.int32).max else np.int64
+        similarity_matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=index_dtype),
+             np.array(indptr, dtype=index_dtype)),
+            shape=(n_items, n_items),
+        )
+
+        candidates = set(model.all_items) & set(model.item_similarities)
+        candidate_mask = np.fromiter((item_id in candidates for item_id in item_ids.tolist()), dtype=bool,
+                                     count=n_items)
+        return cls(item_ids, item_means, similarity_matrix, candidate_mask)
+
+    def _user_positions(self, user_ratings: dict[int, float]):
+        """Map the user's rated item ids to dense indices, keeping only items known to the model"""
+        rated_ids = np.fromiter(user_ratings.keys(), dtype=np.int64, count=len(user_ratings))
+        scores = np.fromiter(user_ratings.values(), dtype=np.float64, count=len(user_ratings))
+
+        positions = np.searchsorted(self.item_ids, rated_ids)
+        positions = np.minimum(positions, len(self.item_ids) - 1)
+        known = self.item_ids[positions] == rated_ids if len(self.item_ids) else np.zeros(len(rated_ids), bool)
+        return positions, scores, known
+
+    def score_all(self, user_ratings: dict[int, float]) -> np.ndarray:
+        """
+        Return a score for every item index, NaN where no prediction can be made.
+        Ratings should be ordered from oldest to newest
+        """
+        n_items = len(self.item_ids)
+        scores = np.full(n_items, np.nan)
+        if not user_ratings or not n_items:
+            return scores
+
+        positions, ratings, known = self._user_positions(user_ratings)
+
+        centered = np.zeros(n_items)
+        rated = np.zeros(n_items)
+        centered[positions[known]] = ratings[known] - self.item_means[positions[known]]
+        rated[positions[known]] = 1.0
+
+        numerator = self.similarity_matrix @ centered
+        denominator = self.similarity_matrix @ rated
+
+        boost = np.ones(n_items)
+        self._apply_recency_boost(boost, positions, known)
+
+        valid = self.candidate_mask & (denominator != 0)
+        valid[positions[known]] = False
+        scores[valid] = self.item_means[valid] + numerator[valid] / denominator[valid] * boost[valid]
+        return scores
+
+    def _apply_recency_boost(self, boost: np.ndarray, positions: np.ndarray, known: np.ndarray):
+        """Set the boost of every target that lists one of the user's three newest ratings as a neighbour"""
+        recent = list(zip(positions[-3:], known[-3:]))
+        for (position, is_known), recency_boost in zip(recent, RECENCY_BOOSTS[-len(recent):]):
+            if is_known:
+                start, end = self.reverse_indptr[position], self.reverse_indptr[position + 1]
+                boost[self.reverse_indices[start:end]] = recency_boost
+
+    def _top_n(self, scores: np.ndarray, n_recommendations: int):
+        valid = np.flatnonzero(~np.isnan(scores))
+        if 0 < n_recommendations < len(valid):
+            # Only items scoring at least the n-th best score can be in the top n, ties included,
+            # so only those are sorted
+            kth = len(valid) - n_recommendations
+            threshold = np.partition(scores[valid], kth)[kth]
+            valid = valid[scores[valid] >= threshold]
+        order = valid[np.lexsort((self.item_ids[valid], -scores[valid]))][:n_recommendations]
+        return [(int(self.item_ids[i]), float(scores[i])) for i in order]
+
+    def recommend_items(self, user_ratings: dict[int, float], n_recommendations: int = 10):
+        """Generate recommendations for a user, same output as ItemBasedCF.recommend_items"""
+        return self._top_n(self.score_all(user_ratings), n_recommendations)
+
+    def recommend_shard(self, users_ratings: list, n_recommendations: int = 10) -> list:
+        """
+        Recommendations for several users at once: the centered ratings of all users form one
+        sparse matrix that is multiplied by the transposed similarity matrix
+        """
+        n_items = len(self.item_ids)
+        n_users = len(users_ratings)
+        rows, columns, centered = [], [], []
+        boost = np.ones((n_users, n_items))
+        for row, user_ratings in enumerate(users_ratings):
+            if not user_ratings or not n_items:
+                continue
+            positions, ratings, known = self._user_positions(user_ratings)
+            rows.append(np.full(known.sum(), row))
+            columns.append(positions[known])
+            centered.append(ratings[known] - self.item_means[positions[known]])
+            self._apply_recency_boost(boost[row], positions, known)
+
+        if not rows:
+            return [[] for _ in users_ratings]
+        rows, columns, centered = np.concatenate(rows), np.concatenate(columns), np.concatenate(centered)
+
+        centered_matrix = sparse.csr_matrix((centered, (rows, columns)), shape=(n_users, n_items))
+        rated_matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(n_users, n_items))
+        similarity_transposed = self.similarity_matrix.T
+        numerator = (centered_matrix @ similarity_transposed).toarray()
+        denominator = (rated_matrix @ similarity_transposed).toarray()
+
+        valid = self.candidate_mask & (denominator != 0)
+        valid[rows, columns] = False
+        scores = np.full((n_users, n_items), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            all_scores = self.item_means + numerator / denominator * boost
+        scores[valid] = all_scores[valid]
+        return [self._top_n(user_scores, n_recommendations) for user_scores in scores]
+
+    def recommend_for_users(self, user_ratings_by_user: dict, n_recommendations: int = 10, n_jobs: int = 1,
+                            shard_size: int = 256) -> dict:
+        """
+        Recommendations for many users, {user: [(item_id, score), ...]}.
+        Users are scored in shards of shard_size; with n_jobs > 1 shards run in a process pool
+        """
+        users = list(user_ratings_by_user)
+        shards = [users[start:start + shard_size] for start in range(0, len(users), shard_size)]
+        shard_ratings = [[user_ratings_by_user[user] for user in shard] for shard in shards]
+
+        if n_jobs == 1 or len(shards) <= 1:
+            results = [self.recommend_shard(ratings, n_recommendations) for ratings in shard_ratings]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_batch_worker, initargs=(self,)) as pool:
+                results = list(pool.map(_score_shard, shard_ratings, [n_recommendations] * len(shards)))
+
+        return {user: recommendations
+                for shard, shard_results in zip(shards, results)
+                for user, recommendations in zip(shard, shard_results)}
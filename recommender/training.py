@@ -0,0 +1,163 @@
+"""
+Memory-bounded item-item Pearson similarity training.
+
+Ratings are kept as a sparse user x item matrix. Similarities are computed for one block
+of items at a time from the pairwise sufficient statistics of co-rating users
+(count, sums, sums of squares and cross products), which gives the same result as
+DataFrame.corr(method='pearson', min_periods=...) on the pivoted matrix.
+Only the top-N neighbours of every item are kept, so peak memory is proportional to
+block_size x items for the current block plus items x N for the result.
+"""
+import os
+import resource
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+SIMILARITY_UPPER_BOUND = 0.99
+
+# Matrices shared with the worker processes, set by _init_worker
+_worker_state: dict = {}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and its finished children in megabytes"""
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * unit / (1024 * 1024)
+
+
+def build_rating_matrix(user_ids, item_ids, ratings):
+    """
+    Build a CSC user x item rating matrix from three parallel arrays.
+    Returns the matrix, the sorted item ids (column order) and the item means.
+    """
+    user_ids = np.asarray(user_ids)
+    item_ids = np.asarray(item_ids)
+    ratings = np.asarray(ratings, dtype=np.float64)
+
+    unique_users, user_index = np.unique(user_ids, return_inverse=True)
+    unique_items, item_index = np.unique(item_ids, return_inverse=True)
+
+    pair_keys = user_index.astype(np.int64) * len(unique_items) + item_index
+    if len(np.unique(pair_keys)) != len(pair_keys):
+        raise ValueError("Index contains duplicate entries, cannot reshape")
+
+    matrix = sparse.csc_matrix((ratings, (user_index, item_index)),
+                               shape=(len(unique_users), len(unique_items)))
+    matrix.sort_indices()
+
+    counts = np.diff(matrix.indptr)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        item_means = np.asarray(matrix.sum(axis=0)).ravel() / counts
+    return matrix, unique_items, item_means
+
+
+def _init_worker(ratings, min_periods, n_similar_items):
+    indicator = ratings.copy()
+    indicator.data = np.ones_like(indicator.data)
+    squared = ratings.copy()
+    squared.data = squared.data ** 2
+
+    _worker_state.update({
+        'ratings': ratings.tocsc(),
+        'indicator': indicator.tocsc(),
+        'squared': squared.tocsc(),
+        'min_periods': min_periods,
+        'n_similar_items': n_similar_items,
+    })
+
+
+def pearson_from_statistics(n, sum_x, sum_y, sum_xx, sum_yy, sum_xy, min_periods: int) -> np.ndarray:
+    """
+    Pearson correlation of item pairs from the statistics of their co-rating users.
+    Pairs with fewer than min_periods co-ratings or zero variance get NaN, like DataFrame.corr
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = n * sum_xy - sum_x * sum_y
+        variance_x = n * sum_xx - sum_x ** 2
+        variance_y = n * sum_yy - sum_y ** 2
+        similarities = covariance / np.sqrt(variance_x * variance_y)
+    similarities[n < min_periods] = np.nan
+    return similarities
+
+
+def top_neighbours(similarities: np.ndarray, n: int):
+    """Positions and values of the n largest similarities, ties broken by position like Series.nlargest"""
+    positions = np.flatnonzero((similarities > 0) & (similarities < SIMILARITY_UPPER_BOUND))
+    values = similarities[positions]
+    if len(positions) > n:
+        nth_largest = np.partition(values, len(values) - n)[len(values) - n]
+        keep = values >= nth_largest
+        positions, values = positions[keep], values[keep]
+    order = np.lexsort((positions, -values))[:n]
+    return positions[order], values[order]
+
+
+def _similarity_block(start: int, stop: int):
+    """Pearson similarities of items [start, stop) against all items, reduced to top-N neighbours"""
+    ratings = _worker_state['ratings']
+    indicator = _worker_state['indicator']
+    squared = _worker_state['squared']
+
+    block_ratings = ratings[:, start:stop].T.tocsr()
+    block_indicator = indicator[:, start:stop].T.tocsr()
+    block_squared = squared[:, start:stop].T.tocsr()
+
+    # Statistics over users who rated both the block item (x) and the other item (y)
+    n = (block_indicator @ indicator).toarray()
+    sum_x = (block_ratings @ indicator).toarray()
+    sum_y = (block_indicator @ ratings).toarray()
+    sum_xx = (block_squared @ indicator).toarray()
+    sum_yy = (block_indicator @ squared).toarray()
+    sum_xy = (block_ratings @ ratings).toarray()
+
+    similarities = pearson_from_statistics(n, sum_x, sum_y, sum_xx, sum_yy, sum_xy, _worker_state['min_periods'])
+    return start, [top_neighbours(row, _worker_state['n_similar_items']) for row in similarities]
+
+
+def _block_ranges(n_items: int, block_size: int):
+    return [(start, min(start + block_size, n_items)) for start in range(0, n_items, block_size)]
+
+
+def compute_item_similarities(ratings_df: pd.DataFrame, n_similar_items: int = 200, min_periods: int = 10,
+                              block_size: int = None, n_jobs: int = None):
+    """
+    Compute item means and top-N Pearson neighbour lists from a ratings DataFrame
+    with userId/id/rating columns.
+    Returns (all_items, item_means Series, item_similarities dict) in ItemBasedCF layout.
+    """
+    matrix, item_ids, item_means = build_rating_matrix(
+        ratings_df['userId'].to_numpy(), ratings_df['id'].to_numpy(), ratings_df['rating'].to_numpy()
+    )
+    n_items = len(item_ids)
+    if block_size is None:
+        # Keep each dense statistics block around a few million cells
+        block_size = max(1, min(256, 2_000_000 // max(n_items, 1)))
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+
+    blocks = _block_ranges(n_items, block_size)
+    init_args = (matrix, min_periods, n_similar_items)
+    if n_jobs == 1 or len(blocks) == 1:
+        _init_worker(*init_args)
+        results = [_similarity_block(start, stop) for start, stop in blocks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=init_args) as pool:
+            results = list(pool.map(_similarity_block, *zip(*blocks)))
+
+    item_id_list = item_ids.tolist()
+    item_similarities = {}
+    for start, neighbours in results:
+        for offset, (positions, values) in enumerate(neighbours):
+            item_similarities[item_id_list[start + offset]] = {
+                item_id_list[position]: value for position, value in zip(positions.tolist(), values.tolist())
+            }
+
+    item_means_series = pd.Series(item_means, index=pd.Index(item_ids, name='id'))
+    return item_id_list, item_means_series, item_similarities
@@ -0,0 +1,236 @@
+"""
+Bulk import of the movie catalog from a CSV file (data/movies.csv).
+
+Every row is fingerprinted (Movie.content_hash) and rows whose fingerprint is unchanged are skipped,
+so a refresh costs time proportional to the changes. Movies missing from the file are deleted only when
+asked to (delete_missing), and never more than max_delete_fraction of the catalog at once: deleting a movie
+also deletes its ratings, comments and rating statistics.
+New and changed rows are processed in batches, each in one transaction:
+- genre, company and country names are resolved from in-memory maps, only unseen names are inserted;
+- movies are upserted with one bulk INSERT ... ON CONFLICT DO UPDATE;
+- the genre, company and country through rows of the batch are deleted and re-inserted in bulk;
+- keyword tags are re-extracted from the overviews.
+"""
+import csv
+import hashlib
+import json
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .keywords import set_movie_tags
+from .models import Genre, Company, Country, Movie, Rating, RatingEvent, PrecomputedRecommendation
+from .rated_sets import rated_sets
+from .recommendation_cache import bump_rating_version
+from .versions import bump_catalog_version, bump_movie_versions
+
+MOVIE_FIELDS = ['title', 'poster_path', 'overview', 'release_date', 'runtime', 'vote_average', 'vote_count',
+                'content_hash']
+
+# Movie M2M field -> (lookup model, CSV column)
+RELATIONS = {
+    'genres': (Genre, 'genres'),
+    'companies': (Company, 'production_companies'),
+    'countries': (Country, 'production_countries'),
+}
+
+
+class CatalogImportError(Exception):
+    """The import refused to delete the movies missing from the file"""
+
+
+def split_names(value):
+    """Comma separated names without blanks and repeats, in CSV order"""
+    names = (name.strip() for name in (value or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def parse_movie(row):
+    """Returns the Movie of a CSV row (not saved) and {m2m field: [names]}"""
+    release_date = None
+    if row.get('release_date'):
+        try:
+            release_date = datetime.strptime(row['release_date'], '%Y-%m-%d').date()
+        except ValueError:
+            release_date = None
+
+    movie = Movie(
+        id=int(row['id']),
+        title=row['title'][:255],
+        poster_path=row.get('poster_path') or None,
+        overview=row.get('overview') or '',
+        release_date=release_date,
+        runtime=int(row['runtime']) if row.get('runtime') else None,
+        vote_average=float(row['vote_average']) if row.get('vote_average') else None,
+        vote_count=int(row['vote_count']) if row.get('vote_count') else None,
+    )
+    relations = {field: split_names(row.get(column)) for field, (_, column) in RELATIONS.items()}
+    movie.content_hash = content_hash(movie, relations)
+    return movie, relations
+
+
+def content_hash(movie, relations):
+    """Fingerprint of the imported values of a movie, independent of the order of its names"""
+    values = [getattr(movie, field) for field in MOVIE_FIELDS if field != 'content_hash']
+    values.append({field: sorted(names) for field, names in relations.items()})
+    encoded = json.dumps(values, default=str, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+class CatalogImporter:
+    """
+    - delete_missing: delete the movies that are not in the imported rows (the rows are the whole catalog)
+    - max_delete_fraction: largest share of the catalog delete_missing may delete
+    After import_rows, summary holds the ids of the inserted, changed and deleted movies and the
+    number of unchanged ones, for whatever has to follow the catalog (caches, search indexes).
+    """
+
+    def __init__(self, batch_size: int = 1000, stdout=None, delete_missing: bool = False,
+                 max_delete_fraction: float = 0.1):
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.delete_missing = delete_missing
+        self.max_delete_fraction = max_delete_fraction
+        # m2m field -> {name: id}, loaded once and extended with the names inserted by the import
+        self.lookups = {
+            field: dict(model.objects.values_list('name', 'id'))
+            for field, (model, _) in RELATIONS.items()
+        }
+        self.rows = 0
+        self.summary = {"inserted": [], "changed": [], "deleted": [], "unchanged": 0}
+
+    def _log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message + "\n")
+
+    def _resolve(self, field, names):
+        """Inserts the names not seen yet into the lookup table of the field"""
+        model = RELATIONS[field][0]
+        lookup = self.lookups[field]
+        new_names = [name for name in dict.fromkeys(names) if name not in lookup]
+        if new_names:
+            model.objects.bulk_create([model(name=name) for name in new_names], ignore_conflicts=True)
+            lookup.update(model.objects.filter(name__in=new_names).values_list('name', 'id'))
+
+    def import_batch(self, parsed):
+        """Writes the new and changed movies of one batch of parse_movie results in a transaction"""
+        # A movie repeated in the batch is imported from its last row
+        parsed = {movie.id: (movie, relations) for movie, relations in parsed}
+        stored = dict(Movie.objects.filter(id__in=list(parsed)).values_list('id', 'content_hash'))
+        self.rows += len(parsed)
+
+        parsed = [(movie, relations) for movie, relations in parsed.values()
+                  if stored.get(movie.id) != movie.content_hash]
+        movie_ids = [movie.id for movie, _ in parsed]
+        changed = [movie_id for movie_id in movie_ids if movie_id in stored]
+        self.summary["inserted"] += [movie_id for movie_id in movie_ids if movie_id not in stored]
+        self.summary["changed"] += changed
+        self.summary["unchanged"] += len(stored) - len(changed)
+        if not parsed:
+            return
+
+        with transaction.atomic():
+            Movie.objects.bulk_create(
+                [movie for movie, _ in parsed],
+                update_conflicts=True, unique_fields=['id'], update_fields=MOVIE_FIELDS,
+            )
+            for field in RELATIONS:
+                self._resolve(field, [name for _, relations in parsed for name in relations[field]])
+                through = getattr(Movie, field).through
+                target = through._meta.get_field(RELATIONS[field][0]._meta.model_name).attname
+                through.objects.filter(movie_id__in=movie_ids).delete()
+                through.objects.bulk_create([
+                    through(movie_id=movie.id, **{target: self.lookups[field][name]})
+                    for movie, relations in parsed for name in relations[field]
+                ])
+            set_movie_tags((movie.id, movie.overview) for movie, _ in parsed)
+
+    def delete_missing_movies(self, seen_ids):
+        """
+        Deletes the movies that are not in the imported file, in batches, together with their ratings.
+        Raises CatalogImportError without deleting anything when the file is empty or when more than
+        max_delete_fraction of the catalog would be deleted.
+        """
+        catalog_size = 0
+        missing = []
+        for movie_id in Movie.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=self.batch_size):
+            catalog_size += 1
+            if movie_id not in seen_ids:
+                missing.append(movie_id)
+        if not missing:
+            return
+        if not seen_ids:
+            raise CatalogImportError("The file has no movies, refusing to delete the whole catalog")
+        if len(missing) > self.max_delete_fraction * catalog_size:
+            raise CatalogImportError(f"{len(missing)} of {catalog_size} movies are missing from the file, "
+                                     f"more than {self.max_delete_fraction:.0%} of the catalog; nothing was deleted")
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            with transaction.atomic():
+                # The ratings go with the movies, record them for the recommender like deleted ratings
+                rated = list(Rating.objects.filter(movie_id__in=batch).values_list('user_id', 'movie_id'))
+                changed_users = {user_id for user_id, _ in rated}
+                if settings.RECOMMENDER_INCREMENTAL_UPDATES:
+                    RatingEvent.objects.bulk_create([RatingEvent(user_id=user_id, movie_id=movie_id, score=None)
+                                                     for user_id, movie_id in rated])
+                PrecomputedRecommendation.objects.filter(user_id__in=changed_users).update(
+                    ratings_changed_at=timezone.now())
+                Movie.objects.filter(id__in=batch).delete()
+
+            # Cached recommendations and rated sets of these users are stale now
+            for user_id in changed_users:
+                bump_rating_version(user_id)
+                rated_sets.invalidate(user_id)
+            self.summary["deleted"] += batch
+
+    def import_rows(self, rows):
+        """Imports an iterable of CSV dict rows, returns the change summary"""
+        started = time.perf_counter()
+        seen_ids = set()
+        batch = []
+        for row in rows:
+            movie, relations = parse_movie(row)
+            seen_ids.add(movie.id)
+            batch.append((movie, relations))
+            if len(batch) == self.batch_size:
+                self.import_batch(batch)
+                batch = []
+                self._log(f"{self.rows} rows processed")
+        if batch:
+            self.import_batch(batch)
+        try:
+            if self.delete_missing:
+                self.delete_missing_movies(seen_ids)
+        finally:
+            # Also when the deletion is refused, the imported movies are written already
+            summary = self.summary
+            if summary["inserted"] or summary["changed"] or summary["deleted"]:
+                # Lets every worker rebuild its in-memory indexes of the catalog
+                bump_catalog_version()
+                # Cached movie page fragments of the changed and deleted movies are stale
+                bump_movie_versions(summary["changed"] + summary["deleted"])
+        elapsed = time.perf_counter() - started
+        self._log(f"Processed {self.rows} rows in {elapsed:.2f}s ({self.rows / max(elapsed, 1e-9):.0f} rows/s): "
+                  f"{len(summary['inserted'])} inserted, {len(summary['changed'])} changed, "
+                  f"{len(summary['deleted'])} deleted, {summary['unchanged']} unchanged")
+        return summary
+
+
+def import_movies_csv(csv_path, batch_size: int = 1000, stdout=None, delete_missing: bool = False,
+                      max_delete_fraction: float = 0.1, summary_path=None):
+    """
+    Imports the CSV file and returns the change summary.
+    - delete_missing, max_delete_fraction: see CatalogImporter
+    - summary_path: also write the summary there as JSON
+    """
+    with open(csv_path, encoding='utf-8', newline='') as f:
+        importer = CatalogImporter(batch_size, stdout, delete_missing, max_delete_fraction)
+        summary = importer.import_rows(csv.DictReader(f))
+    if summary_path:
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f)
+    return summary
@@ -0,0 +1,92 @@
+"""
+Cached HTML fragments of the movie page.
+
+The parts of the page that are the same for every viewer (poster, details, overview and the first page
+of comments) are rendered once and kept in the Django cache under the movie id and the movie's data
+version (versions.get_movie_versions). The importer and the comment and rating services bump the version,
+so a change renders the fragments again instead of waiting for a timeout. The versions are shared by every
+worker, so a per-process cache never serves fragments of an older version either.
+Per-viewer parts (the viewer's rating, forms with CSRF tokens, remove buttons of their own comments)
+are rendered on every request; remove buttons are stitched into the cached comments fragment.
+"""
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+# Fragment name -> template, rendered with the movie (and its first comment page) in the context
+MOVIE_FRAGMENTS = {
+    "poster": "_movie_poster.html",
+    "details": "_movie_details.html",
+    "overview": "_movie_overview.html",
+    "comments": "_movie_comments.html",
+}
+
+# Placeholder left in the comments fragment for the remove button, with the comment and author ids
+COMMENT_ACTIONS = re.compile(r"<!-- comment-actions:(\d+):(\d+) -->")
+
+
+class FragmentCache:
+    """
+    Fragments of one page kind, read and written with one cache round trip per request.
+    hits and misses count fragments served from the cache and rendered, per fragment name.
+    """
+
+    def __init__(self, prefix, timeout: int = 3600):
+        self.prefix = prefix
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def _key(self, name, object_id, version):
+        return f"fragment:{self.prefix}:{name}:{object_id}:{version}"
+
+    def get_many(self, object_id, version, names, render):
+        """
+        Returns {name: html} of the fragments.
+        - render: called with the names missing from the cache, returns {name: html} for them
+        """
+        keys = {self._key(name, object_id, version): name for name in names}
+        fragments = {keys[key]: html for key, html in cache.get_many(list(keys)).items()}
+        missing = [name for name in names if name not in fragments]
+        with self._lock:
+            self.hits.update(fragments.keys())
+            self.misses.update(missing)
+
+        if missing:
+            rendered = render(missing)
+            cache.set_many({self._key(name, object_id, version): rendered[name] for name in missing},
+                           timeout=self.timeout)
+            fragments.update(rendered)
+        return {name: mark_safe(html) for name, html in fragments.items()}
+
+    def hit_rate(self, name=None):
+        """Share of the fragments served from the cache, of one name or of all, None before any request"""
+        with self._lock:
+            hits = self.hits[name] if name else sum(self.hits.values())
+            total = hits + (self.misses[name] if name else sum(self.misses.values()))
+        return hits / total if total else None
+
+    def reset_counters(self):
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+movie_fragments = FragmentCache("movie", settings.MOVIE_FRAGMENT_TIMEOUT)
+
+
+def stitch_comment_actions(html, user_id, render_actions):
+    """
+    Replaces the comment action placeholders of a comments fragment: the viewer's own comments get
+    render_actions(comment_id), the others nothing.
+    """
+    def replace(match):
+        comment_id, author_id = int(match.group(1)), int(match.group(2))
+        return render_actions(comment_id) if author_id == user_id else ""
+
+    return mark_safe(COMMENT_ACTIONS.sub(replace, html))
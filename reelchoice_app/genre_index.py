@@ -0,0 +1,42 @@
+import re
+from array import array
+
+from django.db.models import F
+
+from .models import Movie
+from .section_pools import SectionPools
+from .versions import catalog_index_max_age
+
+# Category page titles of genre sections, e.g. "Top Horror Movies"
+GENRE_TITLE = re.compile(r"Top (.+) Movies")
+
+
+class GenreIndex(SectionPools):
+    """
+    Movie ids of every genre, best rated first, keyed by the lower-case genre name.
+    Built with one query over the genre through table and rebuilt like the home section pools.
+    """
+
+    def _load(self):
+        rows = (
+            Movie.genres.through.objects
+            .order_by(F('movie__vote_average').desc(nulls_last=True), 'movie_id')
+            .values_list('genre__name', 'movie_id')
+        )
+        index = {}
+        for genre_name, movie_id in rows.iterator():
+            index.setdefault(genre_name.lower(), array('q')).append(movie_id)
+        return index
+
+    def genre_ids(self, name):
+        """The genre's movie ids ordered by vote_average, or None for an unknown genre"""
+        return self.get_pools().get(name.lower())
+
+
+genre_index = GenreIndex(catalog_index_max_age())
+
+
+def genre_from_title(title):
+    """Returns the genre name of a "Top <genre> Movies" title, or None"""
+    match = GENRE_TITLE.fullmatch(title)
+    return match[1] if match else None
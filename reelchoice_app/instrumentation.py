@@ -0,0 +1,176 @@
+"""
+Per-request metrics: number of SQL queries, SQL time, template render time and recommender time.
+
+RequestMetricsMiddleware measures every request. It sends the totals in a Server-Timing header (shown by
+the browser dev tools), logs a summary line to the "reelchoice_app.requests" logger and warns when a view
+runs more queries than its budget for the request method in settings.QUERY_BUDGETS.
+The tests assert the same budgets.
+- queries are counted by a database execute wrapper installed on every connection, also those of the
+  threads the async ORM runs its queries on;
+- templates are timed by TimedDjangoTemplates, the template backend in settings.TEMPLATES;
+- other code times its parts with `with timed("recommender"): ...`.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+logger = logging.getLogger("reelchoice_app.requests")
+
+# Server-Timing metric name of every timed part
+TIMING_NAMES = {"db": "db", "template": "tpl", "recommender": "rec"}
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Totals of one request, timings in seconds"""
+
+    def __init__(self):
+        self.queries = 0
+        self.timings = dict.fromkeys(TIMING_NAMES, 0.0)
+        self.total = 0.0
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def server_timing(self):
+        """Value of the Server-Timing header"""
+        metrics = [f'db;dur={self.timings["db"] * 1000:.1f};desc="{self.queries} queries"']
+        metrics += [f"{TIMING_NAMES[name]};dur={self.timings[name] * 1000:.1f}"
+                    for name in ("template", "recommender")]
+        metrics.append(f"total;dur={self.total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+def current_metrics():
+    """Metrics of the request being measured in this context, or None"""
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """Adds the time spent in the block to the current request's timing `name`"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - started)
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.add("db", time.perf_counter() - started)
+
+
+def _install_recorder(connection, **kwargs):
+    # Every connection counts its queries into the metrics of the request in the current context: the async ORM
+    # runs them on sync_to_async threads with their own connections, which copy the request's context
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install_recorder)
+
+
+@contextmanager
+def measure():
+    """Collects the metrics of the block, yields the RequestMetrics"""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    started = time.perf_counter()
+    # Connections opened before this module was imported have not been sent connection_created
+    for connection in connections.all(initialized_only=True):
+        _install_recorder(connection)
+    try:
+        yield metrics
+    finally:
+        metrics.total = time.perf_counter() - started
+        _current.reset(token)
+
+
+def query_budget(view_name, method="GET"):
+    """Maximum number of queries of a view ("namespace:url name") for a request method, or None"""
+    return settings.QUERY_BUDGETS.get(view_name, {}).get(method)
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures every request. The metrics are attached to the response as response.request_metrics,
+    which is how the tests read them.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with measure() as metrics:
+            response = self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        with measure() as metrics:
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        response.request_metrics = metrics
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = metrics.server_timing()
+
+        match = getattr(request, "resolver_match", None)
+        view_name = match.view_name if match else "-"
+        logger.info("%s %s %s view=%s queries=%d db=%.1fms tpl=%.1fms rec=%.1fms total=%.1fms",
+                    request.method, request.path, response.status_code, view_name, metrics.queries,
+                    metrics.timings["db"] * 1000, metrics.timings["template"] * 1000,
+                    metrics.timings["recommender"] * 1000, metrics.total * 1000)
+        budget = query_budget(view_name, request.method)
+        if budget is not None and metrics.queries > budget:
+            logger.warning("%s %s ran %d queries, over the budget of %d for %s",
+                           request.method, request.path, metrics.queries, budget, view_name)
+        return response
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        with timed("template"):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with the render time of top-level templates added to the request metrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db import transaction
+
+from .models import MovieTag
+from .text import normalize
+
+
+def _normalized_phrases(keyword_tags):
+    return [(tag, [f" {normalize(phrase)} " for phrase in phrases]) for tag, phrases in keyword_tags.items()]
+
+
+def _match_tags(overview, normalized_phrases):
+    text = f" {normalize(overview)} "
+    return {tag for tag, phrases in normalized_phrases if any(phrase in text for phrase in phrases)}
+
+
+def extract_tags(overview, keyword_tags=None):
+    """
+    Returns the tags whose phrases occur in the overview as whole words, ignoring case,
+    accents and punctuation.
+    - keyword_tags: {tag: [phrase, ...]}, settings.MOVIE_KEYWORD_TAGS by default
+    """
+    if keyword_tags is None:
+        keyword_tags = settings.MOVIE_KEYWORD_TAGS
+    return _match_tags(overview, _normalized_phrases(keyword_tags))
+
+
+def set_movie_tags(movies):
+    """
+    Replaces the tags of the movies with the ones extracted from their overviews.
+    - movies: (movie_id, overview) pairs
+    """
+    movies = list(movies)
+    normalized_phrases = _normalized_phrases(settings.MOVIE_KEYWORD_TAGS)
+    with transaction.atomic():
+        MovieTag.objects.filter(movie_id__in=[movie_id for movie_id, _ in movies]).delete()
+        MovieTag.objects.bulk_create(
+            MovieTag(movie_id=movie_id, tag=tag)
+            for movie_id, overview in movies
+            for tag in sorted(_match_tags(overview, normalized_phrases))
+        )
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reelchoice_app.rating_io import export_ratings_csv, export_ratings_columns
+
+
+class Command(BaseCommand):
+    help = ("Streams the Rating table into a CSV file (userId, id, rating) or a columnar directory "
+            "that train_recommender --ratings reads without the database")
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="CSV file or columnar directory to write")
+        parser.add_argument('--format', choices=['csv', 'columns'], default='csv')
+        parser.add_argument('--chunk-size', type=int, default=50_000,
+                            help="Rows fetched from the database and written per round trip")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive")
+        export = export_ratings_csv if options['format'] == 'csv' else export_ratings_columns
+        started = time.perf_counter()
+        try:
+            rows = export(options['output'], chunk_size=options['chunk_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {rows} ratings to {options['output']} in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)"
+        ))
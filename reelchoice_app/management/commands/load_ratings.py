@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reelchoice_app.rating_io import load_ratings_csv
+
+
+class Command(BaseCommand):
+    help = ("Streams a ratings CSV (userId, id or movieId, rating) into the Rating table, creating placeholder "
+            "users for unknown userIds. Retrain the recommender afterwards")
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help="Ratings CSV file")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="Ratings written per transaction")
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help="Multiplier of the file's ratings, e.g. 2 for ratings from 0.5 to 5")
+        parser.add_argument('--on-conflict', choices=['update', 'ignore'], default='update',
+                            help="Overwrite or keep the score of ratings that already exist")
+        parser.add_argument('--username-prefix', default='imported_',
+                            help="Placeholder users are named <prefix><userId>")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive")
+        try:
+            summary = load_ratings_csv(
+                options['csv_path'],
+                batch_size=options['batch_size'],
+                scale=options['scale'],
+                update_existing=options['on_conflict'] == 'update',
+                username_prefix=options['username_prefix'],
+                stdout=self.stdout,
+            )
+        except OSError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {summary['loaded']} ratings ({summary['unchanged']} unchanged), "
+            f"created {summary['users_created']} users"
+        ))
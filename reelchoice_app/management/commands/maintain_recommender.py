@@ -0,0 +1,94 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from recommender.incremental import IncrementalItemSimilarity
+from recommender.model_format import save_binary_model
+from recommender.sparse import SparseItemScorer
+from reelchoice_app.models import RatingEvent
+from reelchoice_app.services import read_rating_columns
+
+
+class Command(BaseCommand):
+    help = ("Keep item similarities fresh between full retrains: apply logged rating changes to "
+            "co-rating statistics and rewrite the model loaded by the views")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.RECOMMENDER_MODEL_PATH),
+                            help="Model directory to write (default: RECOMMENDER_MODEL_PATH)")
+        parser.add_argument('--neighbours', type=int, default=200, help="Neighbours kept per movie")
+        parser.add_argument('--min-periods', type=int, default=10,
+                            help="Minimum number of users who rated both movies of a pair")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds between checks for new rating changes")
+        parser.add_argument('--flush-interval', type=float, default=5.0,
+                            help="Minimum seconds between two model writes")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rating changes applied per poll")
+        parser.add_argument('--once', action='store_true',
+                            help="Apply the pending changes, write the model and exit")
+
+    def _load_state(self, options):
+        started = time.perf_counter()
+        # Read the log position and the ratings in one transaction, so no change falls in between.
+        # Changes replayed on top of a snapshot that already contains them are no-ops
+        with transaction.atomic():
+            last_event_id = RatingEvent.objects.aggregate(last=Max('id'))['last'] or 0
+            ratings_df = read_rating_columns()
+
+        state = IncrementalItemSimilarity.from_ratings(
+            ratings_df['userId'], ratings_df['id'], ratings_df['rating'],
+            n_similar_items=options['neighbours'], min_periods=options['min_periods'],
+        )
+        self.stdout.write(f"Built statistics for {len(state.item_ids)} movies from {len(ratings_df)} ratings "
+                          f"in {time.perf_counter() - started:.2f}s")
+        return state, last_event_id
+
+    def _apply_events(self, state, last_event_id, batch_size):
+        events = list(
+            RatingEvent.objects.filter(id__gt=last_event_id)
+                               .order_by('id')
+                               .values_list('id', 'user_id', 'movie_id', 'score')[:batch_size]
+        )
+        for event_id, user_id, movie_id, score in events:
+            if score is None:
+                state.remove_rating(user_id, movie_id)
+            else:
+                state.set_rating(user_id, movie_id, score)
+            last_event_id = event_id
+        return last_event_id, len(events)
+
+    def _write_model(self, state, options, last_event_id):
+        if not state.item_ids:
+            self.stdout.write("No ratings yet, model not written")
+            return
+        header = save_binary_model(SparseItemScorer.from_model(state.to_model()), options['output'],
+                                   state.n_similar_items)
+        self.stdout.write(f"Wrote model {header['model_version']} "
+                          f"({len(state.changed_items)} movies with refreshed neighbours)")
+        state.changed_items.clear()
+        # Applied changes are part of the written model now
+        RatingEvent.objects.filter(id__lte=last_event_id).delete()
+
+    def handle(self, *args, **options):
+        state, last_event_id = self._load_state(options)
+        dirty = True
+        last_flush = 0.0
+
+        while True:
+            last_event_id, applied = self._apply_events(state, last_event_id, options['batch_size'])
+            dirty = dirty or applied > 0
+            if applied == options['batch_size']:
+                # More changes are waiting, keep applying before sleeping or writing
+                continue
+
+            if dirty and (options['once'] or time.monotonic() - last_flush >= options['flush_interval']):
+                self._write_model(state, options, last_event_id)
+                dirty = False
+                last_flush = time.monotonic()
+
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
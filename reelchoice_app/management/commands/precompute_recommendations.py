@@ -0,0 +1,80 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recommender.model_format import load_binary_model
+from reelchoice_app.models import PrecomputedRecommendation, Rating
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Precompute recommendations of active users into the precomputed recommendations table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=str(settings.RECOMMENDER_MODEL_PATH),
+                            help="Model directory (default: RECOMMENDER_MODEL_PATH)")
+        parser.add_argument('--active-days', type=int, default=30,
+                            help="Only users who logged in during the last N days, 0 for all users with ratings")
+        parser.add_argument('--top-k', type=int, default=settings.RECOMMENDATION_CACHE_TOP_K,
+                            help="Recommendations stored per user")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Users read and written per batch")
+        parser.add_argument('--jobs', type=int, default=1, help="Worker processes scoring user shards")
+
+    def _user_ids(self, active_days):
+        users = User.objects.filter(ratings__isnull=False)
+        if active_days:
+            users = users.filter(last_login__gte=timezone.now() - timedelta(days=active_days))
+        return list(users.order_by('id').values_list('id', flat=True).distinct())
+
+    def _user_ratings(self, user_ids):
+        """{user_id: {movie_id: score}} with every user's ratings ordered from oldest to newest"""
+        user_ratings = {user_id: {} for user_id in user_ids}
+        rows = (
+            Rating.objects.filter(user_id__in=user_ids)
+                          .order_by('user_id', 'created_at', 'id')
+                          .values_list('user_id', 'movie_id', 'score')
+                          .iterator(chunk_size=10_000)
+        )
+        for user_id, movie_id, score in rows:
+            user_ratings[user_id][movie_id] = score
+        return user_ratings
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        model = load_binary_model(options['model'])
+        user_ids = self._user_ids(options['active_days'])
+        batch_size = options['batch_size']
+
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+
+            # Rows must exist before the ratings are read: a rating written from now on marks
+            # them stale through ratings_changed_at, which the upsert below does not overwrite
+            PrecomputedRecommendation.objects.bulk_create(
+                [PrecomputedRecommendation(user_id=user_id) for user_id in batch], ignore_conflicts=True
+            )
+            computed_at = timezone.now()
+            recommendations = model.recommend_for_users(self._user_ratings(batch), options['top_k'],
+                                                        n_jobs=options['jobs'])
+
+            PrecomputedRecommendation.objects.bulk_create(
+                [
+                    PrecomputedRecommendation(user_id=user_id, items=items, model_version=model.model_version,
+                                              computed_at=computed_at)
+                    for user_id, items in recommendations.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['items', 'model_version', 'computed_at'],
+            )
+            self.stdout.write(f"Precomputed {min(start + batch_size, len(user_ids))}/{len(user_ids)} users")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Precomputed recommendations for {len(user_ids)} users with model {model.model_version} "
+            f"in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reelchoice_app.rating_stats import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the local rating aggregates of every movie from the Rating table, "
+            "e.g. after ratings were changed outside the services")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Movies written per bulk upsert")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        movies = rebuild_rating_stats(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rating aggregates of {movies} movies in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,38 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reelchoice_app.recommendation_service import RecommendationService
+
+
+class Command(BaseCommand):
+    help = ("Score recommendations for the web workers in a pool of worker processes, "
+            "listening on the Unix socket in RECOMMENDER_SERVICE_SOCKET")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.RECOMMENDER_SERVICE_SOCKET,
+                            help="Unix socket path (default: RECOMMENDER_SERVICE_SOCKET)")
+        parser.add_argument('--model', default=str(settings.RECOMMENDER_MODEL_PATH),
+                            help="Model directory (default: RECOMMENDER_MODEL_PATH)")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Scoring processes (default: number of CPUs)")
+        parser.add_argument('--batch-size', type=int, default=32, help="Most requests scored together")
+        parser.add_argument('--batch-wait', type=float, default=0.002,
+                            help="Seconds a batch waits for more requests")
+        parser.add_argument('--max-pending', type=int, default=256,
+                            help="Requests waiting for a worker before new ones are answered busy")
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError("Set RECOMMENDER_SERVICE_SOCKET or pass --socket")
+        service = RecommendationService(
+            options['model'], options['socket'], workers=options['workers'], batch_size=options['batch_size'],
+            batch_wait=options['batch_wait'], max_pending=options['max_pending'],
+            check_interval=settings.RECOMMENDER_RELOAD_INTERVAL,
+        )
+        self.stdout.write(f"Serving recommendations on {options['socket']} with {service.workers} workers")
+        try:
+            asyncio.run(service.serve_forever())
+        except KeyboardInterrupt:
+            self.stdout.write(f"Stopped after {service.served} requests, {service.rejected} rejected as busy")
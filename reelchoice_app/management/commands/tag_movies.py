@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from reelchoice_app.keywords import set_movie_tags
+from reelchoice_app.models import Movie
+from reelchoice_app.versions import bump_catalog_version
+
+
+class Command(BaseCommand):
+    help = "Re-extracts keyword tags from every movie overview, e.g. after MOVIE_KEYWORD_TAGS changes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Movies tagged per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch = []
+        tagged = 0
+        for movie in Movie.objects.order_by('id').values_list('id', 'overview').iterator(chunk_size=batch_size):
+            batch.append(movie)
+            if len(batch) == batch_size:
+                set_movie_tags(batch)
+                tagged += len(batch)
+                batch = []
+        if batch:
+            set_movie_tags(batch)
+            tagged += len(batch)
+
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Tagged {tagged} movies"))
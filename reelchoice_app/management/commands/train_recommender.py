@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recommender.model_format import save_binary_model
+from recommender.recommender import ItemBasedCF
+from recommender.sparse import SparseItemScorer
+from recommender.training import peak_rss_mb
+from reelchoice_app.rating_io import load_rating_columns
+from reelchoice_app.services import read_rating_columns
+
+
+def validate_model(scorer: SparseItemScorer):
+    """Raise CommandError if the trained model is not safe to serve"""
+    if not len(scorer.item_ids):
+        raise CommandError("Trained model has no items")
+    if not np.all(np.isfinite(scorer.item_means)):
+        raise CommandError("Trained model has non-finite item means")
+
+    similarities = scorer.similarity_matrix.data
+    if not len(similarities):
+        raise CommandError("Trained model has no item similarities, not enough co-rated movies")
+    if not np.all((similarities > 0) & (similarities < 1)):
+        raise CommandError("Trained model has similarities outside (0, 1)")
+
+
+class Command(BaseCommand):
+    help = "Train the item-based recommender on the Rating table and write the model loaded by the views"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.RECOMMENDER_MODEL_PATH),
+                            help="Model directory to write (default: RECOMMENDER_MODEL_PATH)")
+        parser.add_argument('--ratings', default=None,
+                            help="Train on a columnar export of export_ratings instead of the Rating table")
+        parser.add_argument('--chunk-size', type=int, default=50_000,
+                            help="Rows fetched from the database per round trip")
+        parser.add_argument('--mode', choices=['sparse', 'dense'], default='sparse')
+        parser.add_argument('--jobs', type=int, default=None, help="Worker processes for sparse training")
+        parser.add_argument('--neighbours', type=int, default=200, help="Neighbours kept per movie")
+        parser.add_argument('--min-periods', type=int, default=10,
+                            help="Minimum number of users who rated both movies of a pair")
+
+    def _phase(self, name: str, started: float):
+        self.stdout.write(f"{name}: {time.perf_counter() - started:.2f}s, peak memory {peak_rss_mb():.1f} MB")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['ratings']:
+            try:
+                ratings_df = load_rating_columns(options['ratings'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            ratings_df = read_rating_columns(options['chunk_size'])
+        self._phase(f"Read {len(ratings_df)} ratings", started)
+        if ratings_df.empty:
+            raise CommandError("There are no ratings to train on")
+
+        started = time.perf_counter()
+        model = ItemBasedCF(n_similar_items=options['neighbours'])
+        model.fit(ratings_df, mode=options['mode'], n_jobs=options['jobs'], min_periods=options['min_periods'])
+        self._phase("Training", started)
+
+        started = time.perf_counter()
+        scorer = SparseItemScorer.from_model(model)
+        validate_model(scorer)
+        self._phase("Validation", started)
+
+        started = time.perf_counter()
+        header = save_binary_model(scorer, options['output'], model.n_similar_items)
+        self._phase("Writing model", started)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Model {header['model_version']} with {header['n_items']} movies and "
+            f"{header['nnz']} similarities written to {options['output']}"
+        ))
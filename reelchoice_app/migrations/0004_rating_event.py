@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:32
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reelchoice_app', '0003_remove_movie_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(verbose_name='ID користувача')),
+                ('movie_id', models.IntegerField(verbose_name='ID фільму')),
+                ('score', models.IntegerField(blank=True, null=True, verbose_name='Оцінка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Час створення')),
+            ],
+            options={
+                'db_table': 'rating_event',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='vote_average',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(10)], verbose_name='Середній рейтинг'),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='score',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(10)], verbose_name='Оцінка'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('reelchoice_app', '0004_rating_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecomputedRecommendation',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='precomputed_recommendations', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('items', models.JSONField(default=list, verbose_name='Рекомендації')),
+                ('model_version', models.CharField(blank=True, max_length=64, verbose_name='Версія моделі')),
+                ('computed_at', models.DateTimeField(blank=True, null=True, verbose_name='Час обчислення')),
+                ('ratings_changed_at', models.DateTimeField(blank=True, null=True, verbose_name='Час зміни оцінок')),
+            ],
+            options={
+                'db_table': 'precomputed_recommendation',
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations, OperationalError
+
+# FTS5 index over movie titles and overviews. It is an external content table reading the text
+# from "movie", the triggers keep it in sync with every insert, update and delete.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE movie_fts USING fts5(
+        title, overview, content='movie', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER movie_fts_insert AFTER INSERT ON movie BEGIN
+        INSERT INTO movie_fts(rowid, title, overview) VALUES (new.id, new.title, new.overview);
+    END
+    """,
+    """
+    CREATE TRIGGER movie_fts_delete AFTER DELETE ON movie BEGIN
+        INSERT INTO movie_fts(movie_fts, rowid, title, overview) VALUES ('delete', old.id, old.title, old.overview);
+    END
+    """,
+    """
+    CREATE TRIGGER movie_fts_update AFTER UPDATE OF id, title, overview ON movie BEGIN
+        INSERT INTO movie_fts(movie_fts, rowid, title, overview) VALUES ('delete', old.id, old.title, old.overview);
+        INSERT INTO movie_fts(rowid, title, overview) VALUES (new.id, new.title, new.overview);
+    END
+    """,
+    "INSERT INTO movie_fts(movie_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS movie_fts_insert",
+    "DROP TRIGGER IF EXISTS movie_fts_delete",
+    "DROP TRIGGER IF EXISTS movie_fts_update",
+    "DROP TABLE IF EXISTS movie_fts",
+]
+
+
+def create_movie_fts(apps, schema_editor):
+    # Other databases, and SQLite builds without FTS5, use the LIKE search fallback
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_check USING fts5(text)")
+            cursor.execute("DROP TABLE temp.fts5_check")
+        except OperationalError:
+            return
+        for statement in CREATE_SQL:
+            cursor.execute(statement)
+
+
+def drop_movie_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP_SQL:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reelchoice_app', '0006_rating_user_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_movie_fts, drop_movie_fts),
+    ]
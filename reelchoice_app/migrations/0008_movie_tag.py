@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from reelchoice_app.keywords import extract_tags
+
+
+def tag_movies(apps, schema_editor):
+    # Tags of the existing movies, later kept up to date by the import and the tag_movies command
+    Movie = apps.get_model('reelchoice_app', 'Movie')
+    MovieTag = apps.get_model('reelchoice_app', 'MovieTag')
+    MovieTag.objects.bulk_create(
+        (MovieTag(movie_id=movie_id, tag=tag)
+         for movie_id, overview in Movie.objects.values_list('id', 'overview').iterator(chunk_size=2000)
+         for tag in sorted(extract_tags(overview, settings.MOVIE_KEYWORD_TAGS))),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reelchoice_app', '0007_movie_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=50, verbose_name='Тег')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='reelchoice_app.movie')),
+            ],
+            options={
+                'db_table': 'movie_tag',
+                'unique_together': {('tag', 'movie')},
+            },
+        ),
+        migrations.RunPython(tag_movies, migrations.RunPython.noop),
+    ]
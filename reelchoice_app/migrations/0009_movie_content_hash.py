@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+# The movie_fts triggers as created by 0007_movie_fts
+TRIGGER_SQL = [
+    "DROP TRIGGER IF EXISTS movie_fts_insert",
+    "DROP TRIGGER IF EXISTS movie_fts_delete",
+    "DROP TRIGGER IF EXISTS movie_fts_update",
+    """
+    CREATE TRIGGER movie_fts_insert AFTER INSERT ON movie BEGIN
+        INSERT INTO movie_fts(rowid, title, overview) VALUES (new.id, new.title, new.overview);
+    END
+    """,
+    """
+    CREATE TRIGGER movie_fts_delete AFTER DELETE ON movie BEGIN
+        INSERT INTO movie_fts(movie_fts, rowid, title, overview) VALUES ('delete', old.id, old.title, old.overview);
+    END
+    """,
+    """
+    CREATE TRIGGER movie_fts_update AFTER UPDATE OF id, title, overview ON movie BEGIN
+        INSERT INTO movie_fts(movie_fts, rowid, title, overview) VALUES ('delete', old.id, old.title, old.overview);
+        INSERT INTO movie_fts(rowid, title, overview) VALUES (new.id, new.title, new.overview);
+    END
+    """,
+    "INSERT INTO movie_fts(movie_fts) VALUES ('rebuild')",
+]
+
+
+def restore_movie_fts(apps, schema_editor):
+    # Re-creates the triggers and re-indexes the movies, if 0007 created the index
+    if schema_editor.connection.vendor != 'sqlite' \
+            or 'movie_fts' not in schema_editor.connection.introspection.table_names():
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in TRIGGER_SQL:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reelchoice_app', '0008_movie_tag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=32, verbose_name='Хеш рядка імпорту'),
+        ),
+        # SQLite rebuilds the movie table for the new column, which drops the FTS triggers
+        migrations.RunPython(restore_movie_fts, migrations.RunPython.noop),
+    ]
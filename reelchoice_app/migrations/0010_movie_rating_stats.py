@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def build_rating_stats(apps, schema_editor):
+    # Aggregates of the existing ratings, later kept up to date by the services
+    Rating = apps.get_model('reelchoice_app', 'Rating')
+    MovieRatingStats = apps.get_model('reelchoice_app', 'MovieRatingStats')
+    aggregates = Rating.objects.order_by('movie_id').values('movie_id').annotate(
+        rating_count=Count('id'),
+        score_sum=Sum('score'),
+        **{f'score_{score}_count': Count('id', filter=Q(score=score)) for score in range(1, 11)},
+    )
+    MovieRatingStats.objects.bulk_create(
+        (MovieRatingStats(average=row['score_sum'] / row['rating_count'], **row) for row in aggregates.iterator()),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reelchoice_app', '0009_movie_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieRatingStats',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='reelchoice_app.movie')),
+                ('rating_count', models.IntegerField(db_index=True, default=0, verbose_name='Кількість оцінок')),
+                ('score_sum', models.IntegerField(default=0, verbose_name='Сума оцінок')),
+                ('average', models.FloatField(blank=True, db_index=True, null=True, verbose_name='Середня оцінка')),
+                ('score_1_count', models.IntegerField(default=0, verbose_name='Оцінок 1')),
+                ('score_2_count', models.IntegerField(default=0, verbose_name='Оцінок 2')),
+                ('score_3_count', models.IntegerField(default=0, verbose_name='Оцінок 3')),
+                ('score_4_count', models.IntegerField(default=0, verbose_name='Оцінок 4')),
+                ('score_5_count', models.IntegerField(default=0, verbose_name='Оцінок 5')),
+                ('score_6_count', models.IntegerField(default=0, verbose_name='Оцінок 6')),
+                ('score_7_count', models.IntegerField(default=0, verbose_name='Оцінок 7')),
+                ('score_8_count', models.IntegerField(default=0, verbose_name='Оцінок 8')),
+                ('score_9_count', models.IntegerField(default=0, verbose_name='Оцінок 9')),
+                ('score_10_count', models.IntegerField(default=0, verbose_name='Оцінок 10')),
+            ],
+            options={
+                'db_table': 'movie_rating_stats',
+            },
+        ),
+        migrations.RunPython(build_rating_stats, migrations.RunPython.noop),
+    ]
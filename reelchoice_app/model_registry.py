@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from recommender.model_format import HEADER_FILE, load_binary_model, read_header
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Holds the recommendation model used by the views.
+    The model is loaded on first use (or by preload() before workers fork) and
+    swapped for a new one when the model directory is replaced on disk.
+    Requests keep the model object they received, so a swap never affects a request in flight.
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0, loader=load_binary_model):
+        self.path = path
+        self.check_interval = check_interval
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._model = None
+        self._signature = None
+        self._last_check = 0.0
+        self.version = None
+        self.loaded_at = None
+        self.load_seconds = None
+
+    def _file_signature(self):
+        """Identity of the model on disk, changes whenever the header is rewritten"""
+        stat = os.stat(os.path.join(self.path, HEADER_FILE))
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        start = time.perf_counter()
+        signature = self._file_signature()
+        model = self._loader(self.path)
+
+        self._model = model
+        self._signature = signature
+        self.version = getattr(model, 'model_version', None)
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - start
+        logger.info("Loaded recommendation model %s from %s in %.3fs", self.version, self.path, self.load_seconds)
+
+    def _is_stale(self) -> bool:
+        try:
+            signature = self._file_signature()
+        except FileNotFoundError:
+            # The directory is being swapped right now, keep serving the current model
+            return False
+        if signature == self._signature:
+            return False
+        if self.version is not None and read_header(self.path).get('model_version') == self.version:
+            # Same model rewritten in place, nothing to swap
+            self._signature = signature
+            return False
+        return True
+
+    def get_model(self):
+        """Return the current model, loading it or picking up a newer version when needed"""
+        model = self._model
+        if model is not None and time.monotonic() - self._last_check < self.check_interval:
+            return model
+
+        with self._lock:
+            self._last_check = time.monotonic()
+            if self._model is None:
+                self._load()
+            else:
+                try:
+                    if self._is_stale():
+                        self._load()
+                except Exception:
+                    # Keep serving the model we have, the next check will try again
+                    logger.exception("Failed to reload recommendation model from %s", self.path)
+            return self._model
+
+    def preload(self):
+        """Load the model eagerly, e.g. in the master process before workers fork"""
+        return self.get_model()
+
+    def reload(self):
+        """Load the model from disk unconditionally"""
+        with self._lock:
+            self._load()
+            self._last_check = time.monotonic()
+            return self._model
+
+    def info(self) -> dict:
+        return {
+            'path': self.path,
+            'loaded': self._model is not None,
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'load_seconds': self.load_seconds,
+        }
+
+
+model_registry = ModelRegistry(settings.RECOMMENDER_MODEL_PATH, settings.RECOMMENDER_RELOAD_INTERVAL)
+
+
+def get_recommender():
+    """Shortcut used by the views to get the current recommendation model"""
+    return model_registry.get_model()
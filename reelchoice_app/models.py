@@ -50,6 +50,8 @@ class Movie(models.Model):
         blank=True
     )
     vote_count = models.PositiveIntegerField("Кількість голосів", null=True, blank=True)
+    # Fingerprint of the imported CSV row, lets the importer skip unchanged movies
+    content_hash = models.CharField("Хеш рядка імпорту", max_length=32, blank=True, default="")
     countries = models.ManyToManyField(
         Country,
         related_name="movies",
@@ -77,6 +79,26 @@ class Movie(models.Model):
         return self.title
 
 
+class MovieTag(models.Model):
+    """
+    Keyword tag of a movie, extracted from its overview by import_movies (see settings.MOVIE_KEYWORD_TAGS).
+    Keyword-driven sections such as "Based on a true story" are looked up by tag.
+    """
+    movie = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='tags'
+    )
+    tag = models.CharField("Тег", max_length=50)
+
+    class Meta:
+        db_table = "movie_tag"
+        unique_together = ("tag", "movie")
+
+    def __str__(self):
+        return f"{self.movie_id}: {self.tag}"
+
+
 class Comment(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -94,6 +116,8 @@ class Comment(models.Model):
     class Meta:
         db_table = "comment"
         ordering = ["user", "created_at"]
+        # The movie page pages comments newest first, seeking on (created_at, id)
+        indexes = [models.Index(fields=["movie", "-created_at", "-id"], name="comment_movie_created_idx")]
 
     def __str__(self):
         return f"{self.user.username} on {self.movie.title}: {self.content[:30]}…"
@@ -119,6 +143,107 @@ class Rating(models.Model):
     class Meta:
         db_table = "rating"
         unique_together = ("user", "movie")
+        # "My ratings" pages seek on (created_at, id) within the user's ratings
+        indexes = [models.Index(fields=["user", "-created_at", "-id"], name="rating_user_created_idx")]
 
     def __str__(self):
         return f"{self.user.username} → {self.movie.title}: {self.score}"
+
+
+class MovieRatingStats(models.Model):
+    """
+    Aggregates of the local ratings of a movie: count, sum, average and the number of ratings of every score.
+    Kept up to date by rate_movie/delete_rating (see rating_stats.py), rebuilt by the rebuild_rating_stats command.
+    Movies without local ratings have no row.
+    """
+    movie = models.OneToOneField(
+        Movie,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rating_stats'
+    )
+    rating_count = models.IntegerField("Кількість оцінок", default=0, db_index=True)
+    score_sum = models.IntegerField("Сума оцінок", default=0)
+    average = models.FloatField("Середня оцінка", null=True, blank=True, db_index=True)
+    score_1_count = models.IntegerField("Оцінок 1", default=0)
+    score_2_count = models.IntegerField("Оцінок 2", default=0)
+    score_3_count = models.IntegerField("Оцінок 3", default=0)
+    score_4_count = models.IntegerField("Оцінок 4", default=0)
+    score_5_count = models.IntegerField("Оцінок 5", default=0)
+    score_6_count = models.IntegerField("Оцінок 6", default=0)
+    score_7_count = models.IntegerField("Оцінок 7", default=0)
+    score_8_count = models.IntegerField("Оцінок 8", default=0)
+    score_9_count = models.IntegerField("Оцінок 9", default=0)
+    score_10_count = models.IntegerField("Оцінок 10", default=0)
+
+    class Meta:
+        db_table = "movie_rating_stats"
+
+    def histogram(self):
+        """[(score, number of ratings), ...] for scores 1 to 10"""
+        return [(score, getattr(self, f"score_{score}_count")) for score in range(1, 11)]
+
+    def __str__(self):
+        return f"{self.movie_id}: {self.average} ({self.rating_count})"
+
+
+class RatingEvent(models.Model):
+    """
+    Append-only log of rating changes consumed by the maintain_recommender command.
+    score is None when the rating was deleted.
+    """
+    user_id = models.BigIntegerField("ID користувача")
+    movie_id = models.IntegerField("ID фільму")
+    score = models.IntegerField("Оцінка", null=True, blank=True)
+    created_at = models.DateTimeField("Час створення", auto_now_add=True)
+
+    class Meta:
+        db_table = "rating_event"
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.user_id} → {self.movie_id}: {self.score}"
+
+
+class PrecomputedRecommendation(models.Model):
+    """
+    Ranked recommendations written by the precompute_recommendations command.
+    A row is stale when the user's ratings changed after it was computed
+    or when it was computed with another model version.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='precomputed_recommendations'
+    )
+    items = models.JSONField("Рекомендації", default=list)
+    model_version = models.CharField("Версія моделі", max_length=64, blank=True)
+    computed_at = models.DateTimeField("Час обчислення", null=True, blank=True)
+    ratings_changed_at = models.DateTimeField("Час зміни оцінок", null=True, blank=True)
+
+    class Meta:
+        db_table = "precomputed_recommendation"
+
+    def is_fresh(self, model_version):
+        if self.computed_at is None or self.model_version != model_version:
+            return False
+        return self.ratings_changed_at is None or self.ratings_changed_at < self.computed_at
+
+    def __str__(self):
+        return f"{self.user_id}: {len(self.items)} recommendations ({self.model_version})"
+
+
+class DataVersion(models.Model):
+    """
+    Version counters shared by every worker process, e.g. of a user's ratings.
+    In-process caches keep the version their entry was built at and drop the entry when it changed.
+    """
+    key = models.CharField("Ключ", max_length=100, primary_key=True)
+    value = models.BigIntegerField("Версія")
+
+    class Meta:
+        db_table = "data_version"
+
+    def __str__(self):
+        return f"{self.key}: {self.value}"
@@ -0,0 +1,141 @@
+"""
+Cursor pagination.
+
+Pages are addressed by opaque signed tokens instead of page numbers, so fetching a page never
+counts or skips the rows before it:
+- paginate_keyset seeks a queryset past the ordering key of the last row shown (keyset pagination),
+- paginate_sequence walks a precomputed ranking (an id pool or list) by position.
+"""
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = "reelchoice_app.pagination"
+
+
+def encode_cursor(direction, values):
+    """
+    - direction: "next" (rows after the key) or "prev" (rows before it)
+    - values: the ordering key, datetimes are sent as ISO strings
+    """
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+    return signing.dumps([direction, values], salt=CURSOR_SALT)
+
+
+def decode_cursor(token):
+    """Returns (direction, values), or (None, None) for a missing or tampered token"""
+    if not token:
+        return None, None
+    try:
+        direction, values = signing.loads(token, salt=CURSOR_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None, None
+    if direction not in ("next", "prev"):
+        return None, None
+    return direction, values
+
+
+class CursorPage:
+    """
+    One page of results.
+    count is the total number of results, or None when it was not computed.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None, start_index=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.start_index = start_index
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def end_index(self):
+        return None if self.start_index is None else self.start_index + len(self.object_list) - 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _seek(ordering, values, forward):
+    """Q matching the rows that come after (forward) or before the key values in the given ordering"""
+    condition = Q()
+    for position, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') == forward else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        for equal_field, value in zip(ordering[:position], values[:position]):
+            step &= Q(**{equal_field.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def paginate_keyset(queryset, ordering, cursor=None, per_page=15, with_count=False):
+    """
+    Returns the CursorPage of queryset ordered by ordering, e.g. ('-created_at', '-id').
+    The last field must be unique, so the key identifies a row. The page costs one indexed seek
+    regardless of its depth; with_count adds a COUNT(*) query.
+    """
+    ordering = list(ordering)
+    count = queryset.count() if with_count else None
+    direction, values = decode_cursor(cursor)
+    if direction is not None and len(values) != len(ordering):
+        direction = None
+
+    if direction == "prev":
+        rows = list(queryset.filter(_seek(ordering, values, False)).order_by(*_reverse(ordering))[:per_page + 1])
+        has_previous, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+    else:
+        if direction == "next":
+            queryset = queryset.filter(_seek(ordering, values, True))
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        has_previous, has_next = direction == "next", len(rows) > per_page
+        rows = rows[:per_page]
+
+    def key(row):
+        return [getattr(row, field.lstrip('-')) for field in ordering]
+
+    return CursorPage(
+        rows,
+        next_cursor=encode_cursor("next", key(rows[-1])) if rows and has_next else None,
+        previous_cursor=encode_cursor("prev", key(rows[0])) if rows and has_previous else None,
+        count=count,
+    )
+
+
+def paginate_sequence(sequence, cursor=None, per_page=15):
+    """
+    Returns the CursorPage of a precomputed ranking, anything supporting len() and slicing.
+    The cursor holds the position of the page, so only its slice is read.
+    """
+    direction, values = decode_cursor(cursor)
+    count = len(sequence)
+    offset = 0
+    if direction is not None and len(values) == 1 and isinstance(values[0], int):
+        offset = min(max(values[0], 0), max(count - 1, 0))
+
+    rows = list(sequence[offset:offset + per_page])
+    return CursorPage(
+        rows,
+        next_cursor=encode_cursor("next", [offset + per_page]) if offset + per_page < count else None,
+        previous_cursor=encode_cursor("prev", [max(offset - per_page, 0)]) if offset > 0 else None,
+        count=count,
+        start_index=offset + 1 if rows else 0,
+    )
@@ -0,0 +1,216 @@
+import asyncio
+import random
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .models import Rating
+from .recommendation_cache import get_rating_version, aget_rating_version, recommendation_executor
+from .section_pools import section_pools
+
+# Number of set bits in every byte value
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.int64)
+
+
+class RatedBitset:
+    """
+    The movies a user has rated, as one bit per movie of the catalog.
+    Bit i belongs to catalog_ids[i] (catalog ids are sorted), so membership, updates and
+    sampling of unrated movies are O(1) per movie and the set takes n_movies / 8 bytes.
+    """
+
+    def __init__(self, catalog_ids: np.ndarray, rated_ids=()):
+        self.catalog_ids = catalog_ids
+        size = len(catalog_ids)
+        self.bits = np.zeros((size + 7) // 8, dtype=np.uint8)
+        # Padding bits of the last byte are marked as rated, so they are never counted or returned
+        if size % 8:
+            self.bits[-1] = 0xFF & ~((1 << (size % 8)) - 1)
+        self._unrated_totals = None
+
+        positions = self._known_positions(rated_ids)
+        np.bitwise_or.at(self.bits, positions >> 3, (1 << (positions & 7)).astype(np.uint8))
+
+    def _known_positions(self, movie_ids) -> np.ndarray:
+        movie_ids = np.fromiter(movie_ids, dtype=np.int64)
+        positions = np.searchsorted(self.catalog_ids, movie_ids)
+        inside = positions < len(self.catalog_ids)
+        positions, movie_ids = positions[inside], movie_ids[inside]
+        return positions[self.catalog_ids[positions] == movie_ids]
+
+    def _position(self, movie_id):
+        position = int(np.searchsorted(self.catalog_ids, movie_id))
+        if position < len(self.catalog_ids) and self.catalog_ids[position] == movie_id:
+            return position
+        return None
+
+    def _is_set(self, position: int) -> bool:
+        return bool(self.bits[position >> 3] >> (position & 7) & 1)
+
+    def __contains__(self, movie_id) -> bool:
+        position = self._position(movie_id)
+        return position is not None and self._is_set(position)
+
+    def set(self, movie_id, rated: bool = True):
+        """Marks the movie as rated or unrated, movies outside the catalog are ignored"""
+        position = self._position(movie_id)
+        if position is None:
+            return
+        if rated:
+            self.bits[position >> 3] |= 1 << (position & 7)
+        else:
+            self.bits[position >> 3] &= ~(1 << (position & 7)) & 0xFF
+        self._unrated_totals = None
+
+    def unrated_totals(self) -> np.ndarray:
+        """Running number of unrated movies up to and including every byte of the bitset"""
+        if self._unrated_totals is None:
+            self._unrated_totals = np.cumsum(POPCOUNT[~self.bits])
+        return self._unrated_totals
+
+    def unrated_count(self) -> int:
+        totals = self.unrated_totals()
+        return int(totals[-1]) if len(totals) else 0
+
+    def unrated_page(self, offset: int, limit: int) -> list:
+        """Ids of the unrated movies number offset .. offset + limit - 1, in id order"""
+        totals = self.unrated_totals()
+        if limit <= 0 or offset >= self.unrated_count():
+            return []
+        # Only the bytes holding the requested movies are unpacked
+        first_byte = int(np.searchsorted(totals, offset, side='right'))
+        last_byte = int(np.searchsorted(totals, offset + limit, side='left'))
+        skip = offset - (int(totals[first_byte - 1]) if first_byte else 0)
+        window = np.unpackbits(self.bits[first_byte:last_byte + 1], bitorder='little')
+        positions = np.flatnonzero(window == 0)[skip:skip + limit] + first_byte * 8
+        return self.catalog_ids[positions].tolist()
+
+    def sample_unrated(self, k: int, max_tries: int = 20) -> list:
+        """
+        Returns up to k distinct random unrated movie ids.
+        Rejection sampling takes O(k) draws while most of the catalog is unrated,
+        after k * max_tries misses the remaining movies are sampled from the full unrated list.
+        """
+        size = len(self.catalog_ids)
+        chosen = []
+        seen = set()
+        for _ in range(k * max_tries):
+            if len(chosen) == k or len(seen) == size:
+                break
+            position = random.randrange(size)
+            if position in seen:
+                continue
+            seen.add(position)
+            if not self._is_set(position):
+                chosen.append(position)
+
+        result = self.catalog_ids[chosen].tolist()
+        if len(result) < k:
+            already_chosen = set(result)
+            remaining = [movie_id for movie_id in self.unrated_page(0, self.unrated_count())
+                         if movie_id not in already_chosen]
+            result += random.sample(remaining, min(k - len(result), len(remaining)))
+        return result
+
+
+class UnratedIds:
+    """Sequence of the ids of the movies a user has not rated, in id order; slices unpack only their bytes"""
+
+    def __init__(self, rated: RatedBitset):
+        self.rated = rated
+
+    def __len__(self):
+        return self.rated.unrated_count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        return self.rated.unrated_page(start, stop - start)
+
+
+class RatedSetCache:
+    """
+    Per-user LRU cache of rated-movie bitsets.
+    An entry is valid while the user's rating version and the catalog id pool it was built on are unchanged.
+    Rating writes in this process update the entry in place, other workers rebuild it from Rating.
+    """
+
+    def __init__(self, max_users: int = 10_000):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id) -> RatedBitset:
+        catalog = section_pools.get_pools()["catalog"]
+        rating_version = get_rating_version(user_id)
+        rated = self._lookup(user_id, rating_version, catalog)
+        if rated is None:
+            rated = RatedBitset(np.frombuffer(catalog, dtype=np.int64),
+                                Rating.objects.filter(user_id=user_id).values_list('movie_id', flat=True))
+            self._store(user_id, rating_version, catalog, rated)
+        return rated
+
+    async def aget(self, user_id, rating_version=None) -> RatedBitset:
+        """
+        get for async views: the rated ids are read with the async ORM and the bitset is built in
+        recommendation_executor, so the event loop and the request's sync thread never wait for it.
+        - rating_version: the user's version if the caller has already read it
+        """
+        catalog = (await section_pools.aget())["catalog"]
+        if rating_version is None:
+            rating_version = await aget_rating_version(user_id)
+        rated = self._lookup(user_id, rating_version, catalog)
+        if rated is None:
+            rated_ids = [movie_id async for movie_id in
+                         Rating.objects.filter(user_id=user_id).values_list('movie_id', flat=True)]
+            rated = await asyncio.get_running_loop().run_in_executor(
+                recommendation_executor, RatedBitset, np.frombuffer(catalog, dtype=np.int64), rated_ids)
+            self._store(user_id, rating_version, catalog, rated)
+        return rated
+
+    def _lookup(self, user_id, rating_version, catalog):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == rating_version and entry[1] is catalog:
+                self._entries.move_to_end(user_id)
+                return entry[2]
+            return None
+
+    def _store(self, user_id, rating_version, catalog, rated):
+        with self._lock:
+            self._entries[user_id] = (rating_version, catalog, rated)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def rating_changed(self, user_id, movie_id, rated: bool, rating_version):
+        """
+        Applies a committed rating write to the cached entry.
+        - rating_version: the version the write bumped to; the entry is only carried over if it was
+          exactly one version behind, otherwise another worker wrote in between and it is rebuilt
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if entry[0] + 1 != rating_version:
+                del self._entries[user_id]
+                return
+            entry[2].set(movie_id, rated)
+            self._entries[user_id] = (rating_version, entry[1], entry[2])
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+rated_sets = RatedSetCache(settings.RATED_SETS_MAX_USERS)
@@ -0,0 +1,267 @@
+"""
+Streaming bulk load and export of the Rating table.
+
+Both directions read and write fixed-size batches, so memory does not grow with the number of ratings:
+- RatingLoader reads a CSV file (userId, id or movieId, rating), creates the missing users as
+  placeholders with one bulk INSERT per batch and upserts the ratings of the batch in one transaction;
+- export_ratings streams the table with values_list(...).iterator() into a CSV file or into a columnar
+  directory with one raw binary file per column and a header.json, which load_rating_columns opens
+  with np.memmap for training without going through the database.
+"""
+import csv
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Movie, Rating, RatingEvent, PrecomputedRecommendation
+from .rated_sets import rated_sets
+from .rating_stats import rebuild_movie_rating_stats
+from .recommendation_cache import bump_rating_version
+
+User = get_user_model()
+
+# CSV columns, the layout expected by ItemBasedCF.fit; MovieLens files name the movie column movieId
+USER_COLUMN = 'userId'
+MOVIE_COLUMNS = ('id', 'movieId')
+SCORE_COLUMN = 'rating'
+
+COLUMNS_FORMAT_NAME = 'reelchoice-ratings'
+COLUMNS_FORMAT_VERSION = 1
+COLUMNS_HEADER_FILE = 'header.json'
+# Column name -> dtype of its raw file in the columnar format
+COLUMN_DTYPES = {'userId': '<i8', 'id': '<i8', 'rating': '<i1'}
+
+
+class RatingLoader:
+    """
+    Loads ratings from CSV rows in batches.
+    - scale: multiplier of the file's ratings, e.g. 2 for files rated from 0.5 to 5
+    - update_existing: overwrite the score of ratings that already exist, otherwise keep them
+    - username_prefix: placeholder users are named <prefix><userId of the file>
+    After load_rows, summary counts the rows read, the ratings written (loaded), the rows that matched
+    an existing rating and changed nothing (unchanged), the skipped rows and the users created.
+    """
+
+    def __init__(self, batch_size: int = 10_000, scale: float = 1.0, update_existing: bool = True,
+                 username_prefix: str = 'imported_', stdout=None):
+        self.batch_size = batch_size
+        self.scale = scale
+        self.update_existing = update_existing
+        self.username_prefix = username_prefix
+        self.stdout = stdout
+        # Catalog ids, ratings of movies that are not imported are skipped
+        self.movie_ids = set(Movie.objects.values_list('id', flat=True))
+        self.summary = {"rows": 0, "loaded": 0, "unchanged": 0, "users_created": 0,
+                        "unknown_movie": 0, "invalid_score": 0, "malformed": 0}
+
+    def _log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message + "\n")
+
+    def parse_row(self, row):
+        """Returns (username, movie_id, score) of a CSV row, or None if the row is skipped"""
+        try:
+            movie_id = int(next(row[column] for column in MOVIE_COLUMNS if row.get(column)))
+            username = self.username_prefix + row[USER_COLUMN].strip()
+            # round() raises ValueError for nan and OverflowError for inf
+            score = round(float(row[SCORE_COLUMN]) * self.scale)
+        except (KeyError, ValueError, OverflowError, StopIteration, AttributeError):
+            self.summary["malformed"] += 1
+            return None
+        if movie_id not in self.movie_ids:
+            self.summary["unknown_movie"] += 1
+            return None
+        if not 1 <= score <= 10:
+            self.summary["invalid_score"] += 1
+            return None
+        return username, movie_id, score
+
+    def _user_ids(self, usernames):
+        """{username: user id} of the batch, the missing users are created without a usable password"""
+        user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+        missing = [username for username in usernames if username not in user_ids]
+        if missing:
+            password = make_password(None)
+            User.objects.bulk_create([User(username=username, password=password) for username in missing],
+                                     ignore_conflicts=True)
+            created = dict(User.objects.filter(username__in=missing).values_list('username', 'id'))
+            self.summary["users_created"] += len(created)
+            user_ids.update(created)
+        return user_ids
+
+    def load_batch(self, parsed):
+        """Writes one batch of parse_row results in a transaction"""
+        # A (user, movie) pair repeated in the batch is loaded from its last row
+        scores = {(username, movie_id): score for username, movie_id, score in parsed}
+        with transaction.atomic():
+            user_ids = self._user_ids(list({username for username, _ in scores}))
+            ratings = [Rating(user_id=user_ids[username], movie_id=movie_id, score=score)
+                       for (username, movie_id), score in scores.items()]
+            # Ratings that exist with the same score, or at all when they are kept, are not written
+            existing = dict(
+                ((user_id, movie_id), score) for user_id, movie_id, score in
+                Rating.objects.filter(user_id__in={rating.user_id for rating in ratings},
+                                      movie_id__in={rating.movie_id for rating in ratings})
+                              .values_list('user_id', 'movie_id', 'score')
+            )
+            unchanged = len(ratings)
+            if self.update_existing:
+                ratings = [rating for rating in ratings
+                           if existing.get((rating.user_id, rating.movie_id)) != rating.score]
+                Rating.objects.bulk_create(ratings, update_conflicts=True,
+                                           unique_fields=['user', 'movie'], update_fields=['score'])
+            else:
+                ratings = [rating for rating in ratings if (rating.user_id, rating.movie_id) not in existing]
+                Rating.objects.bulk_create(ratings, ignore_conflicts=True)
+            unchanged -= len(ratings)
+
+            if settings.RECOMMENDER_INCREMENTAL_UPDATES:
+                # maintain_recommender applies the written ratings like ratings given on the site
+                RatingEvent.objects.bulk_create([RatingEvent(user_id=rating.user_id, movie_id=rating.movie_id,
+                                                             score=rating.score) for rating in ratings])
+            changed_users = {rating.user_id for rating in ratings}
+            PrecomputedRecommendation.objects.filter(user_id__in=changed_users).update(
+                ratings_changed_at=timezone.now())
+            # The written movies are recomputed with one GROUP BY instead of a delta per rating
+            rebuild_movie_rating_stats({rating.movie_id for rating in ratings})
+        self.summary["loaded"] += len(ratings)
+        self.summary["unchanged"] += unchanged
+
+        # Cached recommendations and rated sets of these users are stale now
+        for user_id in changed_users:
+            bump_rating_version(user_id)
+            rated_sets.invalidate(user_id)
+
+    def load_rows(self, rows):
+        """Loads an iterable of CSV dict rows, returns the summary"""
+        started = time.perf_counter()
+        batch = []
+        for row in rows:
+            self.summary["rows"] += 1
+            parsed = self.parse_row(row)
+            if parsed is None:
+                continue
+            batch.append(parsed)
+            if len(batch) == self.batch_size:
+                self.load_batch(batch)
+                batch = []
+                self._log(f"{self.summary['rows']} rows processed")
+        if batch:
+            self.load_batch(batch)
+
+        summary = self.summary
+        elapsed = time.perf_counter() - started
+        self._log(f"Processed {summary['rows']} rows in {elapsed:.2f}s "
+                  f"({summary['rows'] / max(elapsed, 1e-9):.0f} rows/s): {summary['loaded']} loaded, "
+                  f"{summary['unchanged']} unchanged, "
+                  f"{summary['users_created']} users created, skipped {summary['unknown_movie']} unknown movies, "
+                  f"{summary['invalid_score']} invalid scores, {summary['malformed']} malformed rows")
+        return summary
+
+
+def load_ratings_csv(csv_path, **options):
+    """Loads the ratings of a CSV file, options are those of RatingLoader. Returns the summary"""
+    with open(csv_path, encoding='utf-8', newline='') as f:
+        return RatingLoader(**options).load_rows(csv.DictReader(f))
+
+
+def _rating_rows(chunk_size):
+    return Rating.objects.order_by('id').values_list('user_id', 'movie_id', 'score').iterator(chunk_size=chunk_size)
+
+
+def export_ratings_csv(path, chunk_size: int = 50_000):
+    """Writes every rating as a userId,id,rating row, returns the number of rows"""
+    rows = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([USER_COLUMN, MOVIE_COLUMNS[0], SCORE_COLUMN])
+        chunk = []
+        for row in _rating_rows(chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                writer.writerows(chunk)
+                rows += len(chunk)
+                chunk = []
+        writer.writerows(chunk)
+        rows += len(chunk)
+    return rows
+
+
+def export_ratings_columns(path, chunk_size: int = 50_000):
+    """
+    Writes every rating into the columnar directory `path`, returns the number of rows.
+    Every chunk is appended to the column files, header.json is written last, so a directory
+    without a header is an interrupted export.
+    """
+    os.makedirs(path, exist_ok=True)
+    header_path = os.path.join(path, COLUMNS_HEADER_FILE)
+    if os.path.exists(header_path):
+        os.remove(header_path)
+
+    files = {name: open(os.path.join(path, f"{name}.bin"), 'wb') for name in COLUMN_DTYPES}
+    rows = 0
+    try:
+        chunk = []
+
+        def write_chunk():
+            columns = zip(*chunk)
+            for (name, dtype), values in zip(COLUMN_DTYPES.items(), columns):
+                files[name].write(np.array(values, dtype=dtype).tobytes())
+
+        for row in _rating_rows(chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                write_chunk()
+                rows += len(chunk)
+                chunk = []
+        if chunk:
+            write_chunk()
+            rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    with open(header_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': COLUMNS_FORMAT_NAME,
+            'format_version': COLUMNS_FORMAT_VERSION,
+            'rows': rows,
+            'columns': COLUMN_DTYPES,
+            'exported_at': timezone.now().isoformat(),
+        }, f, indent=2)
+    return rows
+
+
+def load_rating_columns(path):
+    """
+    Opens a columnar export as a DataFrame with 'userId', 'id' and 'rating' columns,
+    the layout of services.read_rating_columns. The id columns are memory-mapped.
+    """
+    header_path = os.path.join(path, COLUMNS_HEADER_FILE)
+    if not os.path.exists(header_path):
+        raise ValueError(f"{path} is not a ratings export or the export did not finish")
+    with open(header_path, encoding='utf-8') as f:
+        header = json.load(f)
+    if header.get('format') != COLUMNS_FORMAT_NAME or header.get('format_version') != COLUMNS_FORMAT_VERSION:
+        raise ValueError(f"Unsupported ratings export format in {path}")
+
+    columns = {}
+    for name, dtype in header['columns'].items():
+        if header['rows']:
+            columns[name] = np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode='r',
+                                      shape=(header['rows'],))
+        else:
+            columns[name] = np.empty(0, dtype=dtype)
+    return pd.DataFrame({
+        'userId': columns['userId'],
+        'id': columns['id'],
+        'rating': columns['rating'].astype(np.float64),
+    })
@@ -0,0 +1,108 @@
+"""
+Local rating aggregates of every movie (MovieRatingStats).
+
+Rating writes apply their delta with one UPDATE of F expressions, so concurrent writes never lose a
+change and no Rating aggregate is needed to show or sort by the local statistics.
+Writes that bypass the services are repaired by recomputing the aggregates with a GROUP BY over the Rating
+table: rebuild_movie_rating_stats for the movies a bulk load wrote, rebuild_rating_stats for every movie
+(e.g. after cascaded deletes of users).
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, NullIf
+
+from .models import MovieRatingStats, Rating
+from .versions import bump_movie_versions
+
+SCORES = range(1, 11)
+
+
+def _score_count_field(score):
+    return f"score_{score}_count"
+
+
+def update_rating_stats(movie_id, old_score, new_score):
+    """
+    Applies one rating change to the movie's aggregates, call it in the transaction of the write.
+    - old_score: the previous score, or None if the rating is new
+    - new_score: the new score, or None if the rating was deleted
+    """
+    if old_score == new_score:
+        return
+    count_delta = (new_score is not None) - (old_score is not None)
+    sum_delta = (new_score or 0) - (old_score or 0)
+
+    # The right-hand sides of an UPDATE see the old row, so the average is computed from the old values too
+    updates = {
+        'rating_count': F('rating_count') + count_delta,
+        'score_sum': F('score_sum') + sum_delta,
+        'average': Cast(F('score_sum') + sum_delta, FloatField()) / NullIf(F('rating_count') + count_delta, 0),
+    }
+    if old_score is not None:
+        updates[_score_count_field(old_score)] = F(_score_count_field(old_score)) - 1
+    if new_score is not None:
+        updates[_score_count_field(new_score)] = F(_score_count_field(new_score)) + 1
+
+    if not MovieRatingStats.objects.filter(movie_id=movie_id).update(**updates):
+        # No row yet: the first rating of the movie, or ratings written around the services.
+        # The aggregate runs after the write, so it already includes this change
+        _write_stats(MovieRatingStats(**row) for row in _aggregates(Rating.objects.filter(movie_id=movie_id)))
+
+
+STATS_FIELDS = ['rating_count', 'score_sum', 'average'] + [_score_count_field(score) for score in SCORES]
+
+
+def _aggregates(ratings):
+    """Aggregate rows of the ratings per movie, dicts of movie_id and the MovieRatingStats fields"""
+    rows = ratings.order_by('movie_id').values('movie_id').annotate(
+        rating_count=Count('id'),
+        score_sum=Sum('score'),
+        **{_score_count_field(score): Count('id', filter=Q(score=score)) for score in SCORES},
+    )
+    for row in rows.iterator(chunk_size=5000):
+        row['average'] = row['score_sum'] / row['rating_count']
+        yield row
+
+
+def _write_stats(stats):
+    MovieRatingStats.objects.bulk_create(list(stats), update_conflicts=True, unique_fields=['movie'],
+                                         update_fields=STATS_FIELDS)
+
+
+def rebuild_movie_rating_stats(movie_ids, batch_size: int = 500):
+    """
+    Recomputes the aggregates of the given movies from their ratings, call it in the transaction of the write.
+    The movie versions are bumped when the transaction commits.
+    """
+    movie_ids = list(movie_ids)
+    for start in range(0, len(movie_ids), batch_size):
+        batch = movie_ids[start:start + batch_size]
+        _write_stats(MovieRatingStats(**row) for row in _aggregates(Rating.objects.filter(movie_id__in=batch)))
+        MovieRatingStats.objects.filter(movie_id__in=batch).exclude(
+            movie_id__in=Rating.objects.filter(movie_id__in=batch).values('movie_id')).delete()
+
+    # Movie pages show the aggregates
+    transaction.on_commit(lambda: bump_movie_versions(movie_ids))
+
+
+def rebuild_rating_stats(batch_size: int = 5000):
+    """Recomputes the aggregates of every movie from the Rating table, returns the number of rated movies"""
+    movies = 0
+    with transaction.atomic():
+        batch = []
+        for row in _aggregates(Rating.objects.all()):
+            batch.append(MovieRatingStats(**row))
+            if len(batch) == batch_size:
+                _write_stats(batch)
+                movies += len(batch)
+                batch = []
+        _write_stats(batch)
+        movies += len(batch)
+        unrated = MovieRatingStats.objects.exclude(movie_id__in=Rating.objects.values('movie_id'))
+        unrated_ids = list(unrated.values_list('movie_id', flat=True))
+        unrated.delete()
+
+    # Movie pages show the aggregates
+    bump_movie_versions(Rating.objects.values_list('movie_id', flat=True).distinct().iterator())
+    bump_movie_versions(unrated_ids)
+    return movies
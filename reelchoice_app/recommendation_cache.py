@@ -0,0 +1,160 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+
+from .instrumentation import timed
+from .model_registry import get_recommender
+from .models import Rating, PrecomputedRecommendation
+from .recommendation_service import arecommend
+from .versions import get_versions, aget_versions, bump_versions
+
+
+def _rating_version_key(user_id):
+    return f"recommendations:rating-version:{user_id}"
+
+
+def get_rating_version(user_id):
+    """Returns the counter that changes whenever the user's ratings change, the same in every worker"""
+    key = _rating_version_key(user_id)
+    return get_versions([key])[key]
+
+
+async def aget_rating_version(user_id):
+    key = _rating_version_key(user_id)
+    return (await aget_versions([key]))[key]
+
+
+def bump_rating_version(user_id):
+    """Invalidates cached recommendations of the user in every worker, returns the new version"""
+    key = _rating_version_key(user_id)
+    bump_versions([key])
+    # Another write may bump in between, the version read back is then newer than this write's,
+    # which only makes callers drop their entry instead of updating it
+    return get_versions([key])[key]
+
+
+async def aget_precomputed_recommendations(user_id, model_version):
+    """Returns the list written by precompute_recommendations, or None if there is none or it is stale"""
+    precomputed = await PrecomputedRecommendation.objects.filter(user_id=user_id).afirst()
+    if precomputed is None or not precomputed.is_fresh(model_version):
+        return None
+    return [(movie_id, score) for movie_id, score in precomputed.items]
+
+
+async def aget_user_ratings(user_id):
+    """The user's ratings as {movie_id: score}, ordered from oldest to newest as the recommender expects"""
+    ratings = Rating.objects.filter(user_id=user_id).order_by('created_at', 'id').values_list('movie_id', 'score')
+    return {movie_id: score async for movie_id, score in ratings}
+
+
+# CPU-bound and blocking in-memory work of the async views (scoring, model loads, rated-set bitsets) runs here,
+# neither on the event loop nor on the request's thread-sensitive sync thread, which runs its queries.
+# The pool is bounded, so a burst of cache misses queues up instead of starting a thread per request
+recommendation_executor = ThreadPoolExecutor(max_workers=settings.RECOMMENDER_EXECUTOR_WORKERS,
+                                             thread_name_prefix="recommender")
+
+
+class RecommendationCache:
+    """
+    Per-user LRU cache of the ranked top-K recommendations.
+    An entry is valid while the user's rating version and the loaded model version are unchanged;
+    callers that need fewer than K items get a slice of the cached list.
+    With the recommendation service, the async lookups key entries on the model version the service
+    last reported (service_model_version), so the web workers do not load the model themselves.
+    """
+
+    def __init__(self, max_users: int = 10_000, top_k: int = 100):
+        self.max_users = max_users
+        self.top_k = top_k
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.service_model_version = None
+
+    @staticmethod
+    def _model_key(model):
+        return getattr(model, 'model_version', None) or id(model)
+
+    async def aget_recommendations(self, user_id, n_recommendations: int = 10, rating_version=None):
+        """
+        Returns [(movie_id, score), ...] for the user, best first. The lookups use the async ORM,
+        scoring runs in the recommendation service or in recommendation_executor (see _ascore).
+        - rating_version: the user's version if the caller has already read it
+        """
+        with timed("recommender"):
+            if settings.RECOMMENDER_SERVICE_SOCKET:
+                model, model_key = None, self.service_model_version
+            else:
+                # Loading the model reads files only, so it does not hold up the request's sync thread
+                model = await asyncio.get_running_loop().run_in_executor(recommendation_executor, get_recommender)
+                model_key = self._model_key(model)
+            if n_recommendations > self.top_k:
+                _, recommendations = await self._ascore(model, await aget_user_ratings(user_id), n_recommendations)
+                return recommendations
+
+            if rating_version is None:
+                rating_version = await aget_rating_version(user_id)
+            recommendations = self._lookup(user_id, rating_version, model_key)
+            if recommendations is None:
+                # Until the service has reported its model version, no precomputed list is known to be fresh
+                if model_key is not None:
+                    recommendations = await aget_precomputed_recommendations(user_id, model_key)
+                if recommendations is None:
+                    model_key, recommendations = await self._ascore(model, await aget_user_ratings(user_id),
+                                                                    self.top_k)
+                self._store(user_id, rating_version, model_key, recommendations)
+            return recommendations[:n_recommendations]
+
+    async def _ascore(self, model, ratings, n_recommendations):
+        """
+        Returns (model version, recommendations). Scores in the recommendation service when
+        RECOMMENDER_SERVICE_SOCKET is set, otherwise with the model in recommendation_executor.
+        Service errors (RecommendationServiceError) are left to the views' fallbacks
+        """
+        if settings.RECOMMENDER_SERVICE_SOCKET:
+            # Entries cached under an older version miss from now on, the service has retrained
+            self.service_model_version, recommendations = await arecommend(
+                settings.RECOMMENDER_SERVICE_SOCKET, ratings, n_recommendations,
+                settings.RECOMMENDER_SERVICE_TIMEOUT)
+            return self.service_model_version, recommendations
+        recommendations = await asyncio.get_running_loop().run_in_executor(
+            recommendation_executor, partial(model.recommend_items, ratings, n_recommendations=n_recommendations))
+        return self._model_key(model), recommendations
+
+    def _lookup(self, user_id, rating_version, model_key):
+        """The cached list of the user if it is still valid, counted as a hit or a miss"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == rating_version and entry[1] == model_key:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def _store(self, user_id, rating_version, model_key, recommendations):
+        with self._lock:
+            self._entries[user_id] = (rating_version, model_key, recommendations)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """Drops one user's entry, or every entry when user_id is None"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+recommendation_cache = RecommendationCache(settings.RECOMMENDATION_CACHE_MAX_USERS,
+                                           settings.RECOMMENDATION_CACHE_TOP_K)
@@ -0,0 +1,208 @@
+"""
+Recommendation scoring outside the web workers.
+
+`manage.py run_recommender_service` starts RecommendationService. It listens on a Unix socket and scores
+in a pool of worker processes, each with its own ModelRegistry over the memory-mapped model directory,
+so the workers share the model pages read-only and pick up a retrained model like the web workers do.
+The web workers call it with arecommend when settings.RECOMMENDER_SERVICE_SOCKET is set.
+
+Protocol: one JSON line per connection each way.
+- request: {"ratings": [[movie_id, score], ...] (oldest first), "n": int, "deadline": unix time}
+- response: {"items": [[movie_id, score], ...], "model_version": str} or {"error": "busy" | "expired" | ...}
+
+Requests arriving within batch_wait seconds are scored together with SparseItemScorer.recommend_shard,
+one batch per worker process at a time. When a worker process dies (e.g. killed for memory), the pool
+is replaced and the batches it was scoring are answered with an error. At most max_pending requests wait for a worker, further ones
+are answered "busy" at once, so an overloaded service sheds load instead of queueing past every deadline.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationServiceError(Exception):
+    """The service could not answer in time: not running, busy, past the deadline or failed"""
+
+
+# Model registry of a worker process, set by _init_worker
+_worker_registry = None
+
+
+def _init_worker(model_path, check_interval):
+    global _worker_registry
+    _worker_registry = ModelRegistry(model_path, check_interval)
+    _worker_registry.preload()
+
+
+def _score_batch(users_ratings, n_recommendations):
+    """Runs in a worker process, returns the model version and the recommendations of every user"""
+    model = _worker_registry.get_model()
+    return getattr(model, 'model_version', None), model.recommend_shard(users_ratings, n_recommendations)
+
+
+class RecommendationService:
+    """
+    - workers: scoring processes, one batch in flight each
+    - batch_size, batch_wait: most requests scored together, seconds a batch waits for more requests
+    - max_pending: requests waiting for a worker before new ones are answered "busy"
+    """
+
+    def __init__(self, model_path, socket_path, workers: int = None, batch_size: int = 32,
+                 batch_wait: float = 0.002, max_pending: int = 256, check_interval: float = 5.0):
+        self.model_path = str(model_path)
+        self.socket_path = str(socket_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_pending = max_pending
+        self.check_interval = check_interval
+        self.served = 0
+        self.rejected = 0
+        self.pool_restarts = 0
+        self._queue = None
+        self._pool = None
+        self._server = None
+        self._dispatchers = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._pool = self._new_pool()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        logger.info("Recommendation service listening on %s with %d workers", self.socket_path, self.workers)
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.model_path, self.check_interval))
+
+    def _replace_pool(self, broken):
+        # Every dispatcher with a batch in the broken pool gets here, the first one replaces it
+        if self._pool is broken:
+            logger.error("A scoring process died, starting a new pool of %d workers", self.workers)
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+            self.pool_restarts += 1
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._pool.shutdown(cancel_futures=True)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle(self, reader, writer):
+        try:
+            request = json.loads(await reader.readline())
+            if self._queue.qsize() >= self.max_pending:
+                self.rejected += 1
+                response = {"error": "busy"}
+            else:
+                future = asyncio.get_running_loop().create_future()
+                ratings = {int(movie_id): float(score) for movie_id, score in request["ratings"]}
+                self._queue.put_nowait((ratings, int(request["n"]), request.get("deadline"), future))
+                response = await future
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        except (ValueError, KeyError, TypeError) as exc:
+            writer.write(json.dumps({"error": f"bad request: {exc}"}).encode() + b"\n")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _next_batch(self):
+        """Waits for a request, then collects more for up to batch_wait seconds; drops expired requests"""
+        batch = [await self._queue.get()]
+        collect_until = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), collect_until - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+
+        now = time.time()
+        live = []
+        for ratings, n, deadline, future in batch:
+            if future.done():
+                continue
+            if deadline is not None and deadline < now:
+                future.set_result({"error": "expired"})
+            else:
+                live.append((ratings, n, deadline, future))
+        return live
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+            n_recommendations = max(n for _, n, _, _ in batch)
+            pool = self._pool
+            try:
+                model_version, results = await loop.run_in_executor(
+                    pool, _score_batch, [ratings for ratings, _, _, _ in batch], n_recommendations)
+            except BrokenProcessPool:
+                self._replace_pool(pool)
+                for *_, future in batch:
+                    future.set_result({"error": "scoring process died"})
+                continue
+            except Exception as exc:
+                logger.exception("Scoring a batch of %d requests failed", len(batch))
+                for *_, future in batch:
+                    future.set_result({"error": f"scoring failed: {exc}"})
+                continue
+            self.served += len(batch)
+            for (_, n, _, future), items in zip(batch, results):
+                if not future.done():
+                    future.set_result({"items": items[:n], "model_version": model_version})
+
+
+async def _exchange(socket_path, request):
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        return await reader.readline()
+    finally:
+        writer.close()
+
+
+async def arecommend(socket_path, user_ratings: dict, n_recommendations: int = 10, timeout: float = 0.5):
+    """
+    Recommendations of the service for ratings {movie_id: score} ordered from oldest to newest,
+    as (model_version, [(movie_id, score), ...]) with the version of the model that scored them.
+    Raises RecommendationServiceError when there is no answer within timeout seconds.
+    """
+    request = {"ratings": list(user_ratings.items()), "n": n_recommendations, "deadline": time.time() + timeout}
+    try:
+        line = await asyncio.wait_for(_exchange(socket_path, request), timeout)
+    except asyncio.TimeoutError:
+        raise RecommendationServiceError(f"No answer from {socket_path} within {timeout}s") from None
+    except OSError as exc:
+        raise RecommendationServiceError(f"Cannot reach {socket_path}: {exc}") from exc
+
+    response = json.loads(line) if line else {"error": "connection closed"}
+    if "error" in response:
+        raise RecommendationServiceError(response["error"])
+    return response.get("model_version"), [(int(movie_id), float(score)) for movie_id, score in response["items"]]
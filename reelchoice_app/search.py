@@ -0,0 +1,103 @@
+"""
+Movie search over titles and overviews.
+
+On SQLite with FTS5 the movie_fts index (migration 0007) is queried and matches are ranked by
+BM25, title hits weighing more than overview hits, boosted by the movie's vote_average and
+vote_count. Other databases fall back to LIKE filters ordered by title hits and vote_count.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Movie
+
+# bm25() column weights of title and overview
+TITLE_WEIGHT = 10.0
+OVERVIEW_WEIGHT = 1.0
+# bm25() is negative, better matches are lower; it is multiplied by
+# 1 + VOTE_AVERAGE_BOOST * vote_average / 10 + VOTE_COUNT_BOOST * min(vote_count, VOTE_COUNT_CAP) / VOTE_COUNT_CAP
+VOTE_AVERAGE_BOOST = 0.5
+VOTE_COUNT_BOOST = 1.0
+VOTE_COUNT_CAP = 10_000
+
+RANKED_SQL = f"""
+    SELECT movie.id
+    FROM movie_fts JOIN movie ON movie.id = movie_fts.rowid
+    WHERE movie_fts MATCH %s
+    ORDER BY bm25(movie_fts, {TITLE_WEIGHT}, {OVERVIEW_WEIGHT}) * (
+        1.0 + {VOTE_AVERAGE_BOOST} * COALESCE(movie.vote_average, 0) / 10.0
+            + {VOTE_COUNT_BOOST} * MIN(COALESCE(movie.vote_count, 0), {VOTE_COUNT_CAP}) / {float(VOTE_COUNT_CAP)}
+    ), movie.id
+    LIMIT %s OFFSET %s
+"""
+
+COUNT_SQL = "SELECT COUNT(*) FROM movie_fts WHERE movie_fts MATCH %s"
+
+_fts_available = None
+
+
+def fts_available():
+    """True when the movie_fts index exists in the database"""
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = connection.vendor == 'sqlite' and 'movie_fts' in connection.introspection.table_names()
+    return _fts_available
+
+
+def match_expression(text):
+    """
+    Turns user input into an FTS5 query: every word has to match, the last one as a prefix.
+    Words are quoted, so FTS5 operators in the input are searched for as plain text.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return " ".join(terms)
+
+
+class SearchResults:
+    """
+    Ranked movies matching a search, for paginate_sequence.
+    Only the rows of the requested slice are loaded.
+    """
+
+    def __init__(self, text):
+        self.text = (text or '').strip()
+        self.match = match_expression(self.text)
+        self.use_fts = self.match is not None and fts_available()
+
+    def _fallback(self):
+        return (
+            Movie.objects.filter(Q(title__icontains=self.text) | Q(overview__icontains=self.text))
+            .annotate(title_hit=Case(When(title__icontains=self.text, then=Value(0)),
+                                     default=Value(1), output_field=IntegerField()))
+            .order_by('title_hit', '-vote_count', 'id')
+        )
+
+    def __len__(self):
+        if not self.text:
+            return 0
+        if self.use_fts:
+            with connection.cursor() as cursor:
+                cursor.execute(COUNT_SQL, [self.match])
+                return cursor.fetchone()[0]
+        return self._fallback().count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if not self.text or stop <= start:
+            return []
+        if not self.use_fts:
+            return list(self._fallback()[start:stop])
+
+        with connection.cursor() as cursor:
+            cursor.execute(RANKED_SQL, [self.match, stop - start, start])
+            movie_ids = [row[0] for row in cursor.fetchall()]
+        movies = Movie.objects.in_bulk(movie_ids)
+        return [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
+
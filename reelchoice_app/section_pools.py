@@ -0,0 +1,86 @@
+import math
+import random
+from array import array
+
+from django.conf import settings
+
+from .models import Movie, MovieTag
+from .versions import CatalogIndex, catalog_index_max_age
+
+
+def _viewers_choice_ids():
+    return Movie.objects.order_by('-vote_average').values_list('id', flat=True)[:50]
+
+
+def _popular_ids():
+    # Top 20% of the catalog by number of votes, the fallback for "Recommended for you"
+    limit = int(math.ceil(Movie.objects.count() * 0.2))
+    return Movie.objects.order_by('-vote_count').values_list('id', flat=True)[:limit]
+
+
+def _popular_top_rated_ids():
+    # The Viewers' Choice category page: the best rated 100 of the top 20% by number of votes
+    return Movie.objects.filter(id__in=_popular_ids()).order_by('-vote_average').values_list('id', flat=True)[:100]
+
+
+def _tag_ids(tag):
+    return lambda: MovieTag.objects.filter(tag=tag).order_by('movie_id').values_list('movie_id', flat=True)
+
+
+def _catalog_ids():
+    return Movie.objects.order_by('id').values_list('id', flat=True)
+
+
+# Home page sections served from pools, name -> query returning the section's movie ids.
+# "catalog" holds every movie id in ascending order, the index of the per-user rated bitsets
+SECTION_QUERIES = {
+    "catalog": _catalog_ids,
+    "viewers_choice": _viewers_choice_ids,
+    "popular": _popular_ids,
+    "popular_top_rated": _popular_top_rated_ids,
+}
+# Keyword sections, "tag:<tag>" -> ids of the movies tagged at import
+SECTION_QUERIES.update({f"tag:{tag}": _tag_ids(tag) for tag in settings.MOVIE_KEYWORD_TAGS})
+
+EMPTY_POOL = array('q')
+
+
+def _sample(pool, k):
+    return [pool[i] for i in random.sample(range(len(pool)), min(k, len(pool)))]
+
+
+class SectionPools(CatalogIndex):
+    """
+    Compact arrays of candidate movie ids for every home page section.
+    Pools are rebuilt when the catalog version changes or when they get older than max_age,
+    and sampling picks k ids in O(k) without touching the database.
+    """
+
+    def _load(self):
+        return {name: array('q', query()) for name, query in SECTION_QUERIES.items()}
+
+    def get_pools(self):
+        """Returns {section name: array of movie ids}"""
+        return self.get()
+
+    def sample(self, name, k):
+        """Returns up to k distinct random movie ids from the section's pool"""
+        return _sample(self.get_pools().get(name, EMPTY_POOL), k)
+
+    async def asample(self, name, k):
+        """sample for async views"""
+        return _sample((await self.aget()).get(name, EMPTY_POOL), k)
+
+
+section_pools = SectionPools(catalog_index_max_age())
+
+
+async def afetch_sections(section_ids):
+    """
+    Loads the movies of several sections with one query.
+    - section_ids: {section key: [movie ids]}
+    Returns {section key: [Movie, ...]} keeping the order of the ids.
+    """
+    all_ids = {movie_id for ids in section_ids.values() for movie_id in ids}
+    movies = await Movie.objects.ain_bulk(all_ids) if all_ids else {}
+    return {key: [movies[movie_id] for movie_id in ids if movie_id in movies] for key, ids in section_ids.items()}
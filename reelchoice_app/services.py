@@ -1,11 +1,42 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
-from .models import Movie, Comment, Rating
+from .models import Movie, Comment, Rating, RatingEvent, PrecomputedRecommendation
+from .pagination import paginate_keyset
+from .rated_sets import rated_sets
+from .rating_stats import update_rating_stats
+from .recommendation_cache import bump_rating_version
+from .versions import bump_movie_versions
 
 User = get_user_model()
 
+
+def _rating_changed(user, movie_id, score):
+    """
+    Records a rating change for the recommender.
+    - score: the new score, or None if the rating was deleted
+    """
+    if settings.RECOMMENDER_INCREMENTAL_UPDATES:
+        RatingEvent.objects.create(user_id=user.pk, movie_id=movie_id, score=score)
+    PrecomputedRecommendation.objects.filter(user=user).update(ratings_changed_at=timezone.now())
+
+    def after_commit():
+        # Bump after commit, so a concurrent request cannot cache recommendations from the old ratings
+        rated_sets.rating_changed(user.pk, movie_id, score is not None, bump_rating_version(user.pk))
+        # The movie page shows the local rating aggregates
+        bump_movie_versions([movie_id])
+
+    transaction.on_commit(after_commit)
+
+
 def rate_movie(user, movie_id, score):
     """
     Sets or updates the rating for a movie on behalf of the user.
@@ -17,11 +48,16 @@ def rate_movie(user, movie_id, score):
 
     movie = get_object_or_404(Movie, pk=movie_id)
 
-    rating, created = Rating.objects.update_or_create(
-        user=user,
-        movie=movie,
-        defaults={'score': score}
-    )
+    with transaction.atomic():
+        old_score = (Rating.objects.select_for_update().filter(user=user, movie=movie)
+                                   .values_list('score', flat=True).first())
+        rating, created = Rating.objects.update_or_create(
+            user=user,
+            movie=movie,
+            defaults={'score': score}
+        )
+        update_rating_stats(movie.id, old_score, score)
+        _rating_changed(user, movie.id, score)
     return rating
 
 
@@ -32,7 +68,11 @@ def delete_rating(user, movie_id):
     """
     rating = Rating.objects.filter(user=user, movie_id=movie_id).first()
     if rating:
-        rating.delete()
+        with transaction.atomic():
+            # Nothing to undo when a concurrent request deleted it first
+            if Rating.objects.filter(pk=rating.pk).delete()[0]:
+                update_rating_stats(movie_id, rating.score, None)
+            _rating_changed(user, movie_id, None)
         return True
     return False
 
@@ -53,6 +93,7 @@ def write_comment(user, movie_id, content):
         movie=movie,
         content=text
     )
+    transaction.on_commit(lambda: bump_movie_versions([movie.id]))
     return comment
 
 
@@ -62,6 +103,7 @@ def delete_comment(comment_id):
     """
     comment = get_object_or_404(Comment, id=comment_id)
     comment.delete()
+    transaction.on_commit(lambda: bump_movie_versions([comment.movie_id]))
 
 
 def get_user_ratings_data(user):
@@ -181,3 +223,37 @@ def get_movie_comments(movie_id):
                .order_by('created_at')
     )
     return comments
+
+
+def get_comment_page(movie_id, cursor=None, per_page=None):
+    """
+    Returns a CursorPage of the movie's comments, newest first, with their users joined.
+    - cursor: next_cursor of the previous page, None for the first page
+    """
+    return paginate_keyset(
+        Comment.objects.select_related('user').filter(movie_id=movie_id),
+        ('-created_at', '-id'), cursor, per_page=per_page or settings.COMMENTS_PER_PAGE,
+    )
+
+
+def read_rating_columns(chunk_size=50_000):
+    """
+    Returns all ratings as a DataFrame with 'userId', 'id' and 'rating' columns,
+    the layout expected by ItemBasedCF.fit.
+    Rows are streamed with values_list(...).iterator(), so no Rating objects are built
+    and the result set is never cached as a whole.
+    """
+    user_ids = array('q')
+    movie_ids = array('q')
+    scores = array('d')
+    rows = Rating.objects.order_by().values_list('user_id', 'movie_id', 'score').iterator(chunk_size=chunk_size)
+    for user_id, movie_id, score in rows:
+        user_ids.append(user_id)
+        movie_ids.append(movie_id)
+        scores.append(score)
+
+    return pd.DataFrame({
+        'userId': np.frombuffer(user_ids, dtype=np.int64),
+        'id': np.frombuffer(movie_ids, dtype=np.int64),
+        'rating': np.frombuffer(scores, dtype=np.float64),
+    })
@@ -0,0 +1,47 @@
+document.addEventListener("DOMContentLoaded", function () {
+  const button = document.getElementById("loadMoreComments");
+  const list = document.getElementById("commentList");
+  const template = document.getElementById("commentTemplate");
+
+  if (!button || !list || !template) return;
+
+  function field(node, name) {
+    return node.querySelector('[data-field="' + name + '"]');
+  }
+
+  function render(comment) {
+    const node = template.content.firstElementChild.cloneNode(true);
+    field(node, "initial").textContent = comment.username.charAt(0);
+    field(node, "username").textContent = comment.username;
+    field(node, "created_at").textContent = comment.created_at_display;
+    field(node, "content").textContent = comment.content;
+
+    const own = field(node, "own");
+    if (comment.own) {
+      own.querySelector('input[name="delete_comment"]').value = comment.id;
+    } else {
+      own.remove();
+    }
+    return node;
+  }
+
+  button.addEventListener("click", function () {
+    button.disabled = true;
+    fetch(button.dataset.url + "?cursor=" + encodeURIComponent(button.dataset.cursor))
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        data.comments.forEach(function (comment) {
+          list.appendChild(render(comment));
+        });
+        if (data.next_cursor) {
+          button.dataset.cursor = data.next_cursor;
+          button.disabled = false;
+        } else {
+          button.remove();
+        }
+      })
+      .catch(function () {
+        button.disabled = false;
+      });
+  });
+});
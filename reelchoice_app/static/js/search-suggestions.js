@@ -0,0 +1,51 @@
+document.addEventListener("DOMContentLoaded", function () {
+  const input = document.getElementById("searchInput");
+  const list = document.getElementById("searchSuggestions");
+
+  if (!input || !list) return;
+
+  let timer = null;
+  let latest = 0;
+
+  function hide() {
+    list.classList.add("hidden");
+    list.innerHTML = "";
+  }
+
+  function show(suggestions) {
+    list.innerHTML = "";
+    suggestions.forEach(function (movie) {
+      const item = document.createElement("li");
+      const link = document.createElement("a");
+      link.href = "/movie/" + movie.id + "/";
+      link.className = "block px-4 py-2 text-sm hover:bg-[#3D3C3C]";
+      link.textContent = movie.year ? movie.title + " (" + movie.year + ")" : movie.title;
+      item.appendChild(link);
+      list.appendChild(item);
+    });
+    list.classList.toggle("hidden", suggestions.length === 0);
+  }
+
+  input.addEventListener("input", function () {
+    clearTimeout(timer);
+    const query = input.value.trim();
+    if (!query) {
+      hide();
+      return;
+    }
+    timer = setTimeout(function () {
+      const request = ++latest;
+      fetch(input.dataset.suggestUrl + "?q=" + encodeURIComponent(query))
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          // Responses of older keystrokes are dropped
+          if (request === latest) show(data.suggestions);
+        })
+        .catch(hide);
+    }, 80);
+  });
+
+  document.addEventListener("click", function (e) {
+    if (!input.contains(e.target) && !list.contains(e.target)) hide();
+  });
+});
@@ -0,0 +1,158 @@
+import csv
+import io
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from reelchoice_app.catalog_import import CatalogImporter, CatalogImportError, split_names
+from reelchoice_app.models import Company, Genre, Movie, MovieTag, Rating, RatingEvent
+from reelchoice_app.rated_sets import rated_sets
+from reelchoice_app.recommendation_cache import get_rating_version
+from reelchoice_app.versions import get_catalog_version
+
+User = get_user_model()
+
+HEADER = ['id', 'title', 'vote_average', 'vote_count', 'release_date', 'runtime', 'overview', 'poster_path',
+          'genres', 'production_companies', 'production_countries']
+
+
+def csv_rows(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+    writer.writerows(rows)
+    buffer.seek(0)
+    return csv.DictReader(buffer)
+
+
+def movie_row(movie_id, title="Movie", genres="Drama", overview="", companies="Studio", countries="France"):
+    return [movie_id, title, "7.5", "100", "2001-02-03", "120", overview, "/p.jpg", genres, companies, countries]
+
+
+class CatalogImportTestCase(TestCase):
+
+    def test_split_names(self):
+        self.assertEqual(split_names(" Drama, Comedy,,Drama "), ["Drama", "Comedy"])
+        self.assertEqual(split_names(None), [])
+
+    # Test that movies, lookups, relations and tags are written
+    def test_import_rows(self):
+        Genre.objects.create(name="Drama")
+        summary = CatalogImporter(batch_size=2).import_rows(csv_rows([
+            movie_row(1, "First", "Drama, Horror", "A true story."),
+            movie_row(2, "Second", "Horror", companies="Studio, Other"),
+            movie_row(3, "Third", ""),
+        ]))
+
+        self.assertEqual(summary, {"inserted": [1, 2, 3], "changed": [], "deleted": [], "unchanged": 0})
+        first = Movie.objects.get(id=1)
+        self.assertEqual((first.title, first.vote_average, first.runtime, str(first.release_date)),
+                         ("First", 7.5, 120, "2001-02-03"))
+        self.assertEqual(sorted(first.genres.values_list('name', flat=True)), ["Drama", "Horror"])
+        self.assertEqual(sorted(Movie.objects.get(id=2).companies.values_list('name', flat=True)),
+                         ["Other", "Studio"])
+        self.assertFalse(Movie.objects.get(id=3).genres.exists())
+        self.assertEqual(Genre.objects.count(), 2)
+        self.assertEqual(Company.objects.count(), 2)
+        self.assertEqual(list(MovieTag.objects.values_list('movie_id', 'tag')), [(1, "true_story")])
+
+    # Test that re-importing updates movies in place and replaces their relations and tags
+    def test_reimport_updates(self):
+        CatalogImporter().import_rows(csv_rows([movie_row(1, "Old", "Drama, Horror", "A true story.")]))
+        CatalogImporter().import_rows(csv_rows([movie_row(1, "New", "Comedy"), movie_row(1, "Newest", "Comedy")]))
+
+        movie = Movie.objects.get(id=1)
+        self.assertEqual(movie.title, "Newest")
+        self.assertEqual(list(movie.genres.values_list('name', flat=True)), ["Comedy"])
+        self.assertFalse(MovieTag.objects.exists())
+
+    # Test that statements are issued per batch (and per database parameter limit chunk), not per row
+    def test_queries_per_batch(self):
+        def count_queries(first_id, n_rows):
+            rows = csv_rows([movie_row(movie_id, genres=f"Genre {movie_id % 3}")
+                             for movie_id in range(first_id, first_id + n_rows)])
+            with CaptureQueriesContext(connection) as queries:
+                CatalogImporter(batch_size=1000, delete_missing=False).import_rows(rows)
+            return len(queries)
+
+        count_queries(0, 3)
+        self.assertLess(count_queries(100, 300), 30)
+
+    # Test that a re-import writes only changed rows, deletes missing movies and reports the changes
+    def test_delta_import(self):
+        CatalogImporter().import_rows(csv_rows([movie_row(1, "One"), movie_row(2, "Two"), movie_row(3, "Three")]))
+        Movie.objects.filter(id=1).update(title="Edited by hand")
+        version = get_catalog_version()
+
+        with CaptureQueriesContext(connection) as queries:
+            summary = CatalogImporter(delete_missing=True, max_delete_fraction=0.5).import_rows(csv_rows([
+                movie_row(1, "One"),
+                movie_row(2, "Two", genres="Drama, Comedy"),
+                movie_row(4, "Four"),
+            ]))
+
+        self.assertEqual(summary, {"inserted": [4], "changed": [2], "deleted": [3], "unchanged": 1})
+        # The unchanged row is skipped, so the manual edit survives
+        self.assertEqual(Movie.objects.get(id=1).title, "Edited by hand")
+        self.assertEqual(sorted(Movie.objects.get(id=2).genres.values_list('name', flat=True)), ["Comedy", "Drama"])
+        self.assertFalse(Movie.objects.filter(id=3).exists())
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertFalse([query for query in queries if 'UPDATE "movie"' in query['sql']])
+
+    # Test that importing an unchanged file writes nothing
+    def test_unchanged_import_writes_nothing(self):
+        rows = [movie_row(1, "One", "Drama, Horror"), movie_row(2, "Two")]
+        CatalogImporter().import_rows(csv_rows(rows))
+        version = get_catalog_version()
+
+        with CaptureQueriesContext(connection) as queries:
+            summary = CatalogImporter(delete_missing=False).import_rows(csv_rows([rows[1], movie_row(1, "One", "Horror, Drama")]))
+
+        self.assertEqual(summary, {"inserted": [], "changed": [], "deleted": [], "unchanged": 2})
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries))
+        self.assertEqual(get_catalog_version(), version)
+
+    # Test that movies missing from the file are kept unless deleting them is asked for
+    def test_missing_movies_are_kept_by_default(self):
+        CatalogImporter().import_rows(csv_rows([movie_row(1, "One"), movie_row(2, "Two")]))
+        summary = CatalogImporter().import_rows(csv_rows([movie_row(1, "One")]))
+
+        self.assertEqual(summary["deleted"], [])
+        self.assertEqual(Movie.objects.count(), 2)
+
+    # Test that an empty file or one missing too much of the catalog deletes nothing, but is still imported
+    def test_large_deletions_are_refused(self):
+        CatalogImporter().import_rows(csv_rows([movie_row(movie_id) for movie_id in range(1, 11)]))
+        version = get_catalog_version()
+
+        with self.assertRaises(CatalogImportError):
+            CatalogImporter(delete_missing=True).import_rows(csv_rows([]))
+        with self.assertRaises(CatalogImportError):
+            CatalogImporter(delete_missing=True).import_rows(csv_rows(
+                [movie_row(movie_id) for movie_id in range(1, 9)] + [movie_row(11)]))
+        self.assertEqual(Movie.objects.count(), 11)
+        self.assertNotEqual(get_catalog_version(), version)
+
+        summary = CatalogImporter(delete_missing=True).import_rows(csv_rows(
+            [movie_row(movie_id) for movie_id in range(1, 11)]))
+        self.assertEqual(summary["deleted"], [11])
+
+    # Test that ratings deleted with their movies are reported like deleted ratings
+    @override_settings(RECOMMENDER_INCREMENTAL_UPDATES=True)
+    def test_deleted_movies_update_ratings(self):
+        CatalogImporter().import_rows(csv_rows([movie_row(movie_id) for movie_id in range(1, 11)]))
+        user = User.objects.create(username="alice")
+        Rating.objects.create(user=user, movie_id=1, score=8)
+        Rating.objects.create(user=user, movie_id=2, score=6)
+        rated = rated_sets.get(user.id)
+        version = get_rating_version(user.id)
+
+        CatalogImporter(delete_missing=True).import_rows(csv_rows(
+            [movie_row(movie_id) for movie_id in range(2, 11)]))
+
+        self.assertEqual(list(Rating.objects.values_list('movie_id', flat=True)), [2])
+        self.assertEqual(list(RatingEvent.objects.values_list('user_id', 'movie_id', 'score')), [(user.id, 1, None)])
+        self.assertNotEqual(get_rating_version(user.id), version)
+        self.assertIsNot(rated_sets.get(user.id), rated)
@@ -0,0 +1,148 @@
+import os
+import random
+import shutil
+import tempfile
+from io import StringIO
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from recommender.model_format import load_binary_model
+from reelchoice_app.models import Movie, Rating, RatingEvent, PrecomputedRecommendation
+from reelchoice_app.recommendation_cache import aget_precomputed_recommendations, aget_user_ratings
+from reelchoice_app.services import delete_rating, rate_movie
+
+User = get_user_model()
+
+
+class RatedMoviesTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.output = os.path.join(self.tmp_dir, 'model')
+
+        rng = random.Random(3)
+        self.movies = [Movie.objects.create(id=i, title=f"Movie {i}") for i in range(1, 7)]
+        self.users = []
+        for n in range(15):
+            user = User.objects.create(username=f"user{n}")
+            self.users.append(user)
+            taste = rng.randint(1, 5)
+            Rating.objects.bulk_create(
+                Rating(user=user, movie=movie, score=min(10, taste + rng.randint(0, 5))) for movie in self.movies
+            )
+
+
+class TrainRecommenderCommandTestCase(RatedMoviesTestCase):
+
+    def test_trains_and_writes_model(self):
+        out = StringIO()
+        call_command('train_recommender', output=self.output, chunk_size=7, min_periods=5, jobs=1, stdout=out)
+
+        scorer = load_binary_model(self.output)
+        self.assertEqual(scorer.item_ids.tolist(), [1, 2, 3, 4, 5, 6])
+        self.assertGreater(scorer.similarity_matrix.nnz, 0)
+        self.assertIn("Read 90 ratings", out.getvalue())
+        self.assertIn("peak memory", out.getvalue())
+        self.assertIn(scorer.model_version, out.getvalue())
+
+    def test_trains_on_exported_ratings(self):
+        ratings = os.path.join(self.tmp_dir, 'ratings')
+        call_command('export_ratings', ratings, '--format', 'columns', stdout=StringIO())
+        Rating.objects.all().delete()
+
+        call_command('train_recommender', '--ratings', ratings, '--output', self.output, '--min-periods', '2',
+                     stdout=StringIO())
+        self.assertEqual(len(load_binary_model(self.output).item_ids), len(self.movies))
+
+    def test_no_ratings_raises_error(self):
+        Rating.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('train_recommender', output=self.output, stdout=StringIO())
+        self.assertFalse(os.path.exists(self.output))
+
+    def test_model_without_similarities_is_not_written(self):
+        with self.assertRaises(CommandError):
+            call_command('train_recommender', output=self.output, min_periods=100, jobs=1, stdout=StringIO())
+        self.assertFalse(os.path.exists(self.output))
+
+
+@override_settings(RECOMMENDER_INCREMENTAL_UPDATES=True)
+class MaintainRecommenderCommandTestCase(RatedMoviesTestCase):
+
+    def train(self, output):
+        call_command('train_recommender', output=output, min_periods=5, jobs=1, stdout=StringIO())
+        return load_binary_model(output)
+
+    def test_rating_writes_are_logged(self):
+        rate_movie(self.users[0], self.movies[0].id, 10)
+        delete_rating(self.users[1], self.movies[1].id)
+
+        events = list(RatingEvent.objects.values_list('user_id', 'movie_id', 'score'))
+        self.assertEqual(events, [(self.users[0].id, 1, 10), (self.users[1].id, 2, None)])
+
+    @override_settings(RECOMMENDER_INCREMENTAL_UPDATES=False)
+    def test_rating_writes_are_not_logged_when_disabled(self):
+        rate_movie(self.users[0], self.movies[0].id, 10)
+        self.assertFalse(RatingEvent.objects.exists())
+
+    # Test that logged changes are applied and the written model equals a full retrain
+    def test_applies_logged_changes(self):
+        out = StringIO()
+        call_command('maintain_recommender', output=self.output, min_periods=5, once=True, stdout=out)
+
+        rate_movie(self.users[0], self.movies[0].id, 1)
+        rate_movie(self.users[2], self.movies[3].id, 10)
+        delete_rating(self.users[1], self.movies[1].id)
+
+        call_command('maintain_recommender', output=self.output, min_periods=5, once=True, stdout=out)
+        self.assertFalse(RatingEvent.objects.exists())
+
+        maintained = load_binary_model(self.output)
+        retrained = self.train(os.path.join(self.tmp_dir, 'retrained'))
+        self.assertEqual(maintained.item_ids.tolist(), retrained.item_ids.tolist())
+        self.assertEqual(maintained.similarity_matrix.indices.tolist(), retrained.similarity_matrix.indices.tolist())
+        np.testing.assert_allclose(maintained.similarity_matrix.data, retrained.similarity_matrix.data, atol=1e-12)
+
+
+class PrecomputeRecommendationsCommandTestCase(RatedMoviesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        call_command('train_recommender', output=self.output, min_periods=5, jobs=1, stdout=StringIO())
+        self.model = load_binary_model(self.output)
+        User.objects.filter(id__in=[user.id for user in self.users[:10]]).update(last_login=timezone.now())
+        # Every user has rated every movie, so give the first one room for recommendations
+        Rating.objects.filter(user=self.users[0], movie_id__in=[5, 6]).delete()
+
+    def test_precomputes_active_users(self):
+        call_command('precompute_recommendations', model=self.output, batch_size=4, stdout=StringIO())
+
+        self.assertEqual(PrecomputedRecommendation.objects.count(), 10)
+        user_id = self.users[0].id
+        expected = self.model.recommend_items(async_to_sync(aget_user_ratings)(user_id), n_recommendations=100)
+        precomputed = async_to_sync(aget_precomputed_recommendations)(user_id, self.model.model_version)
+        self.assertEqual([movie_id for movie_id, _ in precomputed], [movie_id for movie_id, _ in expected])
+        self.assertTrue(expected)
+        self.assertTrue({movie_id for movie_id, _ in expected} <= {5, 6})
+
+    def test_all_users_with_active_days_zero(self):
+        call_command('precompute_recommendations', model=self.output, active_days=0, stdout=StringIO())
+        self.assertEqual(PrecomputedRecommendation.objects.count(), 15)
+
+    # Test that a rating write or a new model version makes the precomputed list stale
+    def test_stale_rows_are_not_served(self):
+        call_command('precompute_recommendations', model=self.output, stdout=StringIO())
+        user_id = self.users[0].id
+
+        self.assertIsNotNone(async_to_sync(aget_precomputed_recommendations)(user_id, self.model.model_version))
+        self.assertIsNone(async_to_sync(aget_precomputed_recommendations)(user_id, 'another-version'))
+
+        rate_movie(self.users[0], 5, 7)
+        self.assertIsNone(async_to_sync(aget_precomputed_recommendations)(user_id, self.model.model_version))
@@ -0,0 +1,96 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from reelchoice_app.catalog_import import CatalogImporter
+from reelchoice_app.fragments import MOVIE_FRAGMENTS, movie_fragments
+from reelchoice_app.models import Movie, DataVersion
+from reelchoice_app.services import rate_movie, write_comment, delete_comment
+from reelchoice_app.tests.test_catalog_import import csv_rows, movie_row
+from reelchoice_app.versions import get_movie_versions
+
+User = get_user_model()
+
+
+class MovieFragmentsTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        movie_fragments.reset_counters()
+        self.alice = User.objects.create_user(username="alice", password="password")
+        self.bob = User.objects.create_user(username="bob", password="password")
+        Movie.objects.create(id=1, title="Inception", overview="Dreams within dreams.")
+        self.url = reverse('reelchoice_app:movie_detail', args=(1,))
+        self.client.force_login(self.alice)
+
+    def get(self):
+        return self.client.get(self.url).content.decode()
+
+    # Test that the shared parts are rendered once and then served from the cache without loading the movie
+    def test_fragments_are_cached(self):
+        self.get()
+        self.assertEqual(movie_fragments.hit_rate(), 0.0)
+
+        # The shared movie version, session, user and the viewer's rating
+        with self.assertNumQueries(4):
+            page = self.get()
+        self.assertIn("Inception", page)
+        self.assertIn("Dreams within dreams.", page)
+        self.assertEqual(movie_fragments.hit_rate(), 0.5)
+        self.assertEqual(movie_fragments.hits["details"], 1)
+
+    # Test that viewing pages, also of movies that do not exist, does not create version counters
+    def test_views_do_not_write_versions(self):
+        self.get()
+        response = self.client.get(reverse('reelchoice_app:movie_detail', args=(99001,)))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(DataVersion.objects.exists())
+
+    # Test that rating and comment writes render the page again
+    def test_writes_invalidate(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            rate_movie(self.bob, 1, 9)
+        self.assertIn("ReelChoice users: 9.0 (1 rating)", self.get())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = write_comment(self.bob, 1, "Loved it")
+        self.assertIn("Loved it", self.get())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_comment(comment.id)
+        self.assertNotIn("Loved it", self.get())
+
+    # Test that an import changing the movie renders the page again
+    def test_import_invalidates(self):
+        self.get()
+        CatalogImporter(delete_missing=False).import_rows(csv_rows([movie_row(1, "Inception (Director's Cut)")]))
+        self.assertIn("Inception (Director&#x27;s Cut)", self.get())
+
+    # Test that remove buttons are stitched in for the viewer's own comments only
+    def test_remove_buttons_are_per_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            own = write_comment(self.alice, 1, "Mine")
+            other = write_comment(self.bob, 1, "Not mine")
+
+        page = self.get()
+        self.assertIn(f'name="delete_comment" value="{own.id}"', page)
+        self.assertNotIn(f'name="delete_comment" value="{other.id}"', page)
+        self.assertNotIn("comment-actions", page)
+
+        self.client.force_login(self.bob)
+        page = self.get()
+        self.assertEqual(movie_fragments.hits["comments"], 1)
+        self.assertIn(f'name="delete_comment" value="{other.id}"', page)
+        self.assertNotIn(f'name="delete_comment" value="{own.id}"', page)
+
+    # Test that no CSRF token or other per-user content ends up in the cached fragments
+    def test_cached_fragments_are_anonymous(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            write_comment(self.alice, 1, "Mine")
+        self.get()
+        fragments = movie_fragments.get_many(1, get_movie_versions([1])[1], list(MOVIE_FRAGMENTS), render=None)
+        self.assertIn("Mine", fragments["comments"])
+        for html in fragments.values():
+            self.assertNotIn("csrfmiddlewaretoken", html)
@@ -0,0 +1,50 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from reelchoice_app.genre_index import GenreIndex, genre_from_title
+from reelchoice_app.models import Genre, Movie
+from reelchoice_app.versions import bump_catalog_version
+
+User = get_user_model()
+
+
+class GenreIndexTestCase(TestCase):
+
+    def setUp(self):
+        horror = Genre.objects.create(name="Horror")
+        western = Genre.objects.create(name="Western")
+        for movie_id, vote_average in [(1, 5.0), (2, 9.0), (3, None), (4, 7.5), (5, 7.5)]:
+            movie = Movie.objects.create(id=movie_id, title=f"Movie {movie_id}", vote_average=vote_average)
+            movie.genres.add(horror)
+        Movie.objects.get(id=1).genres.add(western)
+        self.index = GenreIndex(check_interval=0)
+
+    # Test that every genre maps to its movies ordered by vote_average, ties by id and unrated movies last
+    def test_genres_are_sorted_by_vote_average(self):
+        self.assertEqual(list(self.index.genre_ids("Horror")), [2, 4, 5, 1, 3])
+        self.assertEqual(list(self.index.genre_ids("western")), [1])
+        self.assertIsNone(self.index.genre_ids("Comedy"))
+
+    # Test that the index is rebuilt after an import bumps the catalog version
+    def test_rebuilt_on_catalog_change(self):
+        self.index.get_pools()
+        Movie.objects.create(id=6, title="Movie 6", vote_average=9.5).genres.add(Genre.objects.get(name="Western"))
+        bump_catalog_version()
+        self.assertEqual(list(self.index.genre_ids("Western")), [6, 1])
+
+    def test_genre_from_title(self):
+        self.assertEqual(genre_from_title("Top Science Fiction Movies"), "Science Fiction")
+        self.assertIsNone(genre_from_title("Rate More Movies"))
+
+    # Test that any genre gets a category page, loading only the movies shown
+    def test_category_page_for_any_genre(self):
+        self.client.force_login(User.objects.create(username="alice"))
+        with mock.patch('reelchoice_app.views.genre_index', self.index):
+            response = self.client.get(reverse('reelchoice_app:category_view', args=("Top Western Movies",)))
+            horror = self.client.get(reverse('reelchoice_app:category_view', args=("Top Horror Movies",)))
+
+        self.assertEqual([movie.id for movie in response.context['movies']], [1])
+        self.assertEqual([movie.id for movie in horror.context['movies']], [2, 4, 5, 1, 3])
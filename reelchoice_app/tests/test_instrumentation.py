@@ -0,0 +1,138 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from reelchoice_app.genre_index import genre_index
+from reelchoice_app.models import Movie, Genre, Comment, Rating, MovieTag
+from reelchoice_app.rated_sets import rated_sets
+from reelchoice_app.section_pools import section_pools
+from reelchoice_app.services import rate_movie, write_comment
+from reelchoice_app.tests.utils import QueryBudgetMixin
+from reelchoice_app.typeahead import typeahead_index
+
+User = get_user_model()
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="password")
+        horror = Genre.objects.create(name="Horror")
+        for movie_id in range(1, 31):
+            movie = Movie.objects.create(id=movie_id, title=f"Movie {movie_id}", vote_average=movie_id / 3,
+                                         vote_count=10 * movie_id, overview="A true story.")
+            movie.genres.add(horror)
+            MovieTag.objects.create(movie=movie, tag="true_story")
+        for movie_id in range(1, 11):
+            Rating.objects.create(user=self.user, movie_id=movie_id, score=movie_id)
+
+        # In-process indexes are built on the first request, the budgets cover the requests after it
+        for index in (section_pools, genre_index, typeahead_index, rated_sets):
+            index.invalidate()
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        self.client.get(url)
+        return self.client.get(url)
+
+    def add_comments(self, n):
+        for i in range(n):
+            author = User.objects.create(username=f"author{Comment.objects.count()}")
+            with self.captureOnCommitCallbacks(execute=True):
+                write_comment(author, 1, f"Comment {i}")
+                rate_movie(author, 1, 5)
+
+    # Test that every page stays within its query budget
+    def test_views_within_budget(self):
+        self.add_comments(5)
+        urls = [
+            reverse('reelchoice_app:home'),
+            reverse('reelchoice_app:search') + '?q=movie',
+            reverse('reelchoice_app:search_suggestions') + '?q=mov',
+            reverse('reelchoice_app:ratings'),
+            reverse('reelchoice_app:movie_detail', args=(1,)),
+            reverse('reelchoice_app:movie_comments', args=(1,)),
+            reverse('reelchoice_app:category_view', args=("Viewers' Choice",)),
+            reverse('reelchoice_app:category_view', args=("Recommended for you",)),
+            reverse('reelchoice_app:category_view', args=("Based on a true story",)),
+            reverse('reelchoice_app:category_view', args=("Rate More Movies",)),
+            reverse('reelchoice_app:category_view', args=("Top Horror Movies",)),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinQueryBudget(response)
+
+        self.client.logout()
+        for url in (reverse('reelchoice_app:login'), reverse('reelchoice_app:authView')):
+            with self.subTest(url=url):
+                self.assertWithinQueryBudget(self.get(url))
+
+    # Test that the queries of the async views are counted under ASGI, where the async ORM runs them on other threads
+    async def test_async_views_within_budget(self):
+        await self.async_client.aforce_login(self.user)
+        for url in (reverse('reelchoice_app:home'),
+                    reverse('reelchoice_app:category_view', args=("Rate More Movies",)),
+                    reverse('reelchoice_app:category_view', args=("Top Horror Movies",))):
+            with self.subTest(url=url):
+                await self.async_client.get(url)
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(response.request_metrics.queries, 0)
+                self.assertIn(f'desc="{response.request_metrics.queries} queries"', response["Server-Timing"])
+                self.assertWithinQueryBudget(response)
+
+    # Test that logging in and signing up stay within their POST budgets
+    def test_post_views_within_budget(self):
+        self.client.logout()
+        response = self.client.post(reverse('reelchoice_app:login'), {"username": "alice", "password": "password"})
+        self.assertRedirects(response, reverse('reelchoice_app:home'), fetch_redirect_response=False)
+        self.assertWithinQueryBudget(response)
+
+        self.client.logout()
+        response = self.client.post(reverse('reelchoice_app:authView'), {
+            "username": "bob", "password1": "Xyzzy-12345!", "password2": "Xyzzy-12345!"})
+        self.assertRedirects(response, reverse('reelchoice_app:login'), fetch_redirect_response=False)
+        self.assertWithinQueryBudget(response)
+
+    # Test that the number of queries of the movie page does not grow with its comments
+    def test_movie_detail_comments_do_not_add_queries(self):
+        url = reverse('reelchoice_app:movie_detail', args=(1,))
+        self.add_comments(1)
+        queries = self.get(url).request_metrics.queries
+
+        self.add_comments(10)
+        response = self.get(url)
+        self.assertEqual(response.request_metrics.queries, queries)
+        self.assertContains(response, "author10")
+
+    # Test that the metrics are sent in the Server-Timing header
+    def test_server_timing_header(self):
+        response = self.get(reverse('reelchoice_app:home'))
+        metrics = response.request_metrics
+        self.assertGreater(metrics.timings["template"], 0)
+        self.assertGreater(metrics.timings["recommender"], 0)
+
+        header = response["Server-Timing"]
+        self.assertIn(f'db;dur=', header)
+        self.assertIn(f'desc="{metrics.queries} queries"', header)
+        for name in ("tpl", "rec", "total"):
+            self.assertIn(f"{name};dur=", header)
+
+        with override_settings(SERVER_TIMING_HEADER=False):
+            self.assertFalse(self.get(reverse('reelchoice_app:home')).has_header("Server-Timing"))
+
+    # Test that every request is summarized and a request over its budget is reported
+    def test_summary_log_and_budget_warning(self):
+        url = reverse('reelchoice_app:ratings')
+        with self.assertLogs("reelchoice_app.requests", level="INFO") as logs:
+            self.get(url)
+        self.assertIn(f"GET {url} 200 view=reelchoice_app:ratings queries=", logs.output[-1])
+
+        with override_settings(QUERY_BUDGETS={"reelchoice_app:ratings": {"GET": 1}}):
+            with self.assertLogs("reelchoice_app.requests", level="WARNING") as logs:
+                self.get(url)
+        self.assertIn("over the budget of 1 for reelchoice_app:ratings", logs.output[-1])
@@ -0,0 +1,64 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from reelchoice_app.keywords import extract_tags, set_movie_tags
+from reelchoice_app.models import Movie, MovieTag
+from reelchoice_app.section_pools import section_pools
+
+User = get_user_model()
+
+KEYWORD_TAGS = {"true_story": ["true story", "real events"], "heist": ["heist"]}
+
+
+class TestExtractTags(SimpleTestCase):
+
+    # Test that phrases match whole words regardless of case, accents and punctuation
+    def test_phrases_match_whole_words(self):
+        self.assertEqual(extract_tags("Based on a TRUE  story.", KEYWORD_TAGS), {"true_story"})
+        self.assertEqual(extract_tags("Inspired by réal events: a heist", KEYWORD_TAGS), {"true_story", "heist"})
+        self.assertEqual(extract_tags("An untrue story of heists", KEYWORD_TAGS), set())
+        self.assertEqual(extract_tags(None, KEYWORD_TAGS), set())
+
+
+@override_settings(MOVIE_KEYWORD_TAGS=KEYWORD_TAGS)
+class MovieTagTestCase(TestCase):
+
+    def setUp(self):
+        Movie.objects.create(id=1, title="Movie 1", overview="The true story of a heist.")
+        Movie.objects.create(id=2, title="Movie 2", overview="A heist goes wrong.")
+        Movie.objects.create(id=3, title="Movie 3", overview="Nothing to see.")
+
+    def tags(self):
+        return sorted(MovieTag.objects.values_list('movie_id', 'tag'))
+
+    # Test that tagging replaces the movies' previous tags
+    def test_set_movie_tags_replaces(self):
+        set_movie_tags([(1, "The true story of a heist."), (2, "A heist goes wrong.")])
+        set_movie_tags([(1, "Now only a heist.")])
+        self.assertEqual(self.tags(), [(1, "heist"), (2, "heist")])
+
+    def test_tag_movies_command(self):
+        call_command('tag_movies', batch_size=2, stdout=StringIO())
+        self.assertEqual(self.tags(), [(1, "heist"), (1, "true_story"), (2, "heist")])
+
+    # Test that the keyword category page lists the tagged movies
+    def test_keyword_category_page(self):
+        call_command('tag_movies', stdout=StringIO())
+        self.client.force_login(User.objects.create(username="alice"))
+        section_pools.invalidate()
+        with override_settings(KEYWORD_SECTIONS={"Based on a true story": "true_story"}):
+            response = self.client.get(reverse('reelchoice_app:category_view', args=("Based on a true story",)))
+        self.assertEqual([movie.id for movie in response.context['movies']], [1])
+
+    # Test that a keyword section with a tag that is not extracted shows an empty page
+    def test_keyword_section_without_tag(self):
+        self.client.force_login(User.objects.create(username="alice"))
+        with override_settings(KEYWORD_SECTIONS={"Heists": "no_such_tag"}):
+            home = self.client.get(reverse('reelchoice_app:home'))
+            response = self.client.get(reverse('reelchoice_app:category_view', args=("Heists",)))
+        self.assertEqual(home.status_code, 200)
+        self.assertEqual(list(response.context['movies']), [])
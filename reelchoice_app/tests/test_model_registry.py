@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from recommender.model_format import save_binary_model
+from reelchoice_app.model_registry import ModelRegistry
+from reelchoice_app.tests.utils import build_scorer
+
+
+class TestModelRegistry(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.model_path = os.path.join(self.tmp_dir, 'model')
+
+        self.first_scorer = build_scorer({1: 7.0, 2: 6.0, 3: 5.0}, {1: {2: 0.5}, 2: {1: 0.5}, 3: {1: 0.4}})
+        self.second_scorer = build_scorer({1: 7.0, 2: 6.0, 3: 9.0}, {1: {2: 0.5}, 2: {1: 0.5}, 3: {1: 0.4}})
+        self.first_header = save_binary_model(self.first_scorer, self.model_path)
+
+    # Test that nothing is read from disk until the model is requested
+    def test_model_is_loaded_lazily(self):
+        registry = ModelRegistry(self.model_path, check_interval=0)
+        self.assertFalse(registry.info()['loaded'])
+
+        model = registry.get_model()
+        self.assertEqual(model.recommend_items({1: 9.0}), [(2, 6.0 + 2.0 * 3), (3, 5.0 + 2.0 * 3)])
+        self.assertEqual(registry.version, self.first_header['model_version'])
+        self.assertIsNotNone(registry.loaded_at)
+        self.assertIsNotNone(registry.load_seconds)
+
+    # Test that a retrained model replacing the directory is swapped in on the next request
+    def test_new_model_version_is_picked_up(self):
+        registry = ModelRegistry(self.model_path, check_interval=0)
+        first_model = registry.preload()
+
+        second_header = save_binary_model(self.second_scorer, self.model_path)
+        second_model = registry.get_model()
+
+        self.assertIsNot(first_model, second_model)
+        self.assertEqual(registry.version, second_header['model_version'])
+        # The old object stays usable for a request that already holds it
+        self.assertEqual(first_model.recommend_items({1: 9.0})[0][0], 2)
+        self.assertEqual(second_model.recommend_items({1: 9.0})[0][0], 3)
+
+    # Test that the file is not re-checked before the check interval passes
+    def test_check_interval_throttles_reloads(self):
+        registry = ModelRegistry(self.model_path, check_interval=3600)
+        first_model = registry.get_model()
+
+        save_binary_model(self.second_scorer, self.model_path)
+        self.assertIs(registry.get_model(), first_model)
+        self.assertIsNot(registry.reload(), first_model)
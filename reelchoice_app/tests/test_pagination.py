@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from reelchoice_app.models import Movie, Rating
+from reelchoice_app.pagination import paginate_keyset, paginate_sequence, encode_cursor
+
+User = get_user_model()
+
+
+class KeysetPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username="alice")
+        now = timezone.now()
+        for movie_id in range(1, 24):
+            Movie.objects.create(id=movie_id, title=f"Movie {movie_id}")
+            Rating.objects.create(user=self.user, movie_id=movie_id, score=5)
+        # Several ratings share a timestamp, so the id has to break ties
+        for rating in Rating.objects.all():
+            Rating.objects.filter(pk=rating.pk).update(created_at=now - timedelta(minutes=rating.movie_id // 3))
+        self.expected = list(Rating.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.queryset = Rating.objects.filter(user=self.user)
+
+    def pages(self, per_page):
+        page = paginate_keyset(self.queryset, ('-created_at', '-id'), per_page=per_page)
+        pages = [page]
+        while page.has_next:
+            page = paginate_keyset(self.queryset, ('-created_at', '-id'), page.next_cursor, per_page=per_page)
+            pages.append(page)
+        return pages
+
+    # Test that following next cursors visits every row once, in order
+    def test_next_cursors_cover_all_rows(self):
+        pages = self.pages(5)
+        self.assertEqual([rating.id for page in pages for rating in page], self.expected)
+        self.assertFalse(pages[0].has_previous)
+        self.assertEqual(len(pages[-1]), 3)
+
+    # Test that previous cursors lead back to the same pages
+    def test_previous_cursors(self):
+        pages = self.pages(4)
+        page = pages[-1]
+        for expected_page in reversed(pages[:-1]):
+            page = paginate_keyset(self.queryset, ('-created_at', '-id'), page.previous_cursor, per_page=4)
+            self.assertEqual([rating.id for rating in page], [rating.id for rating in expected_page])
+        self.assertFalse(page.has_previous)
+
+    # Test that a deep page is fetched with one query and without counting
+    def test_page_costs_one_query(self):
+        cursor = self.pages(5)[3].previous_cursor
+        with self.assertNumQueries(1):
+            page = paginate_keyset(self.queryset, ('-created_at', '-id'), cursor, per_page=5)
+            list(page)
+        self.assertIsNone(page.count)
+        self.assertEqual(paginate_keyset(self.queryset, ('-created_at', '-id'), with_count=True).count, 23)
+
+    # Test that a tampered token falls back to the first page
+    def test_tampered_cursor(self):
+        page = paginate_keyset(self.queryset, ('-created_at', '-id'), encode_cursor("next", [1]) + "x", per_page=5)
+        self.assertEqual([rating.id for rating in page], self.expected[:5])
+
+    def test_sequence_pages(self):
+        page = paginate_sequence(list(range(10)), per_page=4)
+        page = paginate_sequence(list(range(10)), page.next_cursor, per_page=4)
+        self.assertEqual((list(page), page.start_index, page.end_index, page.count), ([4, 5, 6, 7], 5, 8, 10))
+        self.assertEqual(list(paginate_sequence(list(range(10)), page.previous_cursor, per_page=4)), [0, 1, 2, 3])
+
+    # Test that the ratings page hands out cursors that reach the older ratings
+    def test_ratings_view_cursor(self):
+        self.client.force_login(self.user)
+        first = self.client.get(reverse('reelchoice_app:ratings'))
+        second = self.client.get(reverse('reelchoice_app:ratings'), {'cursor': first.context['page_obj'].next_cursor})
+
+        ids = [rating['id'] for response in (first, second) for rating in response.context['ratings']]
+        expected_movies = list(Rating.objects.order_by('-created_at', '-id').values_list('movie_id', flat=True))
+        self.assertEqual(ids, expected_movies)
+        self.assertContains(first, "?cursor=")
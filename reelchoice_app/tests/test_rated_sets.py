@@ -0,0 +1,90 @@
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import TestCase, SimpleTestCase
+
+from reelchoice_app.models import Movie, Rating
+from reelchoice_app.rated_sets import RatedBitset, RatedSetCache, UnratedIds
+from reelchoice_app.section_pools import SectionPools
+from reelchoice_app.services import rate_movie, delete_rating
+
+User = get_user_model()
+
+
+class TestRatedBitset(SimpleTestCase):
+    def setUp(self):
+        self.catalog_ids = np.arange(1, 42, 2, dtype=np.int64)
+        self.rated_ids = {1, 5, 7, 9, 15, 41}
+        self.rated = RatedBitset(self.catalog_ids, self.rated_ids | {2, 100})
+        self.unrated_ids = [movie_id for movie_id in self.catalog_ids.tolist() if movie_id not in self.rated_ids]
+
+    # Test membership, ignoring ids outside the catalog
+    def test_membership(self):
+        self.assertEqual({movie_id for movie_id in range(0, 110) if movie_id in self.rated}, self.rated_ids)
+        self.assertEqual(self.rated.unrated_count(), len(self.unrated_ids))
+
+    # Test that every page of the unrated set matches slicing the full list
+    def test_unrated_pages(self):
+        for offset in range(0, 18):
+            for limit in (1, 4, 15):
+                self.assertEqual(self.rated.unrated_page(offset, limit), self.unrated_ids[offset:offset + limit])
+
+    # Test that samples are distinct unrated ids, also when few movies are left unrated
+    def test_sample_unrated(self):
+        sample = self.rated.sample_unrated(5)
+        self.assertEqual(len(set(sample)), 5)
+        self.assertTrue(set(sample) <= set(self.unrated_ids))
+
+        almost_all = RatedBitset(self.catalog_ids, self.catalog_ids[2:].tolist())
+        self.assertEqual(sorted(almost_all.sample_unrated(5)), [1, 3])
+
+    # Test that updates are reflected in counts and pages
+    def test_set(self):
+        self.rated.set(3)
+        self.rated.set(41, rated=False)
+        self.assertIn(3, self.rated)
+        self.assertNotIn(41, self.rated)
+        self.assertEqual(self.rated.unrated_page(0, 2), [11, 13])
+        self.assertEqual(self.rated.unrated_page(self.rated.unrated_count() - 1, 5), [41])
+
+
+class RatedSetCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username="alice")
+        for movie_id in range(1, 21):
+            Movie.objects.create(id=movie_id, title=f"Movie {movie_id}")
+        Rating.objects.create(user=self.user, movie_id=1, score=9)
+
+        patcher = mock.patch('reelchoice_app.rated_sets.section_pools', SectionPools(check_interval=3600))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = RatedSetCache()
+        patcher = mock.patch('reelchoice_app.services.rated_sets', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # Test that rating writes update the cached bitset in place, without reading Rating again
+    def test_writes_update_cached_bitset(self):
+        rated = self.cache.get(self.user.id)
+        self.assertIn(1, rated)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rate_movie(self.user, 2, 7)
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_rating(self.user, 1)
+
+        # Only the shared rating version is read, the bitset is not rebuilt
+        with self.assertNumQueries(1):
+            self.assertIs(self.cache.get(self.user.id), rated)
+        self.assertIn(2, rated)
+        self.assertNotIn(1, rated)
+
+    # Test that the unrated sequence pages through movie ids in id order without queries
+    def test_unrated_ids_for_paginator(self):
+        unrated = UnratedIds(self.cache.get(self.user.id))
+        self.assertEqual(len(unrated), 19)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(unrated[15:30]), [17, 18, 19, 20])
+            self.assertEqual(unrated[0], 2)
@@ -0,0 +1,146 @@
+import csv
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from reelchoice_app.models import Movie, Rating, RatingEvent, MovieRatingStats
+from reelchoice_app.rating_io import load_rating_columns, load_ratings_csv
+from reelchoice_app.recommendation_cache import get_rating_version
+
+User = get_user_model()
+
+
+class RatingIOTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        for movie_id in (1, 2, 3):
+            Movie.objects.create(id=movie_id, title=f"Movie {movie_id}")
+
+    def write_csv(self, rows, header=('userId', 'movieId', 'rating')):
+        path = os.path.join(self.tmp_dir, 'ratings.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return path
+
+    def load(self, path, *args):
+        call_command('load_ratings', path, '--batch-size', '2', *args, stdout=StringIO())
+
+    def scores(self):
+        return set(Rating.objects.values_list('user__username', 'movie_id', 'score'))
+
+    # Test that placeholder users are created and invalid rows are skipped
+    def test_loads_ratings_and_creates_users(self):
+        path = self.write_csv([
+            (7, 1, 4.5), (7, 2, 3), (8, 1, 0.5),
+            (8, 99, 4),     # movie not in the catalog
+            (9, 1, 0),      # score below 1 after scaling
+            (9, 'x', 4),    # malformed
+            (9, 2, 'inf'),  # not a finite score
+            (9, 3, 'nan'),
+        ])
+        self.load(path, '--scale', '2')
+
+        self.assertEqual(self.scores(), {('imported_7', 1, 9), ('imported_7', 2, 6), ('imported_8', 1, 1)})
+        self.assertFalse(User.objects.get(username='imported_7').has_usable_password())
+        self.assertFalse(User.objects.filter(username='imported_9').exists())
+
+    # Test that non-finite scores are counted as malformed instead of aborting the load
+    def test_non_finite_scores_are_malformed(self):
+        summary = load_ratings_csv(self.write_csv([(1, 2, 'inf'), (1, 3, '-inf'), (1, 1, 'nan'), (1, 1, 4)]))
+        self.assertEqual((summary["loaded"], summary["malformed"]), (1, 3))
+
+    # Test that existing ratings are overwritten or kept depending on --on-conflict
+    def test_conflict_handling(self):
+        user = User.objects.create(username='imported_7')
+        Rating.objects.create(user=user, movie_id=1, score=2)
+        version = get_rating_version(user.id)
+
+        self.load(self.write_csv([(7, 1, 8), (7, 2, 5)]), '--on-conflict', 'ignore')
+        self.assertEqual(self.scores(), {('imported_7', 1, 2), ('imported_7', 2, 5)})
+
+        self.load(self.write_csv([(7, 1, 8), (7, 1, 9)]))
+        self.assertEqual(self.scores(), {('imported_7', 1, 9), ('imported_7', 2, 5)})
+        self.assertEqual(User.objects.filter(username='imported_7').count(), 1)
+        self.assertNotEqual(get_rating_version(user.id), version)
+
+    # Test that only written ratings are counted and only their users are marked as changed
+    def test_counts_written_ratings(self):
+        alice = User.objects.create(username='imported_7')
+        bob = User.objects.create(username='imported_8')
+        Rating.objects.create(user=alice, movie_id=1, score=2)
+        Rating.objects.create(user=bob, movie_id=1, score=4)
+        versions = {user.id: get_rating_version(user.id) for user in (alice, bob)}
+
+        summary = load_ratings_csv(self.write_csv([(7, 1, 8), (7, 2, 5), (8, 1, 9)]), update_existing=False)
+        self.assertEqual((summary["loaded"], summary["unchanged"]), (1, 2))
+        self.assertNotEqual(get_rating_version(alice.id), versions[alice.id])
+        self.assertEqual(get_rating_version(bob.id), versions[bob.id])
+
+        summary = load_ratings_csv(self.write_csv([(7, 1, 2), (7, 2, 5), (8, 1, 9)]))
+        self.assertEqual((summary["loaded"], summary["unchanged"]), (1, 2))
+        self.assertNotEqual(get_rating_version(bob.id), versions[bob.id])
+
+    # Test that the written ratings are logged for the incremental recommender updates
+    @override_settings(RECOMMENDER_INCREMENTAL_UPDATES=True)
+    def test_logs_rating_events(self):
+        user = User.objects.create(username='imported_7')
+        Rating.objects.create(user=user, movie_id=1, score=2)
+
+        load_ratings_csv(self.write_csv([(7, 1, 2), (7, 2, 5)]))
+        self.assertEqual(list(RatingEvent.objects.values_list('user_id', 'movie_id', 'score')), [(user.id, 2, 5)])
+
+    # Test that the rating statistics of the loaded movies are recomputed and the others left alone
+    def test_updates_stats_of_loaded_movies(self):
+        user = User.objects.create(username='imported_7')
+        Rating.objects.create(user=user, movie_id=1, score=2)
+        MovieRatingStats.objects.create(movie_id=3, rating_count=5, score_sum=20, average=4.0)
+
+        self.load(self.write_csv([(7, 1, 8), (8, 1, 4), (8, 2, 6)]))
+        stats = {row.movie_id: row for row in MovieRatingStats.objects.all()}
+        self.assertEqual((stats[1].rating_count, stats[1].score_sum, stats[1].score_8_count), (2, 12, 1))
+        self.assertEqual((stats[2].rating_count, stats[2].average), (1, 6.0))
+        self.assertEqual(stats[3].rating_count, 5)
+
+    # Test that an exported CSV loads back into the same ratings
+    def test_csv_round_trip(self):
+        alice = User.objects.create(username='alice')
+        Rating.objects.create(user=alice, movie_id=1, score=7)
+        Rating.objects.create(user=alice, movie_id=3, score=2)
+        path = os.path.join(self.tmp_dir, 'export.csv')
+        call_command('export_ratings', path, '--chunk-size', '1', stdout=StringIO())
+
+        with open(path, encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows, [{'userId': str(alice.id), 'id': '1', 'rating': '7'},
+                                {'userId': str(alice.id), 'id': '3', 'rating': '2'}])
+
+        Rating.objects.all().delete()
+        self.load(path, '--username-prefix', 'copy_')
+        self.assertEqual(self.scores(), {(f'copy_{alice.id}', 1, 7), (f'copy_{alice.id}', 3, 2)})
+
+    # Test that the columnar export opens as the training DataFrame
+    def test_columnar_export(self):
+        alice = User.objects.create(username='alice')
+        bob = User.objects.create(username='bob')
+        Rating.objects.create(user=alice, movie_id=1, score=7)
+        Rating.objects.create(user=bob, movie_id=2, score=10)
+        Rating.objects.create(user=bob, movie_id=3, score=1)
+        path = os.path.join(self.tmp_dir, 'columns')
+        call_command('export_ratings', path, '--format', 'columns', '--chunk-size', '2', stdout=StringIO())
+
+        ratings_df = load_rating_columns(path)
+        self.assertEqual(ratings_df.values.tolist(),
+                         [[alice.id, 1, 7.0], [bob.id, 2, 10.0], [bob.id, 3, 1.0]])
+
+        os.remove(os.path.join(path, 'header.json'))
+        with self.assertRaises(ValueError):
+            load_rating_columns(path)
@@ -0,0 +1,87 @@
+import csv
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from reelchoice_app.models import Movie, MovieRatingStats, Rating
+from reelchoice_app.services import rate_movie, delete_rating
+
+User = get_user_model()
+
+
+class RatingStatsTestCase(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(username=f"user{n}") for n in range(3)]
+        self.movie = Movie.objects.create(id=1, title="Movie 1")
+        Movie.objects.create(id=2, title="Movie 2")
+        cache.clear()
+
+    def stats(self, movie_id=1):
+        stats = MovieRatingStats.objects.get(movie_id=movie_id)
+        return stats.rating_count, stats.score_sum, stats.average, dict(stats.histogram())
+
+    # Test that rating, re-rating and deleting keep count, sum, average and histogram in step
+    def test_services_maintain_aggregates(self):
+        rate_movie(self.users[0], 1, 8)
+        rate_movie(self.users[1], 1, 5)
+        count, score_sum, average, histogram = self.stats()
+        self.assertEqual((count, score_sum, average), (2, 13, 6.5))
+        self.assertEqual((histogram[8], histogram[5], sum(histogram.values())), (1, 1, 2))
+
+        rate_movie(self.users[1], 1, 8)
+        count, score_sum, average, histogram = self.stats()
+        self.assertEqual((count, score_sum, average), (2, 16, 8.0))
+        self.assertEqual((histogram[8], histogram[5]), (2, 0))
+
+        delete_rating(self.users[0], 1)
+        delete_rating(self.users[0], 1)
+        delete_rating(self.users[1], 1)
+        count, score_sum, average, histogram = self.stats()
+        self.assertEqual((count, score_sum, average), (0, 0, None))
+        self.assertFalse(any(histogram.values()))
+
+    # Test that the repair command recomputes the aggregates from the Rating table
+    def test_rebuild_command(self):
+        rate_movie(self.users[0], 1, 8)
+        Rating.objects.bulk_create([Rating(user=self.users[1], movie_id=1, score=2),
+                                    Rating(user=self.users[2], movie_id=2, score=10)])
+        MovieRatingStats.objects.create(movie_id=2, rating_count=5, score_sum=5, average=1.0)
+        Rating.objects.filter(movie_id=2).delete()
+
+        out = StringIO()
+        call_command('rebuild_rating_stats', stdout=out)
+        self.assertIn("Rebuilt rating aggregates of 1 movies", out.getvalue())
+        count, score_sum, average, histogram = self.stats()
+        self.assertEqual((count, score_sum, average, histogram[2], histogram[8]), (2, 10, 5.0, 1, 1))
+        self.assertFalse(MovieRatingStats.objects.filter(movie_id=2).exists())
+
+    # Test that bulk loaded ratings are reflected in the aggregates
+    def test_bulk_load_rebuilds(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'ratings.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows([('userId', 'id', 'rating'), (1, 2, 4), (2, 2, 6)])
+        call_command('load_ratings', path, stdout=StringIO())
+        self.assertEqual(self.stats(2)[:3], (2, 10, 5.0))
+
+    # Test that the movie page shows the local average and sorting by it uses the stats table
+    def test_movie_page_and_ranking(self):
+        rate_movie(self.users[0], 1, 3)
+        rate_movie(self.users[0], 2, 9)
+        rate_movie(self.users[1], 2, 8)
+
+        ranked = Movie.objects.filter(rating_stats__rating_count__gte=1).order_by('-rating_stats__average')
+        self.assertEqual([movie.id for movie in ranked], [2, 1])
+
+        self.client.force_login(self.users[0])
+        response = self.client.get(reverse('reelchoice_app:movie_detail', args=(2,)))
+        self.assertContains(response, "ReelChoice users: 8.5 (2 ratings)")
@@ -0,0 +1,121 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from reelchoice_app.models import Movie, Rating, PrecomputedRecommendation, DataVersion
+from reelchoice_app.recommendation_cache import RecommendationCache, get_rating_version
+from reelchoice_app.services import rate_movie, delete_rating
+from reelchoice_app.tests.utils import build_scorer
+
+User = get_user_model()
+
+
+class RecommendationCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username="alice")
+        self.other_user = User.objects.create(username="bob")
+        for movie_id in (1, 2, 3, 4):
+            Movie.objects.create(id=movie_id, title=f"Movie {movie_id}")
+        Rating.objects.create(user=self.user, movie_id=1, score=9)
+
+        self.model = build_scorer({1: 7.0, 2: 6.0, 3: 5.0, 4: 4.0},
+                                  {2: {1: 0.5}, 3: {1: 0.4, 4: 0.3}, 4: {3: 0.2}})
+        patcher = mock.patch('reelchoice_app.recommendation_cache.get_recommender', return_value=self.model)
+        self.get_recommender = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.cache = RecommendationCache(max_users=2, top_k=3)
+
+    def recommend(self, user_id, n_recommendations):
+        return async_to_sync(self.cache.aget_recommendations)(user_id, n_recommendations)
+
+    # Test that the second request is served from the cache by slicing the top-K list
+    def test_second_request_is_a_hit(self):
+        top_three = self.recommend(self.user.id, 3)
+        with mock.patch.object(self.model, 'recommend_items') as recommend_items:
+            top_one = self.recommend(self.user.id, 1)
+        recommend_items.assert_not_called()
+
+        self.assertEqual([movie_id for movie_id, _ in top_three], [2, 3])
+        self.assertEqual(top_one, top_three[:1])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    # Test that rating writes through the services invalidate the user's entry
+    def test_rating_writes_invalidate(self):
+        self.recommend(self.user.id, 3)
+        version = get_rating_version(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rate_movie(self.user, 3, 2)
+        self.assertNotEqual(get_rating_version(self.user.id), version)
+        self.assertEqual([movie_id for movie_id, _ in self.recommend(self.user.id, 3)], [2, 4])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_rating(self.user, 3)
+        self.assertEqual([movie_id for movie_id, _ in self.recommend(self.user.id, 3)], [2, 3])
+        self.assertEqual(self.cache.hits, 0)
+
+    # Test that reading a counter writes nothing and its first bump moves it off the default
+    def test_rating_version_reads_do_not_write(self):
+        self.recommend(self.user.id, 3)
+        self.assertFalse(DataVersion.objects.exists())
+
+        version = get_rating_version(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            rate_movie(self.user, 3, 2)
+        self.assertNotEqual(get_rating_version(self.user.id), version)
+        self.assertEqual(DataVersion.objects.count(), 2)
+
+    # Test that a new model version makes every entry stale
+    def test_model_reload_invalidates(self):
+        self.recommend(self.user.id, 3)
+        self.get_recommender.return_value = build_scorer({1: 7.0, 2: 6.0}, {2: {1: 0.5}})
+
+        self.assertEqual([movie_id for movie_id, _ in self.recommend(self.user.id, 3)], [2])
+        self.assertEqual(self.cache.misses, 2)
+
+    # Test that the least recently used user is evicted when the cache is full
+    def test_lru_eviction(self):
+        third_user = User.objects.create(username="carol")
+        self.recommend(self.user.id, 3)
+        self.recommend(self.other_user.id, 3)
+        self.recommend(self.user.id, 3)
+        self.recommend(third_user.id, 3)
+
+        self.assertEqual(len(self.cache), 2)
+        self.recommend(self.user.id, 3)
+        self.assertEqual(self.cache.hits, 2)
+        self.recommend(self.other_user.id, 3)
+        self.assertEqual(self.cache.misses, 4)
+
+    # Test that a fresh precomputed list is served without live scoring
+    def test_precomputed_list_is_read_first(self):
+        self.model.model_version = 'v1'
+        PrecomputedRecommendation.objects.create(user=self.user, items=[[4, 1.5], [2, 1.0]], model_version='v1',
+                                                 computed_at=timezone.now())
+
+        with mock.patch.object(self.model, 'recommend_items') as recommend_items:
+            recommendations = self.recommend(self.user.id, 3)
+        recommend_items.assert_not_called()
+        self.assertEqual(recommendations, [(4, 1.5), (2, 1.0)])
+
+    # Test that with the service, entries are keyed on the model version it reports and no model is loaded
+    async def test_service_model_version_keys_entries(self):
+        arecommend = mock.AsyncMock(return_value=('v1', [(2, 1.0), (3, 0.5)]))
+        with override_settings(RECOMMENDER_SERVICE_SOCKET='/tmp/recommender.sock'), \
+                mock.patch('reelchoice_app.recommendation_cache.arecommend', arecommend):
+            await self.cache.aget_recommendations(self.user.id, 3)
+            self.assertEqual(await self.cache.aget_recommendations(self.user.id, 3), [(2, 1.0), (3, 0.5)])
+            self.assertEqual(self.cache.service_model_version, 'v1')
+
+            # The service retrained: a miss of another user reports the new version and the old entries miss
+            arecommend.return_value = ('v2', [(4, 1.0)])
+            await self.cache.aget_recommendations(self.other_user.id, 3)
+            self.assertEqual(await self.cache.aget_recommendations(self.user.id, 3), [(4, 1.0)])
+
+        self.get_recommender.assert_not_called()
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
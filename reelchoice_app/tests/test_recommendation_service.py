@@ -0,0 +1,79 @@
+import asyncio
+import os
+import signal
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from recommender.model_format import save_binary_model, read_header
+from reelchoice_app.recommendation_service import RecommendationService, RecommendationServiceError, arecommend
+from reelchoice_app.tests.utils import build_scorer
+
+
+class RecommendationServiceTestCase(SimpleTestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.scorer = build_scorer({1: 7.0, 2: 6.0, 3: 5.0, 4: 4.0, 5: 6.5},
+                                   {2: {1: 0.5, 5: 0.2}, 3: {1: 0.4, 4: 0.3}, 4: {3: 0.2}, 5: {2: 0.6}})
+        self.model_path = os.path.join(tmp_dir, 'model')
+        save_binary_model(self.scorer, self.model_path)
+        self.socket_path = os.path.join(tmp_dir, 'service.sock')
+
+    async def start_service(self, **options):
+        service = RecommendationService(self.model_path, self.socket_path, **options)
+        await service.start()
+        return service
+
+    # Test that concurrent requests are scored in batches by the worker processes like the model scores them
+    async def test_scores_like_the_model(self):
+        users_ratings = [{1: 9.0}, {1: 9.0, 4: 2.0}, {3: 8.0, 2: 6.0}, {}, {5: 3.0, 1: 10.0, 3: 4.0}]
+        service = await self.start_service(workers=2, batch_wait=0.05)
+        try:
+            results = await asyncio.gather(*(arecommend(self.socket_path, ratings, 3, timeout=10)
+                                             for ratings in users_ratings))
+        finally:
+            await service.stop()
+
+        for ratings, (model_version, recommendations) in zip(users_ratings, results):
+            self.assertEqual(recommendations, self.scorer.recommend_items(ratings, 3))
+            self.assertEqual(model_version, read_header(self.model_path)['model_version'])
+        self.assertEqual(service.served, len(users_ratings))
+
+    # Test that requests over the pending limit are answered busy instead of waiting
+    async def test_busy_when_pending_limit_is_reached(self):
+        service = await self.start_service(workers=1, max_pending=0)
+        try:
+            with self.assertRaisesMessage(RecommendationServiceError, "busy"):
+                await arecommend(self.socket_path, {1: 9.0}, 3, timeout=10)
+        finally:
+            await service.stop()
+        self.assertEqual((service.served, service.rejected), (0, 1))
+
+    # Test that a service that is not running is reported as an error, not raised as OSError
+    async def test_service_not_running(self):
+        with self.assertRaises(RecommendationServiceError):
+            await arecommend(self.socket_path, {1: 9.0}, 3, timeout=1)
+
+    # Test that the service replaces its process pool when a worker process dies
+    async def test_recovers_from_a_dead_worker(self):
+        service = await self.start_service(workers=1)
+        try:
+            await arecommend(self.socket_path, {1: 9.0}, 3, timeout=10)
+            for pid in list(service._pool._processes):
+                os.kill(pid, signal.SIGKILL)
+
+            for _ in range(20):
+                try:
+                    _, recommendations = await arecommend(self.socket_path, {1: 9.0}, 3, timeout=10)
+                    break
+                except RecommendationServiceError as exc:
+                    self.assertEqual(str(exc), "scoring process died")
+                    await asyncio.sleep(0.1)
+        finally:
+            await service.stop()
+
+        self.assertEqual(recommendations, self.scorer.recommend_items({1: 9.0}, 3))
+        self.assertEqual(service.pool_restarts, 1)
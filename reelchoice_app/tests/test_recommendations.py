@@ -1,9 +1,13 @@
 import os
+import shutil
+import tempfile
 
 from django.conf import settings
 from django.test import TestCase
 
+from recommender.model_format import ModelFormatError, load_binary_model, save_binary_model
 from recommender.recommender import ItemBasedCF
+from recommender.sparse import SparseItemScorer
 
 
 class TestRecommendations(TestCase):
@@ -36,3 +40,87 @@ class TestRecommendations(TestCase):
 
         ratings = [rating for _, rating in recommendations]
         self.assertEqual(ratings, sorted(ratings, reverse=True))
+
+    def test_recommend_items_matches_predict_score(self):
+        # Every unrated item scored one by one, the ranking recommend_items has to reproduce exactly
+        for user_ratings in (self.sample_user_ratings, {155: 3.0}, {-1: 5.0, 27205: 2.0, 24428: 9.0}, {}):
+            predictions = [(item, self.model.predict_score(user_ratings, item))
+                           for item in set(self.model.all_items) - set(user_ratings)]
+            expected = sorted(((item, score) for item, score in predictions if score is not None),
+                              key=lambda x: (-x[1], x[0]))
+            for n_recommendations in (1, 20, len(expected) + 1):
+                self.assertEqual(self.model.recommend_items(user_ratings, n_recommendations),
+                                 expected[:n_recommendations])
+
+    def test_neighbour_index_follows_replaced_similarities(self):
+        self.model.recommend_items(self.sample_user_ratings)
+        target = next(item for item in self.model.all_items if item not in self.sample_user_ratings)
+        self.model.item_similarities = {target: {155: 0.5}}
+
+        self.assertEqual([item for item, _ in self.model.recommend_items(self.sample_user_ratings)], [target])
+
+    def test_sparse_engine_matches_recommend_items(self):
+        scorer = SparseItemScorer.from_model(self.model)
+
+        for n_recommendations in (20, 100):
+            expected = self.model.recommend_items(self.sample_user_ratings, n_recommendations=n_recommendations)
+            actual = scorer.recommend_items(self.sample_user_ratings, n_recommendations=n_recommendations)
+
+            self.assertEqual([movie_id for movie_id, _ in actual], [movie_id for movie_id, _ in expected])
+            for (_, actual_score), (_, expected_score) in zip(actual, expected):
+                self.assertAlmostEqual(actual_score, expected_score, places=9)
+
+    def test_sparse_engine_ignores_unknown_items(self):
+        scorer = SparseItemScorer.from_model(self.model)
+        user_ratings = {-1: 5.0, **self.sample_user_ratings}
+
+        expected = self.model.recommend_items(user_ratings, n_recommendations=20)
+        actual = scorer.recommend_items(user_ratings, n_recommendations=20)
+        self.assertEqual([movie_id for movie_id, _ in actual], [movie_id for movie_id, _ in expected])
+        self.assertEqual(scorer.recommend_items({}, n_recommendations=20), [])
+
+    def test_binary_model_matches_pickle_predictions(self):
+        binary_path = os.path.join(settings.BASE_DIR, 'recommender', 'trained_model')
+        scorer = load_binary_model(binary_path)
+
+        self.assertIsNotNone(scorer.model_version)
+        self.assertFalse(scorer.similarity_matrix.data.flags.writeable)
+
+        expected = self.model.recommend_items(self.sample_user_ratings, n_recommendations=100)
+        actual = scorer.recommend_items(self.sample_user_ratings, n_recommendations=100)
+        self.assertEqual([movie_id for movie_id, _ in actual], [movie_id for movie_id, _ in expected])
+        for (_, actual_score), (_, expected_score) in zip(actual, expected):
+            self.assertAlmostEqual(actual_score, expected_score, places=9)
+
+    def test_binary_model_round_trip_and_checksum(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        model_path = os.path.join(tmp_dir, 'model')
+
+        header = save_binary_model(SparseItemScorer.from_model(self.model), model_path)
+        loaded = load_binary_model(model_path)
+        self.assertEqual(loaded.model_version, header['model_version'])
+        self.assertEqual([movie_id for movie_id, _ in loaded.recommend_items(self.sample_user_ratings, 20)],
+                         [movie_id for movie_id, _ in self.model.recommend_items(self.sample_user_ratings, 20)])
+
+        with open(os.path.join(model_path, 'item_means.npy'), 'r+b') as f:
+            f.seek(-8, os.SEEK_END)
+            f.write(b'\x00' * 8)
+        with self.assertRaises(ModelFormatError):
+            load_binary_model(model_path)
+
+    def test_recommend_for_users_matches_recommend_items(self):
+        users = {
+            'sample': self.sample_user_ratings,
+            'single': {155: 3.0},
+            'unknown': {-1: 5.0},
+            'empty': {},
+        }
+        batch = self.model.recommend_for_users(users, n_recommendations=30)
+
+        self.assertEqual(set(batch), set(users))
+        for user, user_ratings in users.items():
+            expected = self.model.recommend_items(user_ratings, n_recommendations=30)
+            self.assertEqual([movie_id for movie_id, _ in batch[user]], [movie_id for movie_id, _ in expected])
+            for (_, actual_score), (_, expected_score) in zip(batch[user], expected):
+                self.assertAlmostEqual(actual_score, expected_score, places=9)
@@ -0,0 +1,71 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+
+from reelchoice_app.models import Movie
+from reelchoice_app.search import SearchResults, match_expression, fts_available
+
+User = get_user_model()
+
+
+class SearchTestCase(TestCase):
+
+    def setUp(self):
+        Movie.objects.create(id=1, title="The Dark Knight", overview="Batman faces the Joker.",
+                             vote_average=8.5, vote_count=9000)
+        Movie.objects.create(id=2, title="Dark Waters", overview="A lawyer uncovers a dark secret.",
+                             vote_average=7.0, vote_count=100)
+        Movie.objects.create(id=3, title="Knight and Day", overview="A spy comedy.", vote_average=6.0, vote_count=50)
+        Movie.objects.create(id=4, title="Moonlight", overview="A story told in three chapters, a true story.",
+                             vote_average=7.4, vote_count=3000)
+
+    def ids(self, text):
+        results = SearchResults(text)
+        return [movie.id for movie in results[0:len(results)]]
+
+    def test_fts_index_is_used(self):
+        self.assertTrue(fts_available())
+        self.assertTrue(SearchResults("dark").use_fts)
+
+    # Test that title matches outrank overview matches and the last word matches as a prefix
+    def test_ranking_and_prefix(self):
+        self.assertEqual(self.ids("dark"), [1, 2])
+        self.assertEqual(self.ids("knig"), [1, 3])
+        self.assertEqual(self.ids("true story"), [4])
+        self.assertEqual(self.ids("joker batman"), [1])
+
+    # Test that the index follows updates and deletes of movies
+    def test_index_follows_changes(self):
+        Movie.objects.filter(id=3).update(title="Night and Day")
+        Movie.objects.filter(id=2).delete()
+        self.assertEqual(self.ids("knight"), [1])
+        self.assertEqual(self.ids("dark"), [1])
+        self.assertEqual(self.ids("night"), [3])
+
+    # Test that FTS5 syntax in the input is searched as text
+    def test_operators_are_quoted(self):
+        self.assertEqual(match_expression('dark OR "knight'), '"dark" "OR" "knight"*')
+        self.assertEqual(self.ids("title:dark -"), [])
+        self.assertEqual(self.ids("  "), [])
+
+    # Test the LIKE fallback used without FTS5
+    def test_fallback(self):
+        with mock.patch('reelchoice_app.search.fts_available', return_value=False):
+            self.assertEqual(self.ids("dark"), [1, 2])
+            self.assertEqual(self.ids("story"), [4])
+
+    # Test that the search page is paginated with cursors that keep the query
+    def test_search_view_pages(self):
+        for movie_id in range(10, 35):
+            Movie.objects.create(id=movie_id, title=f"Alien {movie_id}", vote_count=movie_id)
+        self.client.force_login(User.objects.create(username="alice"))
+
+        first = self.client.get(reverse('reelchoice_app:search'), {'q': 'alien'})
+        self.assertEqual(len(first.context['movies']), 20)
+        self.assertContains(first, "?q=alien&cursor=")
+        second = self.client.get(reverse('reelchoice_app:search'),
+                                 {'q': 'alien', 'cursor': first.context['page_obj'].next_cursor})
+        shown = [movie.id for response in (first, second) for movie in response.context['movies']]
+        self.assertEqual(sorted(shown), list(range(10, 35)))
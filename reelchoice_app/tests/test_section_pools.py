@@ -0,0 +1,59 @@
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+from reelchoice_app.keywords import set_movie_tags
+from reelchoice_app.models import Movie
+from reelchoice_app.section_pools import SectionPools, afetch_sections
+from reelchoice_app.versions import bump_catalog_version, catalog_index_max_age
+
+
+class SectionPoolsTestCase(TestCase):
+
+    def setUp(self):
+        for movie_id in range(1, 11):
+            Movie.objects.create(id=movie_id, title=f"Movie {movie_id}", vote_average=movie_id,
+                                 vote_count=100 * movie_id, overview="Based on a true story." if movie_id <= 3 else "")
+        set_movie_tags(Movie.objects.values_list('id', 'overview'))
+        self.pools = SectionPools(max_age=3600, check_interval=0)
+
+    # Test that every section pool holds the ids its query selects
+    def test_pools_hold_section_ids(self):
+        pools = self.pools.get_pools()
+        self.assertEqual(sorted(pools["tag:true_story"]), [1, 2, 3])
+        self.assertEqual(list(pools["catalog"]), list(range(1, 11)))
+        self.assertEqual(list(pools["popular"]), [10, 9])
+        self.assertEqual(list(pools["viewers_choice"])[:3], [10, 9, 8])
+
+    # Test that sampling returns distinct ids from the pool without querying the database
+    def test_sample_does_not_query(self):
+        self.pools.get_pools()
+        self.pools.check_interval = 3600
+        with self.assertNumQueries(0):
+            sample = self.pools.sample("catalog", 3)
+            self.assertEqual(self.pools.sample("unknown", 5), [])
+        self.assertEqual(len(set(sample)), 3)
+        self.assertTrue(set(sample) <= set(range(1, 11)))
+
+    # Test that pools are rebuilt after the catalog version changes
+    def test_catalog_version_bump_rebuilds(self):
+        self.pools.get_pools()
+        Movie.objects.create(id=11, title="Movie 11", overview="A true story.")
+        set_movie_tags([(11, "A true story.")])
+        self.assertNotIn(11, self.pools.get_pools()["tag:true_story"])
+
+        bump_catalog_version()
+        self.assertIn(11, self.pools.get_pools()["tag:true_story"])
+
+    # Test that the chosen movies of all sections are loaded with one query, keeping the sampled order
+    def test_fetch_sections_uses_one_query(self):
+        with self.assertNumQueries(1):
+            movies = async_to_sync(afetch_sections)({"first": [3, 1], "second": [2, 3, 404]})
+        self.assertEqual([movie.id for movie in movies["first"]], [3, 1])
+        self.assertEqual([movie.id for movie in movies["second"]], [2, 3])
+
+    # Test that the former name of the max age setting is still honoured
+    def test_former_max_age_setting(self):
+        with override_settings(CATALOG_INDEX_MAX_AGE=300):
+            self.assertEqual(catalog_index_max_age(), 300)
+            with override_settings(SECTION_POOLS_MAX_AGE=60):
+                self.assertEqual(catalog_index_max_age(), 60)
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from recommender.incremental import IncrementalItemSimilarity, MAX_GROWTH_ITEMS
+from recommender.recommender import ItemBasedCF
+from recommender.training import compute_item_similarities
+
+
+def random_ratings(n_users: int = 400, n_items: int = 80, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for user_id in range(n_users):
+        for item in rng.choice(n_items, size=rng.integers(5, 40), replace=False):
+            rows.append((user_id, int(item) * 3 + 1, float(rng.integers(1, 11)) / 2))
+    return pd.DataFrame(rows, columns=['userId', 'id', 'rating'])
+
+
+class TestSparseTraining(SimpleTestCase):
+    def setUp(self):
+        self.ratings_df = random_ratings()
+        self.dense_model = ItemBasedCF(n_similar_items=15)
+        self.dense_model.fit(self.ratings_df)
+
+    def assertSameNeighbours(self, expected: dict, actual: dict):
+        self.assertEqual(list(actual), list(expected))
+        for item_id, neighbours in expected.items():
+            self.assertEqual(list(actual[item_id]), list(neighbours))
+            np.testing.assert_allclose(list(actual[item_id].values()), list(neighbours.values()), atol=1e-12)
+
+    # Test that the sparse mode reproduces DataFrame.corr neighbour lists and means
+    def test_sparse_fit_matches_dense_fit(self):
+        sparse_model = ItemBasedCF(n_similar_items=15)
+        sparse_model.fit(self.ratings_df, mode='sparse', n_jobs=1)
+
+        self.assertEqual(sparse_model.all_items, self.dense_model.all_items)
+        np.testing.assert_allclose(sparse_model.item_means.to_numpy(), self.dense_model.item_means.to_numpy())
+        self.assertSameNeighbours(self.dense_model.item_similarities, sparse_model.item_similarities)
+
+    # Test that splitting items into blocks across a process pool gives the same result
+    def test_blocks_across_process_pool(self):
+        all_items, _, item_similarities = compute_item_similarities(
+            self.ratings_df, n_similar_items=15, block_size=7, n_jobs=2
+        )
+        self.assertEqual(all_items, self.dense_model.all_items)
+        self.assertSameNeighbours(self.dense_model.item_similarities, item_similarities)
+
+    # Test that pairs with fewer co-rating users than min_periods get no similarity
+    def test_min_periods_rule(self):
+        _, _, item_similarities = compute_item_similarities(self.ratings_df, min_periods=10_000, n_jobs=1)
+        self.assertTrue(all(not neighbours for neighbours in item_similarities.values()))
+
+    def test_duplicate_ratings_are_rejected(self):
+        duplicated = pd.concat([self.ratings_df, self.ratings_df.head(1)], ignore_index=True)
+        with self.assertRaises(ValueError):
+            compute_item_similarities(duplicated, n_jobs=1)
+
+
+class TestIncrementalSimilarity(SimpleTestCase):
+    def setUp(self):
+        self.ratings_df = random_ratings(n_users=300, n_items=40)
+        self.state = IncrementalItemSimilarity.from_ratings(
+            self.ratings_df['userId'], self.ratings_df['id'], self.ratings_df['rating'], n_similar_items=10
+        )
+
+    def assertMatchesFullFit(self, ratings_df):
+        expected = ItemBasedCF(n_similar_items=10)
+        expected.fit(ratings_df, mode='sparse', n_jobs=1)
+        actual = self.state.to_model()
+
+        self.assertEqual(actual.all_items, expected.all_items)
+        np.testing.assert_allclose(actual.item_means.to_numpy(), expected.item_means.to_numpy())
+        self.assertEqual(actual.item_similarities, expected.item_similarities)
+
+    # Test that the statistics built from scratch give the neighbour lists of a full fit
+    def test_initial_statistics_match_full_fit(self):
+        self.assertMatchesFullFit(self.ratings_df)
+
+    # Test that inserts, updates and deletes keep the neighbour lists equal to a full refit
+    def test_rating_changes_match_full_fit(self):
+        rng = np.random.default_rng(11)
+        ratings = {(user, item): rating for user, item, rating in self.ratings_df.itertuples(index=False)}
+
+        for _ in range(300):
+            user_id = int(rng.integers(0, 320))
+            item_id = int(rng.integers(0, 42)) * 3 + 1
+            if (user_id, item_id) in ratings and rng.random() < 0.4:
+                self.state.remove_rating(user_id, item_id)
+                del ratings[(user_id, item_id)]
+            else:
+                rating = float(rng.integers(1, 11)) / 2
+                self.state.set_rating(user_id, item_id, rating)
+                ratings[(user_id, item_id)] = rating
+
+        updated_df = pd.DataFrame([(user, item, rating) for (user, item), rating in ratings.items()],
+                                  columns=['userId', 'id', 'rating'])
+        self.assertMatchesFullFit(updated_df)
+
+    # Test that only the rated movie and the user's other movies are refreshed
+    def test_refreshes_only_affected_items(self):
+        user_id = int(self.ratings_df['userId'].iloc[0])
+        rated = set(self.ratings_df.loc[self.ratings_df['userId'] == user_id, 'id'])
+        new_item = next(item for item in self.state.item_ids if item not in rated)
+
+        self.state.changed_items.clear()
+        self.state.set_rating(user_id, new_item, 4.5)
+        self.assertEqual(self.state.changed_items, rated | {new_item})
+
+    # Test that a new item grows the statistic arrays by a bounded number of slots, not by doubling them
+    def test_new_item_growth_is_bounded(self):
+        state = IncrementalItemSimilarity.from_ratings(
+            np.zeros(1000), np.arange(1000), np.ones(1000), n_similar_items=10
+        )
+        state.set_rating(1, 5000, 4.0)
+        self.assertEqual(state.co_counts.shape, (1000 + MAX_GROWTH_ITEMS, 1000 + MAX_GROWTH_ITEMS))
+        self.assertEqual(len(state.rating_counts), 1000 + MAX_GROWTH_ITEMS)
@@ -0,0 +1,59 @@
+from datetime import date
+
+from django.test import TestCase
+from django.urls import reverse
+
+from reelchoice_app.models import Movie
+from reelchoice_app.text import normalize
+from reelchoice_app.typeahead import TypeaheadIndex, typeahead_index
+from reelchoice_app.versions import bump_catalog_version
+
+
+class TypeaheadTestCase(TestCase):
+
+    def setUp(self):
+        for movie_id, title, vote_count in [(1, "The Dark Knight", 9000), (2, "Dark Waters", 100),
+                                            (3, "Knight and Day", 500), (4, "Amélie", 4000),
+                                            (5, "The Darkest Hour", 700), (6, "Darkman", 300)]:
+            Movie.objects.create(id=movie_id, title=title, vote_count=vote_count, release_date=date(2000 + movie_id, 1, 1))
+        self.index = TypeaheadIndex(check_interval=0)
+
+    def ids(self, query, limit=10):
+        return [suggestion["id"] for suggestion in self.index.suggest(query, limit)]
+
+    def test_normalize(self):
+        self.assertEqual(normalize("  Amélie: the  Movie!"), "amelie the movie")
+
+    # Test that prefixes match the start of any title word, most voted first
+    def test_prefix_matches_by_popularity(self):
+        self.assertEqual(self.ids("dar"), [1, 5, 6, 2])
+        self.assertEqual(self.ids("dark"), [1, 5, 6, 2])
+        self.assertEqual(self.ids("the dark k"), [1])
+        self.assertEqual(self.ids("knight"), [1, 3])
+        self.assertEqual(self.ids("AME"), [4])
+        self.assertEqual(self.ids("d", limit=2), [1, 5])
+
+    # Test that a misspelled query still finds titles through shared trigrams
+    def test_typo_fallback(self):
+        self.assertEqual(self.ids("drak knight")[:1], [1])
+        self.assertEqual(self.ids("amelei"), [4])
+        self.assertEqual(self.ids("zzzz"), [])
+
+    # Test that new titles appear after the catalog version changes
+    def test_rebuilt_on_catalog_change(self):
+        self.index.suggest("dark")
+        Movie.objects.create(id=7, title="Darkness Falls", vote_count=99999)
+        bump_catalog_version()
+        self.assertEqual(self.ids("darkn"), [7])
+
+    # Test that the endpoint answers from memory
+    def test_endpoint_does_not_query(self):
+        url = reverse('reelchoice_app:search_suggestions')
+        typeahead_index.invalidate()
+        self.client.get(url, {'q': 'dark'})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'q': 'knight', 'limit': 1})
+        self.assertEqual(response.json(), {
+            "query": "knight",
+            "suggestions": [{"id": 1, "title": "The Dark Knight", "poster_path": None, "year": 2001}],
+        })
@@ -1,8 +1,16 @@
-from django.test import TestCase, Client
+import re
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
-from reelchoice_app.models import Movie
+from reelchoice_app.genre_index import genre_index
+from reelchoice_app.models import Movie, Comment, Rating
+from reelchoice_app.recommendation_cache import recommendation_cache
+from reelchoice_app.section_pools import section_pools
 
 
 class TestViews(TestCase):
@@ -103,3 +111,91 @@ class TestViews(TestCase):
         response = self.client.get(self.category_url)
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'category_detail.html')
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class MovieDetailCommentsTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="password")
+        self.movie = Movie.objects.create(id=1, title="Inception")
+        self.comments = [Comment.objects.create(user=self.user if n % 2 else User.objects.create(username=f"user{n}"),
+                                                movie=self.movie, content=f"Comment {n}")
+                         for n in range(7)]
+        Rating.objects.create(user=self.user, movie=self.movie, score=7)
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def first_page(self):
+        response = self.client.get(reverse('reelchoice_app:movie_detail', args=(1,)))
+        return response, re.findall(r'<p class="text-gray-300 mt-2 whitespace-pre-line">(.*?)</p>',
+                                    response.content.decode())
+
+    # Test that the page shows the user's rating and only the newest comments with a cursor for the rest
+    def test_first_page_of_comments(self):
+        response, contents = self.first_page()
+        self.assertEqual(response.context['user_rating'], 7)
+        self.assertEqual(contents, ["Comment 6", "Comment 5", "Comment 4"])
+        self.assertContains(response, 'id="loadMoreComments"')
+
+    # Test that the JSON endpoint walks the remaining comments page by page
+    def test_comment_pages_as_json(self):
+        url = reverse('reelchoice_app:movie_comments', args=(1,))
+        response, _ = self.first_page()
+        cursor = re.search(r'data-cursor="([^"]+)"', response.content.decode()).group(1)
+
+        contents = []
+        while cursor:
+            data = self.client.get(url, {'cursor': cursor}).json()
+            contents += [comment['content'] for comment in data['comments']]
+            cursor = data['next_cursor']
+        self.assertEqual(contents, ["Comment 3", "Comment 2", "Comment 1", "Comment 0"])
+
+        first = self.client.get(url).json()['comments'][0]
+        self.assertEqual((first['id'], first['username'], first['own']), (self.comments[6].id, "user6", False))
+        self.assertTrue(self.client.get(url).json()['comments'][1]['own'])
+
+
+@override_settings(HOME_SECTION_TIMEOUT=0.05)
+class HomeSectionFallbackTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="password")
+        for movie_id in range(1, 11):
+            Movie.objects.create(id=movie_id, title=f"Movie {movie_id}", vote_count=movie_id * 100)
+        section_pools.invalidate()
+        genre_index.invalidate()
+        self.client.force_login(self.user)
+
+    # Test that blocking per-user sections are replaced by popular movies instead of holding up the page
+    def test_slow_sections_fall_back_to_popular(self):
+        class SlowModel:
+            def recommend_items(self, user_ratings, n_recommendations=10):
+                time.sleep(2)
+                return [(1, 1.0)]
+
+        def slow_sample_unrated(rated, k):
+            time.sleep(2)
+            return [1]
+
+        started = time.perf_counter()
+        with mock.patch('reelchoice_app.recommendation_cache.get_recommender', return_value=SlowModel()), \
+                mock.patch('reelchoice_app.rated_sets.RatedBitset.sample_unrated', slow_sample_unrated), \
+                self.assertLogs('reelchoice_app.views', 'WARNING') as logs:
+            response = self.client.get(reverse('reelchoice_app:home'))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(len(logs.records), 2)
+
+        sections = {section['title']: section['movies'] for section in response.context['sections']}
+        self.assertEqual(sorted(movie.id for movie in sections["Recommended for you"]), [9, 10])
+        self.assertEqual(sorted(movie.id for movie in sections["Rate More Movies"]), [9, 10])
+
+    # Test that the page shows popular movies when the recommendation service is not running
+    def test_service_down_falls_back_to_popular(self):
+        with override_settings(RECOMMENDER_SERVICE_SOCKET='/nonexistent/recommender.sock'), \
+                self.assertLogs('reelchoice_app.views', 'WARNING'):
+            response = self.client.get(reverse('reelchoice_app:home'))
+
+        recommended = next(section for section in response.context['sections']
+                           if section['title'] == "Recommended for you")
+        self.assertEqual(sorted(movie.id for movie in recommended['movies']), [9, 10])
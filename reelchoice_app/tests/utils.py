@@ -0,0 +1,28 @@
+import pandas as pd
+
+from recommender.recommender import ItemBasedCF
+from recommender.sparse import SparseItemScorer
+from reelchoice_app.instrumentation import query_budget
+
+
+def build_scorer(item_means: dict[int, float], item_similarities: dict[int, dict[int, float]]):
+    """Small in-memory recommendation model for tests"""
+    model = ItemBasedCF()
+    model.item_means = pd.Series(item_means, dtype=float)
+    model.item_similarities = item_similarities
+    model.all_items = sorted(item_means)
+    return SparseItemScorer.from_model(model)
+
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting that a response stayed within its view's budget in settings.QUERY_BUDGETS"""
+
+    def assertWithinQueryBudget(self, response):
+        view_name = response.resolver_match.view_name
+        # Responses of Client carry the WSGI request, those of AsyncClient the ASGI one
+        request = getattr(response, "wsgi_request", None) or response.asgi_request
+        method = request.method
+        budget = query_budget(view_name, method)
+        self.assertIsNotNone(budget, f"{view_name} has no {method} query budget")
+        self.assertLessEqual(response.request_metrics.queries, budget,
+                             f"{view_name} ran {response.request_metrics.queries} queries, budget is {budget}")
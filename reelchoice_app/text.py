@@ -0,0 +1,16 @@
+import re
+import unicodedata
+
+
+def normalize(text):
+    """Lower case words without accents or punctuation, separated by single spaces"""
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r"\w+", text.lower()))
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
@@ -0,0 +1,111 @@
+"""
+Typeahead suggestions for the header search box, served from memory.
+
+Every word start of every normalized title is a key in a sorted list, so a prefix is found by
+binary search. Movies are numbered by popularity (vote_count, then vote_average), which makes
+the best suggestions the smallest numbers among the matches; for prefixes of up to
+SHORT_PREFIX characters, which match the most titles, the top suggestions are precomputed.
+When the prefix finds no title, titles sharing enough trigrams with the query are suggested,
+which tolerates typos.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.db.models import F
+
+from .models import Movie
+from .text import normalize, trigrams
+from .versions import CatalogIndex, catalog_index_max_age
+
+MAX_SUGGESTIONS = 10
+SHORT_PREFIX = 3
+# Share of the query trigrams a title has to contain to be suggested for a misspelled query
+MIN_SHARED_TRIGRAMS = 0.5
+# Trigrams found in more titles than this share of the catalog are not looked up
+COMMON_TRIGRAM_SHARE = 0.05
+
+
+class TypeaheadData:
+    def __init__(self, movies):
+        """
+        - movies: (id, title, poster_path, release_date) tuples ordered by popularity, best first
+        """
+        self.suggestions = [
+            {"id": movie_id, "title": title, "poster_path": poster_path,
+             "year": release_date.year if release_date else None}
+            for movie_id, title, poster_path, release_date in movies
+        ]
+
+        keys = []
+        trigram_postings = {}
+        for position, (_, title, _, _) in enumerate(movies):
+            normalized = normalize(title)
+            words = normalized.split(' ')
+            offset = 0
+            for word in words:
+                keys.append((normalized[offset:], position))
+                offset += len(word) + 1
+            for gram in trigrams(normalized):
+                trigram_postings.setdefault(gram, array('I')).append(position)
+        keys.sort()
+
+        self.keys = [key for key, _ in keys]
+        self.key_positions = array('I', (position for _, position in keys))
+        self.trigram_postings = trigram_postings
+        self.common_trigram_size = max(1000, int(len(movies) * COMMON_TRIGRAM_SHARE))
+
+        short_prefixes = {}
+        for key, position in keys:
+            for length in range(1, min(SHORT_PREFIX, len(key)) + 1):
+                short_prefixes.setdefault(key[:length], set()).add(position)
+        self.short_prefixes = {prefix: heapq.nsmallest(MAX_SUGGESTIONS, positions)
+                               for prefix, positions in short_prefixes.items()}
+
+    def _prefix_matches(self, prefix, limit):
+        if len(prefix) <= SHORT_PREFIX:
+            return self.short_prefixes.get(prefix, [])[:limit]
+        low = bisect_left(self.keys, prefix)
+        high = bisect_left(self.keys, prefix + '\U0010ffff', low)
+        return heapq.nsmallest(limit, set(self.key_positions[low:high]))
+
+    def _similar(self, query, limit):
+        grams = trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            postings = self.trigram_postings.get(gram, ())
+            if len(postings) <= self.common_trigram_size:
+                shared.update(postings)
+        needed = MIN_SHARED_TRIGRAMS * len(grams)
+        candidates = [(-count, position) for position, count in shared.items()
+                      if count >= needed]
+        return [position for _, position in heapq.nsmallest(limit, candidates)]
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        query = normalize(query)
+        if not query:
+            return []
+        positions = self._prefix_matches(query, limit)
+        if not positions and len(query) >= SHORT_PREFIX:
+            positions = self._similar(query, limit)
+        return [self.suggestions[position] for position in positions]
+
+
+class TypeaheadIndex(CatalogIndex):
+    """The TypeaheadData of the current catalog, rebuilt when it changes"""
+
+    def _load(self):
+        movies = (
+            Movie.objects
+            .order_by(F('vote_count').desc(nulls_last=True), F('vote_average').desc(nulls_last=True), 'id')
+            .values_list('id', 'title', 'poster_path', 'release_date')
+        )
+        return TypeaheadData(list(movies.iterator()))
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        """Returns up to limit suggestion dicts (id, title, poster_path, year), most popular first"""
+        return self.get().suggest(query, min(limit, MAX_SUGGESTIONS))
+
+
+typeahead_index = TypeaheadIndex(catalog_index_max_age())
@@ -20,6 +20,9 @@ urlpatterns = [
     # Search movies page URL mapped to the search_movies view
     path("search/", views.search_movies, name="search"),
 
+    # Search box suggestions (JSON) mapped to the search_suggestions view
+    path("search/suggest/", views.search_suggestions, name="search_suggestions"),
+
     # Ratings page URL mapped to the ratings_view view
     path('ratings/', views.ratings_view, name='ratings'),
 
@@ -30,5 +33,8 @@ urlpatterns = [
     path("category/<str:title>/", views.category_view, name="category_view"),
 
     # Detailed movie page URL, accepts an integer movie_id parameter, mapped to movie_details_view
-    path("movie/<int:movie_id>/", views.movie_details_view, name="movie_detail")
+    path("movie/<int:movie_id>/", views.movie_details_view, name="movie_detail"),
+
+    # Further pages of a movie's comments (JSON) mapped to movie_comments_view
+    path("movie/<int:movie_id>/comments/", views.movie_comments_view, name="movie_comments"),
 ]
@@ -0,0 +1,141 @@
+import abc
+import itertools
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+
+from .models import DataVersion
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+# Keys per query of the version functions, below SQLite's limit of query parameters
+VERSION_BATCH_SIZE = 500
+
+# Version of a counter that has never been bumped
+DEFAULT_VERSION = 0
+
+
+def get_versions(keys):
+    """
+    Returns {key: version} of shared version counters (DataVersion rows), which are the same in every worker.
+    One read-only query, a counter without a row has DEFAULT_VERSION.
+    """
+    keys = list(keys)
+    versions = dict(DataVersion.objects.filter(key__in=keys).values_list('key', 'value'))
+    return {key: versions.get(key, DEFAULT_VERSION) for key in keys}
+
+
+async def aget_versions(keys):
+    keys = list(keys)
+    versions = {key: value async for key, value in
+                DataVersion.objects.filter(key__in=keys).values_list('key', 'value')}
+    return {key: versions.get(key, DEFAULT_VERSION) for key in keys}
+
+
+def bump_versions(keys):
+    """
+    Changes the counters for every worker with atomic increments, an iterable of keys is read in batches.
+    Only bumps create rows, so reads (e.g. of pages of movies that do not exist) never write.
+    """
+    keys = iter(keys)
+    while batch := list(itertools.islice(keys, VERSION_BATCH_SIZE)):
+        # The missing rows are created at the default first, so concurrent first bumps both count
+        DataVersion.objects.bulk_create([DataVersion(key=key, value=DEFAULT_VERSION) for key in set(batch)],
+                                        ignore_conflicts=True)
+        DataVersion.objects.filter(key__in=batch).update(value=F('value') + 1)
+
+
+def get_catalog_version():
+    """
+    Returns the counter that changes whenever movies are imported or changed.
+    In-process indexes built from the catalog compare it to decide when to rebuild.
+    """
+    return get_versions([CATALOG_VERSION_KEY])[CATALOG_VERSION_KEY]
+
+
+def bump_catalog_version():
+    bump_versions([CATALOG_VERSION_KEY])
+
+
+def _movie_version_key(movie_id):
+    return f"movie:version:{movie_id}"
+
+
+def get_movie_versions(movie_ids):
+    """
+    Returns {movie_id: version} of the per-movie data counters, which change whenever something shown
+    on the movie's page changes (import, ratings, comments). Cached fragments of the page are keyed by them.
+    """
+    keys = {_movie_version_key(movie_id): movie_id for movie_id in movie_ids}
+    versions = get_versions(keys)
+    return {movie_id: versions[key] for key, movie_id in keys.items()}
+
+
+def bump_movie_versions(movie_ids):
+    bump_versions(_movie_version_key(movie_id) for movie_id in movie_ids)
+
+
+def catalog_index_max_age():
+    """
+    settings.CATALOG_INDEX_MAX_AGE, or SECTION_POOLS_MAX_AGE where a deployment still sets the setting
+    by its name from before the section pools, genre index and typeahead shared it
+    """
+    return getattr(settings, 'SECTION_POOLS_MAX_AGE', settings.CATALOG_INDEX_MAX_AGE)
+
+
+class CatalogIndex(abc.ABC):
+    """
+    Base of the in-process structures built from the movie catalog.
+    Subclasses implement _load(); the result is rebuilt when the catalog version changes
+    (checked at most every check_interval seconds) or when it gets older than max_age.
+    """
+
+    def __init__(self, max_age: float = 300, check_interval: float = 5):
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._data = None
+        self._catalog_version = None
+        self._built_at = 0.0
+        self._last_check = 0.0
+
+    @abc.abstractmethod
+    def _load(self):
+        """Builds the structure from the database"""
+
+    def _build(self):
+        catalog_version = get_catalog_version()
+        self._data = self._load()
+        self._catalog_version = catalog_version
+        self._built_at = time.monotonic()
+
+    def _is_current(self, now):
+        """The built structure can be returned without checking the catalog version"""
+        return self._data is not None and now - self._last_check < self.check_interval \
+            and now - self._built_at < self.max_age
+
+    def get(self):
+        """Returns the built structure, rebuilding it when it is out of date"""
+        now = time.monotonic()
+        if self._is_current(now):
+            return self._data
+
+        with self._lock:
+            self._last_check = now
+            if self._data is None or now - self._built_at >= self.max_age \
+                    or get_catalog_version() != self._catalog_version:
+                self._build()
+            return self._data
+
+    async def aget(self):
+        """get for async views: a current structure is returned on the event loop, checks and rebuilds query"""
+        if self._is_current(time.monotonic()):
+            return self._data
+        return await sync_to_async(self.get)()
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
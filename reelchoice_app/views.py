@@ -1,85 +1,123 @@
-import math
-import os
+import asyncio
+import logging
 import random
+from urllib.parse import urlencode
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
-from django.core.paginator import Paginator
+from django.http import JsonResponse
+from django.db.models import OuterRef, Subquery
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.formats import date_format
+from django.utils.timezone import localtime
 
-from ReelChoice import settings
-from recommender.recommender import ItemBasedCF
 from .forms import CommentForm
+from .fragments import MOVIE_FRAGMENTS, movie_fragments, stitch_comment_actions
+from .genre_index import genre_index, genre_from_title
 from .models import Movie, Rating
-from .services import write_comment, rate_movie, delete_rating, delete_comment
-
-MODEL_PATH = os.path.join(settings.BASE_DIR, 'recommender/trained_model.pkl')
-
-item_based_model = ItemBasedCF()
-item_based_model.load_model(MODEL_PATH)
-
-
-@login_required
-def home(request):
-    user = request.user
-
-    # Viewers' Choice
-    top_movies = Movie.objects.order_by('-vote_average')[:50]
-    viewers_choice = random.sample(list(top_movies), min(5, top_movies.count()))
-
+from .pagination import paginate_keyset, paginate_sequence
+from .rated_sets import rated_sets, UnratedIds
+from .recommendation_cache import recommendation_cache, recommendation_executor, aget_rating_version
+from .recommendation_service import RecommendationServiceError
+from .search import SearchResults
+from .section_pools import section_pools, afetch_sections
+from .services import write_comment, rate_movie, delete_rating, delete_comment, get_comment_page
+from .typeahead import typeahead_index, MAX_SUGGESTIONS
+from .versions import get_movie_versions
+
+logger = logging.getLogger(__name__)
+
+
+async def _request_user(request):
+    """
+    The user of an async view. The auth middleware caches request.auser() and request.user separately,
+    the user is shared so the templates (request.user) do not load it again
+    """
+    user = await request.auser()
+    request._cached_user = user
+    return user
+
+
+async def _within_timeout(section, fallback_ids):
+    """
+    Awaits a section's movie ids; a section still running after HOME_SECTION_TIMEOUT seconds or failing
+    (e.g. the recommendation service is down or busy) is replaced by fallback_ids.
+    The fallback is sampled before the section is awaited, so it never waits behind the section it replaces
+    """
+    try:
+        return await asyncio.wait_for(section, settings.HOME_SECTION_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Section timed out after %ss, showing the fallback", settings.HOME_SECTION_TIMEOUT)
+    except RecommendationServiceError as exc:
+        logger.warning("Recommendation service did not answer (%s), showing the fallback", exc)
+    except Exception:
+        logger.exception("Section failed, showing the fallback")
+    return fallback_ids
+
+
+async def _recommended_ids(user_id, rating_version, k, popular_ids):
     # Recommended for you (рекомендаційна система)
-    user_ratings_qs = Rating.objects.filter(user=user)
-    user_ratings = {r.movie_id: r.score for r in user_ratings_qs}
-    recommendations = item_based_model.recommend_items(user_ratings, n_recommendations=20)
+    recommendations = await recommendation_cache.aget_recommendations(user_id, n_recommendations=20,
+                                                                      rating_version=rating_version)
     recommended_ids_full = [movie_id for movie_id, _ in recommendations]
-
     if recommended_ids_full:
-        recommended_ids = random.sample(recommended_ids_full, min(5, len(recommended_ids_full)))
-    else:
-        movie_count = Movie.objects.count()
-        limit = int(math.ceil(movie_count * 0.2))
-        top_movies_ids = list(Movie.objects.order_by('-vote_count').values_list('id', flat=True)[:limit])
-        recommended_ids = random.sample(top_movies_ids, min(5, len(top_movies_ids)))
-
-    recommended = Movie.objects.filter(id__in=recommended_ids)
+        return random.sample(recommended_ids_full, min(k, len(recommended_ids_full)))
+    return popular_ids
 
-    # True Story
-    true_story_qs = Movie.objects.filter(overview__icontains='true story')
-    true_story = random.sample(list(true_story_qs), min(5, true_story_qs.count()))
 
-    # Horror
-    horror_qs = Movie.objects.filter(genres__name__iexact='Horror')
-    horror = random.sample(list(horror_qs), min(5, horror_qs.count()))
+async def _unrated_ids(user_id, rating_version, k):
+    # Rate More Movies
+    rated = await rated_sets.aget(user_id, rating_version)
+    return await asyncio.get_running_loop().run_in_executor(recommendation_executor, rated.sample_unrated, k)
 
-    # Adventure
-    adventure_qs = Movie.objects.filter(genres__name__iexact='Adventure')
-    adventure = random.sample(list(adventure_qs), min(5, adventure_qs.count()))
 
-    # Comedy
-    comedy_qs = Movie.objects.filter(genres__name__iexact='Comedy')
-    comedy = random.sample(list(comedy_qs), min(5, comedy_qs.count()))
+async def _sample_pool_sections(k):
+    # Section movie ids are sampled from precomputed pools, on the event loop once the pools are built
+    section_ids = {
+        "viewers_choice": await section_pools.asample("viewers_choice", k),
+        "horror": await genre_index.asample("horror", k),
+        "adventure": await genre_index.asample("adventure", k),
+        "comedy": await genre_index.asample("comedy", k),
+    }
+    # Keyword sections, e.g. Based on a true story
+    for tag in settings.KEYWORD_SECTIONS.values():
+        section_ids[f"tag:{tag}"] = await section_pools.asample(f"tag:{tag}", k)
+    return section_ids
 
-    # Rate More Movies
-    if user.is_authenticated:
-        rated_ids = user.ratings.values_list('movie_id', flat=True)
-        unrated_qs = Movie.objects.exclude(id__in=rated_ids)
-    else:
-        unrated_qs = Movie.objects.all()
 
-    unrated = random.sample(list(unrated_qs), min(5, unrated_qs.count()))
+@login_required
+async def home(request):
+    user = await _request_user(request)
+    section_ids = await _sample_pool_sections(5)
+    popular_ids = await section_pools.asample("popular", 5)
+    # Both per-user sections are validated against the user's rating version, read once
+    rating_version = await aget_rating_version(user.id)
+
+    # The per-user sections are built concurrently and fall back to popular movies when they are slow;
+    # the chosen rows of every section are loaded with one query
+    section_ids["recommended"], section_ids["unrated"] = await asyncio.gather(
+        _within_timeout(_recommended_ids(user.id, rating_version, 5, popular_ids), popular_ids),
+        _within_timeout(_unrated_ids(user.id, rating_version, 5), popular_ids),
+    )
+
+    movies = await afetch_sections(section_ids)
 
     sections = [
-        {"title": "Viewers' Choice", "movies": viewers_choice},
-        {"title": "Recommended for you", "movies": recommended},
-        {"title": "Based on a true story", "movies": true_story},
-        {"title": "Top Horror Movies", "movies": horror},
-        {"title": "Top Adventure Movies", "movies": adventure},
-        {"title": "Top Comedy Movies", "movies": comedy},
-        {"title": "Rate More Movies", "movies": unrated},
+        {"title": "Viewers' Choice", "movies": movies["viewers_choice"]},
+        {"title": "Recommended for you", "movies": movies["recommended"]},
+        *({"title": title, "movies": movies[f"tag:{tag}"]} for title, tag in settings.KEYWORD_SECTIONS.items()),
+        {"title": "Top Horror Movies", "movies": movies["horror"]},
+        {"title": "Top Adventure Movies", "movies": movies["adventure"]},
+        {"title": "Top Comedy Movies", "movies": movies["comedy"]},
+        {"title": "Rate More Movies", "movies": movies["unrated"]},
     ]
 
-    return render(request, "home.html", {"sections": sections})
+    return await sync_to_async(render)(request, "home.html", {"sections": sections})
 
 
 def authView(request):
@@ -95,15 +133,33 @@ def authView(request):
 
 def search_movies(request):
     query = request.GET.get('q')
-    results = []
-    if query:
-        results = Movie.objects.filter(title__icontains=query)
-    return render(request, 'search_results.html', {'query': query, 'movies': results})
+    page_obj = paginate_sequence(SearchResults(query), request.GET.get('cursor'), per_page=20)
+    return render(request, 'search_results.html', {
+        'query': query,
+        'movies': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'page_obj': page_obj,
+        'extra_query': urlencode({'q': query or ''}),
+    })
+
+
+def search_suggestions(request):
+    """Search box suggestions as JSON, answered from the in-memory typeahead index"""
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', MAX_SUGGESTIONS))
+    except ValueError:
+        limit = MAX_SUGGESTIONS
+    return JsonResponse({"query": query, "suggestions": typeahead_index.suggest(query, max(limit, 0))})
 
 
 def ratings_view(request):
     # Отримати всі рейтинги поточного користувача разом із відповідними фільмами
-    ratings_qs = Rating.objects.select_related("movie").filter(user=request.user).order_by('-created_at')
+    # Newest first, paged by seeking on (created_at, id)
+    page = paginate_keyset(
+        Rating.objects.select_related("movie").filter(user=request.user),
+        ('-created_at', '-id'), request.GET.get('cursor'), per_page=15,
+    )
 
     ratings = [
         {
@@ -112,117 +168,140 @@ def ratings_view(request):
             "poster_path": r.movie.poster_path,
             "score": r.score,
         }
-        for r in ratings_qs
+        for r in page
     ]
 
-    paginator = Paginator(ratings, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
     context = {
-        'ratings': page_obj.object_list,
-        'page_obj': page_obj,
-        'paginator': paginator,
-        'is_paginated': page_obj.has_other_pages(),
+        'ratings': ratings,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
     }
     return render(request, 'ratings.html', context)
 
 
 def movie_details_view(request, movie_id):
-    movie = get_object_or_404(Movie.objects.prefetch_related(
-        "genres", "companies", "countries", "comments__user", "ratings"
-    ), id=movie_id)
-
-    comments = movie.comments.all().order_by('-created_at')
     form = CommentForm()
     form_error = None
-    user_rating = Rating.objects.filter(user=request.user, movie=movie).first()
 
     if request.method == 'POST':
         if "score" in request.POST:
             score = request.POST.get("score")
             try:
-                rate_movie(request.user, movie.id, int(score))
-                return redirect('reelchoice_app:movie_detail', movie_id=movie.id)
+                rate_movie(request.user, movie_id, int(score))
+                return redirect('reelchoice_app:movie_detail', movie_id=movie_id)
             except ValidationError as e:
                 form_error = str(e)
 
         elif "delete_rating" in request.POST:
-            delete_rating(request.user, movie.id)
-            return redirect('reelchoice_app:movie_detail', movie_id=movie.id)
+            delete_rating(request.user, movie_id)
+            return redirect('reelchoice_app:movie_detail', movie_id=movie_id)
 
         elif "delete_comment" in request.POST:
             delete_comment_id = request.POST.get("delete_comment")
             delete_comment(delete_comment_id)
-            return redirect('reelchoice_app:movie_detail', movie_id=movie.id)
+            return redirect('reelchoice_app:movie_detail', movie_id=movie_id)
 
         form = CommentForm(request.POST)
         if form.is_valid():
             try:
-                write_comment(request.user, movie.id, form.cleaned_data["content"])
-                return redirect('reelchoice_app:movie_detail', movie_id=movie.id)
+                write_comment(request.user, movie_id, form.cleaned_data["content"])
+                return redirect('reelchoice_app:movie_detail', movie_id=movie_id)
             except ValidationError as e:
                 form_error = str(e)
 
+    # The parts shown to every viewer come from the fragment cache, keyed by the movie's data version.
+    # On a miss the movie is loaded with the user's score as a subquery and the first page of comments
+    user_rating = {}
+
+    def render_fragments(names):
+        user_score = Rating.objects.filter(user_id=request.user.pk, movie_id=OuterRef('pk')).values('score')[:1]
+        movie = get_object_or_404(
+            Movie.objects.select_related("rating_stats").prefetch_related("genres")
+                         .annotate(user_score=Subquery(user_score)),
+            id=movie_id,
+        )
+        user_rating["score"] = movie.user_score
+        context = {"movie": movie}
+        if "comments" in names:
+            context["comments"] = get_comment_page(movie.id)
+            context["comments_url"] = reverse('reelchoice_app:movie_comments', args=(movie.id,))
+        return {name: render_to_string(MOVIE_FRAGMENTS[name], context) for name in names}
+
+    version = get_movie_versions([movie_id])[movie_id]
+    fragments = movie_fragments.get_many(movie_id, version, list(MOVIE_FRAGMENTS), render_fragments)
+    if "score" not in user_rating:
+        user_rating["score"] = Rating.objects.filter(user_id=request.user.pk, movie_id=movie_id) \
+                                             .values_list('score', flat=True).first()
+
+    fragments["comments"] = stitch_comment_actions(
+        fragments["comments"], request.user.pk,
+        lambda comment_id: render_to_string("_comment_actions.html", {"comment_id": comment_id}, request),
+    )
+
     return render(request, "movie_detail.html", {
-        "movie": movie,
+        "fragments": fragments,
         "form": form,
         "form_error": form_error,
-        "comments": comments,
-        "user_rating": user_rating,
+        "user_rating": user_rating["score"],
         "rating_range": range(1, 11),
     })
 
 
-def category_view(request, title):
-    if title == "Viewers' Choice":
-        # Filter by top 20% popular movies IDs and then order by vote_average
-        movie_count = Movie.objects.count()
-        limit = int(math.ceil(movie_count * 0.2))
-        top_movies_ids = Movie.objects.order_by('-vote_count').values_list('id', flat=True)[:limit]
-        movie_list = Movie.objects.filter(id__in=top_movies_ids).order_by('-vote_average')[:100]
-
-    elif title == "Recommended for you":
-        user_ratings_qs = Rating.objects.filter(user=request.user).order_by('created_at')
-        user_ratings = {r.movie_id: r.score for r in user_ratings_qs}
-
-        recommendations = item_based_model.recommend_items(user_ratings, n_recommendations=100)
-        recommended_ids = [movie_id for movie_id, _ in recommendations]
+def movie_comments_view(request, movie_id):
+    """Further pages of a movie's comments as JSON, newest first"""
+    page = get_comment_page(movie_id, request.GET.get('cursor'))
+    return JsonResponse({
+        "comments": [
+            {
+                "id": comment.id,
+                "username": comment.user.username,
+                "content": comment.content,
+                "created_at": comment.created_at.isoformat(),
+                "created_at_display": date_format(localtime(comment.created_at), "d.m.Y, H:i"),
+                "own": comment.user_id == request.user.pk,
+            }
+            for comment in page
+        ],
+        "next_cursor": page.next_cursor,
+    })
 
-        if not recommended_ids:
-            all_ids = list(Movie.objects.values_list('id', flat=True))
-            recommended_ids = random.sample(all_ids, min(20, len(all_ids)))
 
-        # get movies list keeping the recommendations order
-        movies_by_id = {movie.id: movie for movie in Movie.objects.filter(id__in=recommended_ids)}
-        movie_list = [movies_by_id[movie_id] for movie_id in recommended_ids if movie_id in movies_by_id]
+async def _category_ids(user_id, title):
+    """The ranking of a category page, a sequence of movie ids"""
+    if title == "Viewers' Choice":
+        return (await section_pools.aget())["popular_top_rated"]
 
-    elif title == "Based on a true story":
-        movie_list = Movie.objects.filter(overview__icontains="true story")
+    if title == "Recommended for you":
+        async def recommended_ids():
+            recommendations = await recommendation_cache.aget_recommendations(user_id, n_recommendations=100)
+            return [movie_id for movie_id, _ in recommendations]
 
-    elif title == "Top Horror Movies":
-        movie_list = Movie.objects.filter(genres__name__iexact="Horror")
+        catalog_sample = await section_pools.asample("catalog", 20)
+        return await _within_timeout(recommended_ids(), catalog_sample) or catalog_sample
 
-    elif title == "Top Adventure Movies":
-        movie_list = Movie.objects.filter(genres__name__iexact="Adventure")
+    if title in settings.KEYWORD_SECTIONS:
+        # A section whose tag is not in MOVIE_KEYWORD_TAGS has no pool and no tagged movies
+        return (await section_pools.aget()).get(f"tag:{settings.KEYWORD_SECTIONS[title]}", [])
 
-    elif title == "Top Comedy Movies":
-        movie_list = Movie.objects.filter(genres__name__iexact="Comedy")
+    if title == "Rate More Movies":
+        return UnratedIds(await rated_sets.aget(user_id))
 
-    elif title == "Rate More Movies":
-        rated_ids = request.user.ratings.values_list('movie_id', flat=True)
-        movie_list = Movie.objects.exclude(id__in=rated_ids)
+    # Top <genre> Movies for every genre, ordered by vote_average
+    genre = genre_from_title(title)
+    genre_ids = (await genre_index.aget()).get(genre.lower()) if genre else None
+    return genre_ids if genre_ids is not None else []
 
-    else:
-        movie_list = Movie.objects.none()
 
-    paginator = Paginator(movie_list, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+async def category_view(request, title):
+    # Every category is a precomputed ranking of movie ids, pages are read from it by position
+    # and only the movies of the page are loaded
+    user = await _request_user(request)
+    page_obj = paginate_sequence(await _category_ids(user.id, title), request.GET.get('cursor'), per_page=15)
+    page_obj.object_list = (await afetch_sections({"page": page_obj.object_list}))["page"]
 
-    return render(request, "category_detail.html", {
+    return await sync_to_async(render)(request, "category_detail.html", {
         "title": title,
         "movies": page_obj,
         "is_paginated": page_obj.has_other_pages(),
         "page_obj": page_obj,
-    })
\ No newline at end of file
+    })